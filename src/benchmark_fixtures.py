@@ -0,0 +1,66 @@
+"""
+基准测试共用的随机数据和存储辅助函数：各基准使用同一份按种子生成的事件，结果可以互相对照。
+"""
+import os
+import random
+from datetime import date, datetime, timedelta
+from typing import Dict, List
+from data import ALL_DAY, CATEGORIES, TIME_SLOTS, Event
+from storage import create_event_store
+
+TITLES = ["项目周会", "健身", "读书", "买菜", "看牙医", "家庭聚餐", "代码评审", "写周报", "跑步", "看电影"]
+FIRST_DAY = date(2000, 1, 1)
+
+
+def generate_rows(count: int, seed: int = 0) -> List[Dict]:
+    """
+    生成 count 个随机事件，平均每天约 3 个，分布在从 2000 年开始的若干年中，约 1% 标记为每周重复。
+    每行包含 date（date 对象）、hour、all_day、title、category、description、weekly
+    """
+    rng = random.Random(seed)
+    day_span = max(count // 3, 1)
+    rows = []
+    for index in range(count):
+        rows.append({
+            "date": FIRST_DAY + timedelta(days=rng.randrange(day_span)),
+            "hour": rng.randrange(24),
+            "all_day": rng.random() < 0.3,
+            "title": f"{rng.choice(TITLES)} {index}",
+            "category": rng.choice(CATEGORIES),
+            "description": "" if rng.random() < 0.7 else f"备注 {rng.randrange(1000)}",
+            "weekly": rng.random() < 0.01,
+        })
+    return rows
+
+
+def generate_events(count: int, seed: int = 0) -> List[Event]:
+    """与 generate_rows 相同的数据转换为普通事件（忽略每周重复标记）"""
+    events = []
+    for row in generate_rows(count, seed):
+        day, hour = row["date"], row["hour"]
+        events.append(Event(day.toordinal(), row["title"], row["category"], row["description"],
+                            ALL_DAY if row["all_day"] else TIME_SLOTS[1 + hour // 2],
+                            datetime(day.year, day.month, day.day, hour).strftime("%Y-%m-%d %H:%M:%S")))
+    return events
+
+
+def events_by_date(events: List[Event]) -> Dict[str, List[Event]]:
+    """按日期键分组，得到存储使用的 {日期键: [事件]}"""
+    events_data: Dict[str, List[Event]] = {}
+    for event in events:
+        events_data.setdefault(event.date.isoformat(), []).append(event)
+    return events_data
+
+
+def new_store(backend: str, directory: str):
+    """在 directory 中创建并加载一个空的事件存储"""
+    store = create_event_store(backend, os.path.join(directory, "events.json"),
+                               os.path.join(directory, "events.journal"), os.path.join(directory, "events.db"),
+                               os.path.join(directory, "events"))
+    store.load()
+    return store
+
+
+def close_store(store) -> None:
+    if hasattr(store, "close"):
+        store.close()
@@ -0,0 +1,92 @@
+"""
+批量导入基准：生成 ICS 和 CSV 文件，分别导入三种事件存储，比较批量导入与逐条 apply 的耗时和吞吐量。
+
+用法: python benchmark_import.py [事件数 ...]
+默认依次测试 10000、100000 个事件；逐条 apply 很慢，只在不超过 10000 个事件时测试。
+"""
+import csv
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List
+from benchmark_fixtures import close_store, generate_rows, new_store
+from importer import LineReader, ImportResult, import_file, parse_csv
+
+DEFAULT_SIZES = [10_000, 100_000]
+APPLY_LIMIT = 10_000
+BACKENDS = ["json", "sharded", "sqlite"]
+
+
+def write_ics(rows: List[Dict], path: str) -> None:
+    stamp = datetime(2024, 1, 1).strftime("%Y%m%dT%H%M%SZ")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//benchmark//CN\r\n")
+        for index, row in enumerate(rows):
+            day = row["date"].strftime("%Y%m%d")
+            start = f"DTSTART;VALUE=DATE:{day}" if row["all_day"] else f"DTSTART:{day}T{row['hour']:02d}0000"
+            f.write(f"BEGIN:VEVENT\r\nUID:{index}@benchmark\r\nDTSTAMP:{stamp}\r\n{start}\r\n"
+                    f"SUMMARY:{row['title']}\r\nCATEGORIES:{row['category']}\r\n")
+            if row["description"]:
+                f.write(f"DESCRIPTION:{row['description']}\r\n")
+            if row["weekly"]:
+                f.write("RRULE:FREQ=WEEKLY;COUNT=20\r\n")
+            f.write("END:VEVENT\r\n")
+        f.write("END:VCALENDAR\r\n")
+
+
+def write_csv(rows: List[Dict], path: str) -> None:
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["date", "title", "category", "description", "event_time"])
+        for row in rows:
+            writer.writerow([row["date"].isoformat(), row["title"], row["category"], row["description"],
+                             "" if row["all_day"] else f"{row['hour']:02d}:00"])
+
+
+def time_bulk(backend: str, source: str) -> float:
+    with tempfile.TemporaryDirectory() as directory:
+        store = new_store(backend, directory)
+        start = time.perf_counter()
+        import_file(store, source)
+        elapsed = time.perf_counter() - start
+        close_store(store)
+        return elapsed
+
+
+def time_apply(backend: str, source: str) -> float:
+    """对照组：逐条 apply（每次修改立即写入），即逐个调用 add_event 的效果"""
+    with tempfile.TemporaryDirectory() as directory:
+        store = new_store(backend, directory)
+        start = time.perf_counter()
+        for event in parse_csv(LineReader(source), ImportResult()):
+            store.apply({"op": "add", "date": event.date.isoformat(), "event": event})
+        elapsed = time.perf_counter() - start
+        close_store(store)
+        return elapsed
+
+
+def main() -> None:
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for count in sizes:
+            rows = generate_rows(count)
+            ics_path = os.path.join(directory, f"events_{count}.ics")
+            csv_path = os.path.join(directory, f"events_{count}.csv")
+            write_ics(rows, ics_path)
+            write_csv(rows, csv_path)
+            for backend in BACKENDS:
+                results.append((count, backend, "ics", time_bulk(backend, ics_path)))
+                results.append((count, backend, "csv", time_bulk(backend, csv_path)))
+                if count <= APPLY_LIMIT:
+                    results.append((count, backend, "逐条", time_apply(backend, csv_path)))
+
+    print(f"\n{'事件数':>10} {'存储':>8} {'方式':>6} {'耗时(s)':>9} {'条/秒':>10}")
+    for count, backend, mode, elapsed in results:
+        print(f"{count:>10} {backend:>8} {mode:>6} {elapsed:>9.3f} {count / elapsed:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
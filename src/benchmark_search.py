@@ -0,0 +1,80 @@
+"""
+搜索基准：比较倒排索引搜索与逐个检查全部事件的耗时，关键词模拟逐字输入时的每一次搜索。
+分别测量实时建议（前 5 条，索引从参考日期向两侧查找，找够即停止）和结果对话框第一页（前 30 条，按页出堆），
+只为返回的结果取出事件。较长的前缀从上一个前缀缓存的命中中筛选。
+最后一列是把全部年份移出内存（界面每次渲染都会移除冷门年份）之后第一次搜索建议的耗时。
+
+用法: python benchmark_search.py [事件数 ...]
+默认依次测试 10000、100000、300000 个事件。
+"""
+import sys
+import tempfile
+import time
+from typing import List
+from benchmark_fixtures import FIRST_DAY, close_store, generate_events, new_store
+from data import Event
+from search_index import RankedHits
+
+DEFAULT_SIZES = [10_000, 100_000, 300_000]
+BACKENDS = ["json", "sharded", "sqlite"]
+# 逐字输入的关键词：每个前缀都搜索一次
+QUERIES = ["项目周会", "代码评审", "看牙医 12", "备注", "gym", "周"]
+SUGGESTION_LIMIT = 5
+PAGE_SIZE = 30
+# 命中超过这个比例的关键词算作大量结果
+BROAD_FRACTION = 0.01
+
+
+def linear_search(events: List[Event], keyword: str) -> int:
+    """对照组：逐个检查标题、描述、分类（引入索引之前的做法）"""
+    keyword = keyword.lower()
+    return sum(1 for event in events if keyword in event.title.lower() or
+               keyword in event.description.lower() or keyword in event.category.lower())
+
+
+def average(timings: List[float]) -> float:
+    return sum(timings) / len(timings) if timings else 0.0
+
+
+def main() -> None:
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    prefixes = [query[:length] for query in QUERIES for length in range(1, len(query) + 1)]
+    print(f"{'事件数':>8} {'存储':>7} {'建索引(s)':>10} {'建议平均(ms)':>12} {'建议最慢(ms)':>12} "
+          f"{'大量结果建议(ms)':>16} {'首页平均(ms)':>12} {'逐个检查平均(ms)':>16} {'移出年份后建议(ms)':>18}")
+    for count in sizes:
+        events = generate_events(count)
+        reference_ord = FIRST_DAY.toordinal() + count // 6  # 事件日期范围的中间
+        start = time.perf_counter()
+        for keyword in prefixes:
+            linear_search(events, keyword)
+        linear_ms = (time.perf_counter() - start) * 1000 / len(prefixes)
+        for backend in BACKENDS:
+            with tempfile.TemporaryDirectory() as directory:
+                store = new_store(backend, directory)
+                store.bulk_add([events])
+                start = time.perf_counter()
+                store.search_hits("\0")  # 第一次搜索时建立索引
+                build_seconds = time.perf_counter() - start
+                selective, broad, first_pages = [], [], []
+                for keyword in prefixes:
+                    # 建议在上一个前缀之后搜索，可以从上一个前缀缓存的命中中筛选
+                    start = time.perf_counter()
+                    store.resolve_hits([hit[2] for hit in store.search_hits(keyword, reference_ord, SUGGESTION_LIMIT)])
+                    elapsed = (time.perf_counter() - start) * 1000
+                    start = time.perf_counter()
+                    hits = store.search_hits(keyword)
+                    store.resolve_hits([hit[2] for hit in RankedHits(hits, reference_ord).next_page(PAGE_SIZE)])
+                    first_pages.append((time.perf_counter() - start) * 1000)
+                    (selective if len(hits) <= count * BROAD_FRACTION else broad).append(elapsed)
+                store.evict_years(set())
+                start = time.perf_counter()
+                store.resolve_hits([hit[2] for hit in store.search_hits(QUERIES[0], reference_ord, SUGGESTION_LIMIT)])
+                after_evict_ms = (time.perf_counter() - start) * 1000
+                close_store(store)
+            print(f"{count:>8} {backend:>7} {build_seconds:>10.2f} {average(selective):>12.2f} "
+                  f"{max(selective, default=0):>12.2f} {average(broad):>16.2f} {average(first_pages):>12.2f} "
+                  f"{linear_ms:>16.2f} {after_evict_ms:>18.2f}")
+
+
+if __name__ == "__main__":
+    main()
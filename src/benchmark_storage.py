@@ -0,0 +1,73 @@
+"""
+事件存储格式基准：比较 JSON（应用当前写出的排版）与紧凑二进制格式的保存/加载耗时和文件大小。
+
+用法: python benchmark_storage.py [事件数 ...]
+默认依次测试 10000、100000、1000000 个事件。
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+from benchmark_fixtures import events_by_date, generate_events
+from data import events_to_json
+from event_codec import decode_events, encode_events
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+
+def timed(func: Callable[[], object]) -> Tuple[float, object]:
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def run(count: int, directory: str) -> Dict[str, float]:
+    single_events = events_to_json(events_by_date(generate_events(count)))
+    periodic_rules: List[Dict] = []
+    json_path = os.path.join(directory, f"events_{count}.json")
+    binary_path = os.path.join(directory, f"events_{count}.bin")
+
+    def save_json():
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump({"single_events": single_events, "periodic_rules": periodic_rules}, f,
+                      ensure_ascii=False, indent=4)
+
+    def load_json():
+        with open(json_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save_binary():
+        with open(binary_path, "wb") as f:
+            f.write(encode_events(single_events, periodic_rules))
+
+    def load_binary():
+        with open(binary_path, "rb") as f:
+            return decode_events(f.read())
+
+    json_save, _ = timed(save_json)
+    json_load, loaded_json = timed(load_json)
+    binary_save, _ = timed(save_binary)
+    binary_load, loaded_binary = timed(load_binary)
+    if loaded_binary[0] != loaded_json["single_events"]:
+        raise AssertionError("二进制格式往返结果与 JSON 不一致")
+    return {
+        "json_save": json_save, "json_load": json_load, "json_size": os.path.getsize(json_path),
+        "binary_save": binary_save, "binary_load": binary_load, "binary_size": os.path.getsize(binary_path),
+    }
+
+
+def main() -> None:
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    print(f"{'事件数':>10} {'格式':>6} {'保存(s)':>9} {'加载(s)':>9} {'大小(MB)':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for count in sizes:
+            result = run(count, directory)
+            for name in ("json", "binary"):
+                print(f"{count:>10} {name:>6} {result[name + '_save']:>9.3f} {result[name + '_load']:>9.3f} "
+                      f"{result[name + '_size'] / 1024 / 1024:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
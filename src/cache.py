@@ -0,0 +1,93 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class LRUCache:
+    """
+    容量有限的 LRU 缓存：超过容量时淘汰最久未使用的条目，
+    并记录命中、未命中和淘汰次数，便于根据实际访问量调整容量。
+    读写都加锁，可以在后台预取线程中共用。
+    """
+
+    def __init__(self, capacity: int):
+        if capacity <= 0:
+            raise ValueError("缓存容量必须大于 0")
+        self._capacity = capacity
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """读取缓存，命中时把条目标记为最近使用"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def __contains__(self, key: Hashable) -> bool:
+        """只检查是否存在，不计入命中统计，也不改变使用顺序"""
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def resize(self, capacity: int) -> None:
+        """调整容量，缩小时立即淘汰多出的条目"""
+        if capacity <= 0:
+            raise ValueError("缓存容量必须大于 0")
+        with self._lock:
+            self._capacity = capacity
+            self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """返回缓存统计：容量、当前大小、命中、未命中、淘汰次数"""
+        with self._lock:
+            return {
+                "capacity": self._capacity,
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _evict(self) -> None:
+        while len(self._entries) > self._capacity:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+
+# 进程内共享的命名缓存：同一进程的多个页面会话共用，避免每个会话各存一份
+_shared_caches: Dict[str, LRUCache] = {}
+_shared_caches_lock = threading.Lock()
+
+
+def get_shared_cache(name: str, capacity: int) -> LRUCache:
+    """获取指定名称的共享缓存，不存在时按给定容量创建；已存在时直接返回，容量以创建时为准（需要调整时显式调用 resize）"""
+    with _shared_caches_lock:
+        cache: Optional[LRUCache] = _shared_caches.get(name)
+        if cache is None:
+            cache = LRUCache(capacity)
+            _shared_caches[name] = cache
+        return cache
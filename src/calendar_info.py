@@ -0,0 +1,175 @@
+from datetime import date, timedelta
+from typing import Dict, FrozenSet, Iterator, List, Tuple
+from lunarcalendar import Converter, Solar
+from lunarcalendar.festival import festivals
+from lunarcalendar.solarterm import solarterms
+import chinese_calendar as cn_cal
+
+# 二十四节气
+SOLAR_TERM_NAMES: FrozenSet[str] = frozenset([
+    '立春', '雨水', '惊蛰', '春分', '清明', '谷雨', '立夏', '小满', '芒种', '夏至', '小暑', '大暑',
+    '立秋', '处暑', '白露', '秋分', '寒露', '霜降', '立冬', '小雪', '大雪', '冬至'
+])
+
+# 优先显示的传统节日
+MAJOR_FESTIVAL_NAMES: FrozenSet[str] = frozenset([
+    '除夕', '春节', '元宵节', '龙抬头', '端午节', '七夕', '中元节', '中秋节', '重阳节', '腊八节'
+])
+
+# 年份 -> {日期: (节气, 重要节日, 其他节日)}，每年只在第一次用到时计算一次
+_festival_tables: Dict[int, Dict[date, Tuple[str, str, str]]] = {}
+
+
+def build_festival_table(year: int) -> Dict[date, Tuple[str, str, str]]:
+    """
+    计算某一年所有节日和节气的日期表。
+    同一天有多个名称时按以下优先级只保留一个：节气 > 重要节日 > 其他节日（取第一个）。
+    """
+    names_by_date: Dict[date, List[str]] = {}
+    for fest in festivals + solarterms:
+        try:
+            fest_date = fest(year)
+        except Exception as e:
+            print(f"Error computing festival {fest.get_lang('zh')} for {year}: {e}")
+            continue
+        # 只收录落在当年的日期（部分农历节日会落到下一个公历年）
+        if fest_date.year == year:
+            names_by_date.setdefault(fest_date, []).append(fest.get_lang('zh'))
+
+    table: Dict[date, Tuple[str, str, str]] = {}
+    for fest_date, names in names_by_date.items():
+        solar_term = next((name for name in names if name in SOLAR_TERM_NAMES), "")
+        major_festival = ""
+        if not solar_term:
+            major_festival = next((name for name in names if name in MAJOR_FESTIVAL_NAMES), "")
+        other_festival = names[0] if not solar_term and not major_festival else ""
+        table[fest_date] = (solar_term, major_festival, other_festival)
+    return table
+
+
+def get_festival_table(year: int) -> Dict[date, Tuple[str, str, str]]:
+    """获取某一年的节日节气表，首次访问时计算并缓存"""
+    table = _festival_tables.get(year)
+    if table is None:
+        table = build_festival_table(year)
+        _festival_tables[year] = table
+    return table
+
+
+def get_festival_info(day: date) -> Tuple[str, str, str]:
+    """查询某天的 (节气, 重要节日, 其他节日)，没有则为空字符串"""
+    return get_festival_table(day.year).get(day, ("", "", ""))
+
+
+def lunar_month_length(lunar_year: int, lunar_month: int, is_leap: bool) -> int:
+    """根据 lunarcalendar 的农历月份数据返回某个农历月的天数（29 或 30）"""
+    month_data = Converter.lunar_month_days[lunar_year - Converter.lunar_month_days[0]]
+    leap_month = (month_data >> 13) & 0xF
+    # 月份在当年中的顺序位置：闰月紧跟在同名月之后
+    if is_leap or (leap_month and lunar_month > leap_month):
+        position = lunar_month
+    else:
+        position = lunar_month - 1
+    return 30 if (month_data >> (12 - position)) & 1 else 29
+
+
+def next_lunar_month(lunar_year: int, lunar_month: int, is_leap: bool) -> Tuple[int, int, bool]:
+    """返回下一个农历月 (年, 月, 是否闰月)"""
+    month_data = Converter.lunar_month_days[lunar_year - Converter.lunar_month_days[0]]
+    leap_month = (month_data >> 13) & 0xF
+    if not is_leap and lunar_month == leap_month:
+        return lunar_year, lunar_month, True
+    if lunar_month == 12:
+        return lunar_year + 1, 1, False
+    return lunar_year, lunar_month + 1, False
+
+
+def iter_lunar_dates(start: date, end: date) -> Iterator[Tuple[date, int, int, bool]]:
+    """
+    逐日生成 [start, end] 区间的农历日期 (公历日期, 农历月, 农历日, 是否闰月)。
+    只对第一天调用一次 Solar2Lunar，之后按农历日逐日递增，跨月时查月份天数表确定下一个月。
+    """
+    if start > end:
+        return
+    lunar = Converter.Solar2Lunar(Solar(start.year, start.month, start.day))
+    lunar_year, lunar_month, lunar_day, is_leap = lunar.year, lunar.month, lunar.day, lunar.isleap
+    month_length = lunar_month_length(lunar_year, lunar_month, is_leap)
+    current = start
+    while True:
+        yield current, lunar_month, lunar_day, is_leap
+        if current >= end:
+            break
+        current += timedelta(days=1)
+        lunar_day += 1
+        if lunar_day > month_length:
+            lunar_year, lunar_month, is_leap = next_lunar_month(lunar_year, lunar_month, is_leap)
+            lunar_day = 1
+            month_length = lunar_month_length(lunar_year, lunar_month, is_leap)
+
+
+class YearHolidays:
+    """
+    某一年的节假日数据：法定休息日和调休上班日各用一个 366 位的位图表示（按年内第几天编号），
+    节日名称稀疏存放。超出 chinese_calendar 数据范围的年份 has_data 为 False。
+    """
+    __slots__ = ("year", "has_data", "rest_days", "makeup_workdays", "names")
+
+    def __init__(self, year: int, has_data: bool):
+        self.year = year
+        self.has_data = has_data
+        self.rest_days = 0
+        self.makeup_workdays = 0
+        self.names: Dict[int, str] = {}
+
+    def lookup(self, day: date) -> Tuple[bool, bool, str]:
+        """查询 (是否法定休息日, 是否调休上班, 节日名称)"""
+        if not self.has_data:
+            return False, False, ""
+        bit = day.timetuple().tm_yday - 1
+        return (bool((self.rest_days >> bit) & 1), bool((self.makeup_workdays >> bit) & 1),
+                self.names.get(bit, ""))
+
+
+# 年份 -> 节假日位图，首次使用时从 chinese_calendar 的 holidays/workdays 数据一次性生成
+_year_holidays: Dict[int, YearHolidays] = {}
+
+
+def _build_year_holidays() -> None:
+    """遍历一次 chinese_calendar 的节假日和调休数据，生成其覆盖范围内每一年的位图"""
+    holidays, workdays = cn_cal.holidays, cn_cal.workdays
+    first_year, last_year = min(holidays).year, max(holidays).year
+    tables = {year: YearHolidays(year, True) for year in range(first_year, last_year + 1)}
+    for day, name in holidays.items():
+        table = tables.get(day.year)
+        if table is None or day in workdays:
+            continue
+        bit = day.timetuple().tm_yday - 1
+        table.rest_days |= 1 << bit
+        if name:
+            table.names[bit] = name
+    for day, name in workdays.items():
+        table = tables.get(day.year)
+        if table is None:
+            continue
+        bit = day.timetuple().tm_yday - 1
+        if day.weekday() >= 5:
+            table.makeup_workdays |= 1 << bit
+        if name:
+            table.names[bit] = name
+    _year_holidays.update(tables)
+
+
+def get_year_holidays(year: int) -> YearHolidays:
+    """获取某一年的节假日位图；库中没有数据的年份缓存为"无数据"，不再逐日抛出异常"""
+    if not _year_holidays:
+        _build_year_holidays()
+    table = _year_holidays.get(year)
+    if table is None:
+        table = YearHolidays(year, False)
+        _year_holidays[year] = table
+    return table
+
+
+def compute_holiday_info(day: date) -> Tuple[bool, bool, str]:
+    """计算 (是否法定休息日, 是否调休上班, 节日名称)，按位图查询；无数据的年份返回 (False, False, "")"""
+    return get_year_holidays(day.year).lookup(day)
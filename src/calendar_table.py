@@ -0,0 +1,171 @@
+import json
+import mmap
+import os
+import struct
+import threading
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+import chinese_calendar as cn_cal
+import lunarcalendar
+from calendar_info import compute_holiday_info, get_festival_table, iter_lunar_dates
+
+# 随代码一起提供的预计算表（由本文件的 __main__ 生成），与模块放在同一目录
+DEFAULT_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "calendar_table.bin")
+
+# 预计算表覆盖的年份范围
+TABLE_FIRST_YEAR = 1900
+TABLE_LAST_YEAR = 2100
+
+# 文件头：魔数、格式版本、起止年份、名称表长度；随后是 JSON 名称表和逐日定长记录
+TABLE_MAGIC = b"GOOSECAL"
+TABLE_VERSION = 1
+HEADER_FORMAT = "<8sHHHI"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+# 每天一条记录：农历月、农历日、标志位、节日/节气名称编号、节假日名称编号
+RECORD_FORMAT = "<BBBBB"
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+
+# 标志位
+FLAG_LEAP = 0x01  # 闰月
+FLAG_REST_DAY = 0x02  # 法定休息日
+FLAG_MAKEUP_WORKDAY = 0x04  # 调休上班
+FESTIVAL_KIND_SHIFT = 4  # 第 4、5 位：节日类型 0 无 / 1 节气 / 2 重要节日 / 3 其他节日
+
+
+class CalendarTable:
+    """内存映射的农历/节假日预计算表，按日期序数直接定位定长记录"""
+
+    def __init__(self, path: str, buffer: mmap.mmap, first_year: int, last_year: int, names: List[str],
+                 records_offset: int):
+        self.path = path
+        self._buffer = buffer
+        self._first_ord = date(first_year, 1, 1).toordinal()
+        self._last_ord = date(last_year, 12, 31).toordinal()
+        self._names = names
+        self._records_offset = records_offset
+
+    def covers(self, day: date) -> bool:
+        """判断日期是否在表的覆盖范围内"""
+        return self._first_ord <= day.toordinal() <= self._last_ord
+
+    def _record(self, day: date) -> Optional[Tuple[int, int, int, int, int]]:
+        day_ord = day.toordinal()
+        if not self._first_ord <= day_ord <= self._last_ord:
+            return None
+        offset = self._records_offset + (day_ord - self._first_ord) * RECORD_SIZE
+        return struct.unpack_from(RECORD_FORMAT, self._buffer, offset)
+
+    def lunar(self, day: date) -> Optional[Tuple[int, int, bool, Tuple[str, str, str]]]:
+        """查询 (农历月, 农历日, 是否闰月, (节气, 重要节日, 其他节日))，超出范围返回 None"""
+        record = self._record(day)
+        if record is None:
+            return None
+        lunar_month, lunar_day, flags, festival_id, _ = record
+        festival = ["", "", ""]
+        festival_kind = (flags >> FESTIVAL_KIND_SHIFT) & 0x3
+        if festival_kind:
+            festival[festival_kind - 1] = self._names[festival_id]
+        return lunar_month, lunar_day, bool(flags & FLAG_LEAP), tuple(festival)
+
+    def holiday(self, day: date) -> Optional[Tuple[bool, bool, str]]:
+        """查询 (是否法定休息日, 是否调休上班, 节日名称)，超出范围返回 None"""
+        record = self._record(day)
+        if record is None:
+            return None
+        _, _, flags, _, holiday_name_id = record
+        return bool(flags & FLAG_REST_DAY), bool(flags & FLAG_MAKEUP_WORKDAY), self._names[holiday_name_id]
+
+    def close(self) -> None:
+        self._buffer.close()
+
+
+def _source_versions() -> Dict[str, str]:
+    """生成表所依赖的数据源版本（节假日和农历、节日节气两个库），任一版本变化时需要重新生成"""
+    return {"chinese_calendar": getattr(cn_cal, "__version__", ""),
+            "lunarcalendar": getattr(lunarcalendar, "__version__", "")}
+
+
+def build_calendar_table(path: str, first_year: int = TABLE_FIRST_YEAR, last_year: int = TABLE_LAST_YEAR) -> None:
+    """生成预计算表文件：逐日写入农历、节日节气和节假日信息，写完后原子替换"""
+    names: List[str] = [""]
+    name_ids: Dict[str, int] = {"": 0}
+
+    def name_id(name: str) -> int:
+        if name not in name_ids:
+            if len(names) >= 256:
+                raise ValueError("名称表超过 256 项，无法用单字节编号")
+            name_ids[name] = len(names)
+            names.append(name)
+        return name_ids[name]
+
+    records = bytearray()
+    for day, lunar_month, lunar_day, is_leap in iter_lunar_dates(date(first_year, 1, 1), date(last_year, 12, 31)):
+        flags = FLAG_LEAP if is_leap else 0
+        festival_id = 0
+        for kind, festival_name in enumerate(get_festival_table(day.year).get(day, ("", "", "")), start=1):
+            if festival_name:
+                flags |= kind << FESTIVAL_KIND_SHIFT
+                festival_id = name_id(festival_name)
+                break
+        is_rest_day, is_makeup_workday, holiday_name = compute_holiday_info(day)
+        if is_rest_day:
+            flags |= FLAG_REST_DAY
+        if is_makeup_workday:
+            flags |= FLAG_MAKEUP_WORKDAY
+        records += struct.pack(RECORD_FORMAT, lunar_month, lunar_day, flags, festival_id, name_id(holiday_name))
+
+    names_blob = json.dumps({"names": names, "sources": _source_versions()}, ensure_ascii=False).encode("utf-8")
+    header = struct.pack(HEADER_FORMAT, TABLE_MAGIC, TABLE_VERSION, first_year, last_year, len(names_blob))
+
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(header)
+        f.write(names_blob)
+        f.write(records)
+    os.replace(temp_path, path)
+
+
+def open_calendar_table(path: str) -> Optional[CalendarTable]:
+    """以只读内存映射方式打开预计算表；文件缺失、损坏或数据源版本不一致时返回 None"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, first_year, last_year, names_length = struct.unpack_from(HEADER_FORMAT, buffer, 0)
+        meta = json.loads(buffer[HEADER_SIZE:HEADER_SIZE + names_length].decode("utf-8"))
+        records_offset = HEADER_SIZE + names_length
+        day_count = date(last_year, 12, 31).toordinal() - date(first_year, 1, 1).toordinal() + 1
+        if (magic != TABLE_MAGIC or version != TABLE_VERSION or meta.get("sources") != _source_versions()
+                or len(buffer) != records_offset + day_count * RECORD_SIZE):
+            buffer.close()
+            print(f"预计算表 {path} 已过期或格式不符，改为逐日计算；运行 python calendar_table.py 可重新生成。")
+            return None
+        return CalendarTable(path, buffer, first_year, last_year, meta["names"], records_offset)
+    except (OSError, ValueError, struct.error) as e:
+        print(f"打开预计算表 {path} 时出错: {e}")
+        return None
+
+
+# 进程内共享的表实例：多个页面会话共用同一份内存映射
+_shared_table: Optional[CalendarTable] = None
+_shared_table_lock = threading.Lock()
+
+
+def get_calendar_table(path: str) -> Optional[CalendarTable]:
+    """获取共享的预计算表，尚未打开时尝试打开"""
+    global _shared_table
+    if _shared_table is None:
+        with _shared_table_lock:
+            if _shared_table is None:
+                _shared_table = open_calendar_table(path)
+    return _shared_table
+
+
+if __name__ == "__main__":
+    import sys
+
+    output_path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_TABLE_PATH
+    build_calendar_table(output_path)
+    print(f"预计算表已生成: {output_path}")
@@ -1,32 +1,354 @@
+import sys
+import uuid
+from bisect import bisect_left, bisect_right
+from datetime import date
+from typing import Dict, List, Optional, Tuple, Union
+
+# 事件分类（顺序即编号，只能在末尾追加）
+CATEGORIES: Tuple[str, ...] = ("工作", "日常", "个人生活", "自定义")
+
+# 全天事件的时段名称
+ALL_DAY = "全天"
+
+# 事件时段（顺序即编号，只能在末尾追加）
+TIME_SLOTS: Tuple[str, ...] = (
+    ALL_DAY, "00:00-02:00", "02:00-04:00", "04:00-06:00", "06:00-08:00",
+    "08:00-10:00", "10:00-12:00", "12:00-14:00", "14:00-16:00",
+    "16:00-18:00", "18:00-20:00", "20:00-22:00", "22:00-24:00"
+)
+
+
+def parse_date(date_str: Optional[str]) -> Optional[date]:
+    """解析 YYYY-MM-DD 格式的日期字符串，无效时返回 None"""
+    if not date_str:
+        return None
+    try:
+        return date.fromisoformat(date_str)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_ordinals(date_strs) -> List[int]:
+    """把日期字符串列表解析为升序的日期序数列表，忽略无效日期"""
+    ordinals = set()
+    for date_str in date_strs or []:
+        parsed = parse_date(date_str)
+        if parsed:
+            ordinals.add(parsed.toordinal())
+    return sorted(ordinals)
+
+
+def compact_ordinals(ordinals, end_ord: Optional[int] = None) -> List[int]:
+    """去重并升序排列日期序数，丢弃 end_ord 之后的日期"""
+    if not ordinals:
+        return []
+    result = sorted(set(ordinals))
+    if end_ord is not None:
+        del result[bisect_right(result, end_ord):]
+    return result
+
+
+def _parse_minutes(clock: str) -> Optional[int]:
+    hours, _, minutes = clock.partition(":")
+    if not (hours.isdigit() and minutes.isdigit()):
+        return None
+    return int(hours) * 60 + int(minutes)
+
+
+class TimeSlot:
+    """
+    事件时段：名称（如 "08:00-10:00"）和预先解析好的起止分钟数，全天事件的起止为 None。
+    同名时段全局只有一个实例，事件之间共用。
+    """
+    __slots__ = ("label", "start_minute", "end_minute")
+
+    def __init__(self, label: str):
+        self.label = label
+        self.start_minute: Optional[int] = None
+        self.end_minute: Optional[int] = None
+        if label != ALL_DAY:
+            start, _, end = label.partition("-")
+            self.start_minute = _parse_minutes(start)
+            self.end_minute = _parse_minutes(end)
+
+    @property
+    def sort_minute(self) -> int:
+        """排序用的开始分钟数：全天事件排在最前，无法解析的时段排在最后"""
+        if self.label == ALL_DAY:
+            return 0
+        return self.start_minute if self.start_minute is not None else 24 * 60
+
+    def __repr__(self) -> str:
+        return f"TimeSlot({self.label!r})"
+
+
+_time_slots: Dict[str, TimeSlot] = {label: TimeSlot(label) for label in TIME_SLOTS}
+_categories: Dict[str, str] = {name: name for name in CATEGORIES}
+
+
+def get_time_slot(label: str) -> TimeSlot:
+    """获取时段的共享实例，未知的时段名称首次出现时创建"""
+    slot = _time_slots.get(label)
+    if slot is None:
+        slot = _time_slots.setdefault(label, TimeSlot(label))
+    return slot
+
+
+def intern_category(name: str) -> str:
+    """返回分类名称的共享字符串，所有事件的同名分类指向同一个对象"""
+    return _categories.get(name) or sys.intern(name)
+
+
+def new_item_id() -> str:
+    """生成事件或规则的唯一编号，创建后不再改变"""
+    return uuid.uuid4().hex
+
+
+def _take_id(data: Dict) -> Optional[str]:
+    item_id = data.get("id")
+    return item_id if isinstance(item_id, str) and item_id else None
+
+
+def _take_str(data: Dict, key: str, default: str, extras: Dict) -> str:
+    """取出字符串字段；类型不符时原值放入 extras，转换回 JSON 时原样还原"""
+    value = data.get(key, default)
+    if isinstance(value, str):
+        return value
+    extras[key] = value
+    return default
+
+
 class Event:
-    def __init__(self, name, pinned_date, start_time, end_time, is_periodic=False):
-        self.name = name
-        self.date = pinned_date
-        self.start_time = start_time
-        self.end_time = end_time
-        self.is_periodic = is_periodic
-        self.description = ""
-        self.repeat_interval = ""
-
-    def load_from_json(self, json_event):
-        self.name = json_event["name"]
-        self.date = json_event["date"]
-        self.start_time = json_event["start_time"]
-        self.end_time = json_event["end_time"]
-        self.is_periodic = json_event["is_periodic"]
-        self.description = json_event["description"]
-        self.repeat_interval = json_event["repeat_interval"]
-
-    def to_json(self):
-        return {
-            "name": self.name,
-            "date": self.date,
-            "start_time": self.start_time,
-            "end_time": self.end_time,
-            "is_periodic": self.is_periodic,
+    """普通（非周期性）事件，日期以序数保存，id 为创建时生成的唯一编号"""
+    __slots__ = ("id", "date_ord", "title", "category", "description", "time_slot", "created_at", "extras")
+
+    is_periodic = False
+
+    def __init__(self, date_ord: int, title: str, category: str, description: str = "",
+                 event_time: str = ALL_DAY, created_at: str = "", extras: Optional[Dict] = None,
+                 item_id: Optional[str] = None):
+        self.id = item_id or new_item_id()
+        self.date_ord = date_ord
+        self.title = title
+        self.category = intern_category(category)
+        self.description = description
+        self.time_slot = get_time_slot(event_time)
+        self.created_at = created_at
+        self.extras = extras  # 未识别的字段，保存时原样写回
+
+    @property
+    def date(self) -> date:
+        return date.fromordinal(self.date_ord)
+
+    @property
+    def event_time(self) -> str:
+        return self.time_slot.label
+
+    def update_fields(self, fields: Dict) -> None:
+        """按字段名修改标题、分类、描述或时段"""
+        _update_common_fields(self, fields)
+
+    @classmethod
+    def from_dict(cls, date_key: str, data: Dict) -> "Event":
+        """从 JSON 格式的事件字典创建事件"""
+        extras = {key: value for key, value in data.items() if key not in _EVENT_KEYS}
+        # 普通事件固定为非周期性、无周期信息，其他取值原样保留
+        if data.get("is_periodic", False) is not False:
+            extras["is_periodic"] = data["is_periodic"]
+        if data.get("period_info", {}) != {}:
+            extras["period_info"] = data["period_info"]
+        parsed = parse_date(date_key)
+        return cls(parsed.toordinal() if parsed else 0,
+                   _take_str(data, "title", "", extras),
+                   _take_str(data, "category", "日常", extras),
+                   _take_str(data, "description", "", extras),
+                   _take_str(data, "event_time", ALL_DAY, extras),
+                   _take_str(data, "created_at", "", extras),
+                   extras or None, _take_id(data))
+
+    def to_dict(self) -> Dict:
+        """转换为 JSON 格式的事件字典"""
+        data = {
+            "id": self.id,
+            "title": self.title,
+            "category": self.category,
             "description": self.description,
-            "repeat_interval": self.repeat_interval,
+            "event_time": self.time_slot.label,
+            "is_periodic": False,
+            "period_info": {},
+            "created_at": self.created_at
         }
+        if self.extras:
+            data.update(self.extras)
+        return data
+
+
+class RecurrenceRule:
+    """
+    周期性事件规则。起止日期、自定义日期和排除日期以序数保存；
+    周期信息拆成周期类型、间隔和单位（自定义周期）及自定义日期列表。id 为创建时生成的唯一编号。
+    自定义日期和排除日期是去重后的升序列表，按二分查找判断；结束日期之后的排除日期没有意义，不再保存。
+    """
+    __slots__ = ("id", "start_ord", "end_ord", "title", "category", "description", "time_slot", "created_at",
+                 "period_type", "interval", "unit", "custom_dates", "excluded_dates", "extras", "period_extras")
+
+    is_periodic = True
+
+    def __init__(self, start_ord: int, title: str, category: str, description: str = "",
+                 event_time: str = ALL_DAY, period_type: str = "", interval: int = 1, unit: str = "",
+                 custom_dates: Optional[List[int]] = None, created_at: str = "", end_ord: Optional[int] = None,
+                 excluded_dates: Optional[List[int]] = None, extras: Optional[Dict] = None,
+                 period_extras: Optional[Dict] = None, item_id: Optional[str] = None):
+        self.id = item_id or new_item_id()
+        self.start_ord = start_ord
+        self.end_ord = end_ord
+        self.title = title
+        self.category = intern_category(category)
+        self.description = description
+        self.time_slot = get_time_slot(event_time)
+        self.created_at = created_at
+        self.period_type = sys.intern(period_type)
+        self.interval = interval
+        self.unit = sys.intern(unit)
+        self.custom_dates: List[int] = compact_ordinals(custom_dates)
+        self.excluded_dates: List[int] = compact_ordinals(excluded_dates, end_ord)
+        self.extras = extras
+        self.period_extras = period_extras
+
+    @property
+    def event_time(self) -> str:
+        return self.time_slot.label
+
+    @property
+    def start_date(self) -> Optional[date]:
+        return date.fromordinal(self.start_ord) if self.start_ord else None
+
+    def update_fields(self, fields: Dict) -> None:
+        """按字段名修改标题、分类、描述或时段"""
+        _update_common_fields(self, fields)
+
+    def is_excluded(self, date_ord: int) -> bool:
+        index = bisect_left(self.excluded_dates, date_ord)
+        return index < len(self.excluded_dates) and self.excluded_dates[index] == date_ord
+
+    def exclude(self, date_ord: int) -> None:
+        """排除某一天（保持升序，结束日期之后的日期忽略）"""
+        if self.end_ord is not None and date_ord > self.end_ord:
+            return
+        index = bisect_left(self.excluded_dates, date_ord)
+        if index == len(self.excluded_dates) or self.excluded_dates[index] != date_ord:
+            self.excluded_dates.insert(index, date_ord)
+
+    def set_end(self, end_ord: Optional[int]) -> None:
+        """设置结束日期，同时丢弃结束日期之后的排除日期"""
+        self.end_ord = end_ord
+        if end_ord is not None:
+            del self.excluded_dates[bisect_right(self.excluded_dates, end_ord):]
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "RecurrenceRule":
+        """从 JSON 格式的规则字典创建规则"""
+        extras = {key: value for key, value in data.items() if key not in _RULE_KEYS}
+        period_info = data.get("period_info") or {}
+        if not isinstance(period_info, dict):
+            extras["period_info"], period_info = period_info, {}
+        period_extras = {key: value for key, value in period_info.items() if key not in _PERIOD_KEYS}
+        period_type = _take_str(period_info, "type", "", period_extras)
+        interval = 1
+        if "interval" in period_info:
+            try:
+                interval = int(period_info["interval"])
+            except (TypeError, ValueError):
+                interval = 0  # 无效的间隔，规则不会命中
+                period_extras["interval"] = period_info["interval"]
+        start = parse_date(data.get("original_date"))
+        end = parse_date(data.get("end_date"))
+        return cls(start.toordinal() if start else 0,
+                   _take_str(data, "title", "", extras),
+                   _take_str(data, "category", "日常", extras),
+                   _take_str(data, "description", "", extras),
+                   _take_str(data, "event_time", ALL_DAY, extras),
+                   period_type, interval,
+                   _take_str(period_info, "unit", "", period_extras),
+                   parse_ordinals(period_info.get("custom_dates")),
+                   _take_str(data, "created_at", "", extras),
+                   end.toordinal() if end else None,
+                   parse_ordinals(data.get("excluded_dates")),
+                   extras or None, period_extras or None, _take_id(data))
+
+    @property
+    def period_info(self) -> Dict:
+        """JSON 格式的周期信息"""
+        info: Dict = {"type": self.period_type}
+        if self.period_type == "自定义日期" or self.custom_dates:
+            info["custom_dates"] = [date.fromordinal(ordinal).isoformat() for ordinal in self.custom_dates]
+        if self.period_type == "自定义周期" or self.unit:
+            info["interval"] = self.interval
+            info["unit"] = self.unit
+        if self.period_extras:
+            info.update(self.period_extras)
+        return info
+
+    def to_dict(self) -> Dict:
+        """转换为 JSON 格式的规则字典"""
+        data = {
+            "id": self.id,
+            "title": self.title,
+            "category": self.category,
+            "description": self.description,
+            "event_time": self.time_slot.label,
+            "is_periodic": True,
+            "period_info": self.period_info,
+            "original_date": date.fromordinal(self.start_ord).isoformat() if self.start_ord else "",
+            "created_at": self.created_at,
+            "excluded_dates": [date.fromordinal(ordinal).isoformat() for ordinal in self.excluded_dates]
+        }
+        if self.end_ord is not None:
+            data["end_date"] = date.fromordinal(self.end_ord).isoformat()
+        if self.extras:
+            data.update(self.extras)
+        return data
+
+
+# 某一天的一条日程：普通事件，或在当天命中的周期性规则
+CalendarItem = Union[Event, RecurrenceRule]
+
+_EVENT_KEYS = frozenset(["id", "title", "category", "description", "event_time", "is_periodic", "period_info",
+                         "created_at"])
+_RULE_KEYS = _EVENT_KEYS | {"original_date", "end_date", "excluded_dates"}
+_PERIOD_KEYS = frozenset(["type", "interval", "unit", "custom_dates"])
+
+
+def _update_common_fields(item, fields: Dict) -> None:
+    for key, value in fields.items():
+        if key == "event_time":
+            item.time_slot = get_time_slot(value)
+        elif key == "category":
+            item.category = intern_category(value)
+        elif key in ("title", "description"):
+            setattr(item, key, value)
+        else:
+            raise ValueError(f"不支持修改的字段: {key}")
+
+
+def events_from_json(single_events: Dict[str, List[Dict]]) -> Dict[str, List[Event]]:
+    """把 JSON 格式的 {日期键: [事件字典]} 转换为事件对象"""
+    return {date_key: [Event.from_dict(date_key, item) for item in events_list]
+            for date_key, events_list in single_events.items()}
+
+
+def events_to_json(events_data: Dict[str, List[Event]]) -> Dict[str, List[Dict]]:
+    """把 {日期键: [事件]} 转换为 JSON 格式"""
+    return {date_key: [event.to_dict() for event in events_list] for date_key, events_list in events_data.items()}
+
+
+def rules_from_json(rules: List[Dict]) -> List[RecurrenceRule]:
+    return [RecurrenceRule.from_dict(item) for item in rules]
+
+
+def rules_to_json(rules: List[RecurrenceRule]) -> List[Dict]:
+    return [rule.to_dict() for rule in rules]
+
 
 class Calendar:
-    pass
\ No newline at end of file
+    pass
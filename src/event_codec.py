@@ -0,0 +1,281 @@
+import json
+import struct
+import sys
+from array import array
+from datetime import date
+from typing import Dict, List, Tuple
+from data import CATEGORIES, TIME_SLOTS
+
+# 紧凑二进制事件格式：与 JSON 格式 {"single_events": ..., "periodic_rules": ...} 可无损互转。
+#
+# 文件头：魔数、格式版本、事件数、字符串数、字符串表字节数、规则 JSON 长度
+# 随后依次是：
+#   字符串表     —— 每个字符串的字符数（uint32 数组）+ 拼接后整体编码的 UTF-8 字节，0 号为空字符串
+#   按列存放的事件 —— 日期序数、字段掩码、标志位、分类枚举、时段枚举（各一列），
+#                   标题、描述、创建时间、周期信息、额外字段、编号（字符串表编号，各一列）
+#   周期性规则    —— 紧凑 JSON（规则数量少且结构嵌套，不做列式存储）
+# 分类和时段按 data.CATEGORIES / data.TIME_SLOTS 的顺序存为小整数枚举；
+# 不在枚举中的取值、非字符串的字段和未知字段放进"额外字段"（紧凑 JSON），解码时原样还原。
+# 版本 1 没有编号列，仍可读取。
+
+BINARY_MAGIC = b"GOOSEEVB"
+BINARY_VERSION = 2
+SUPPORTED_VERSIONS = (1, 2)
+HEADER_FORMAT = "<8sHIIII"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+_CATEGORY_IDS: Dict[str, int] = {name: index for index, name in enumerate(CATEGORIES)}
+_TIME_SLOT_IDS: Dict[str, int] = {name: index for index, name in enumerate(TIME_SLOTS)}
+
+# 字段掩码：对应字段存在于事件中，且已编码在列中
+FIELD_TITLE = 0x01
+FIELD_CATEGORY = 0x02
+FIELD_DESCRIPTION = 0x04
+FIELD_EVENT_TIME = 0x08
+FIELD_IS_PERIODIC = 0x10
+FIELD_PERIOD_INFO = 0x20
+FIELD_CREATED_AT = 0x40
+FIELD_ID = 0x80
+ALL_FIELDS = 0xFF
+
+FLAG_IS_PERIODIC = 0x01
+
+# 列的顺序和元素类型（array 类型码）
+COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("date_ord", "i"), ("fields", "B"), ("flags", "B"), ("category", "B"), ("time_slot", "B"),
+    ("title", "I"), ("description", "I"), ("created_at", "I"), ("period_info", "I"), ("extras", "I"),
+    ("id", "I"),
+)
+# 各版本文件中实际存在的列
+_VERSION_COLUMNS: Dict[int, Tuple[Tuple[str, str], ...]] = {1: COLUMNS[:-1], 2: COLUMNS}
+
+_STANDARD_KEYS = frozenset(["id", "title", "category", "description", "event_time", "is_periodic",
+                            "period_info", "created_at"])
+
+
+def _compact_json(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def _column_bytes(column: array) -> bytes:
+    """列数据统一按小端序存放"""
+    if sys.byteorder == "big":
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+def _read_column(typecode: str, buffer: bytes, offset: int, count: int) -> Tuple[array, int]:
+    column = array(typecode)
+    end = offset + count * column.itemsize
+    if end > len(buffer):
+        raise ValueError("事件文件不完整")
+    column.frombytes(buffer[offset:end])
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column, end
+
+
+def encode_events(single_events: Dict[str, List[Dict]], periodic_rules: List[Dict]) -> bytes:
+    """把 JSON 格式的事件数据编码为紧凑二进制格式"""
+    strings: List[str] = [""]
+    string_ids: Dict[str, int] = {"": 0}
+
+    def string_id(value: str) -> int:
+        index = string_ids.get(value)
+        if index is None:
+            index = len(strings)
+            string_ids[value] = index
+            strings.append(value)
+        return index
+
+    columns = {name: array(typecode) for name, typecode in COLUMNS}
+    for date_key, events_list in single_events.items():
+        try:
+            date_ord = date.fromisoformat(date_key).toordinal()
+        except ValueError:
+            raise ValueError(f"无法编码的日期键: {date_key}")
+        if date.fromordinal(date_ord).isoformat() != date_key:
+            raise ValueError(f"无法编码的日期键: {date_key}")
+        for event in events_list:
+            fields, flags, category, time_slot = 0, 0, 0, 0
+            title = description = created_at = period_info = item_id = 0
+            extras = {key: value for key, value in event.items() if key not in _STANDARD_KEYS}
+
+            value = event.get("id")
+            if isinstance(value, str):
+                fields |= FIELD_ID
+                item_id = string_id(value)
+            elif "id" in event:
+                extras["id"] = value
+            value = event.get("title")
+            if isinstance(value, str):
+                fields |= FIELD_TITLE
+                title = string_id(value)
+            elif "title" in event:
+                extras["title"] = value
+            value = event.get("description")
+            if isinstance(value, str):
+                fields |= FIELD_DESCRIPTION
+                description = string_id(value)
+            elif "description" in event:
+                extras["description"] = value
+            value = event.get("created_at")
+            if isinstance(value, str):
+                fields |= FIELD_CREATED_AT
+                created_at = string_id(value)
+            elif "created_at" in event:
+                extras["created_at"] = value
+            value = event.get("category")
+            if isinstance(value, str) and value in _CATEGORY_IDS:
+                fields |= FIELD_CATEGORY
+                category = _CATEGORY_IDS[value]
+            elif "category" in event:
+                extras["category"] = value
+            value = event.get("event_time")
+            if isinstance(value, str) and value in _TIME_SLOT_IDS:
+                fields |= FIELD_EVENT_TIME
+                time_slot = _TIME_SLOT_IDS[value]
+            elif "event_time" in event:
+                extras["event_time"] = value
+            value = event.get("is_periodic")
+            if isinstance(value, bool):
+                fields |= FIELD_IS_PERIODIC
+                flags |= FLAG_IS_PERIODIC if value else 0
+            elif "is_periodic" in event:
+                extras["is_periodic"] = value
+            if "period_info" in event:
+                fields |= FIELD_PERIOD_INFO
+                # 空字典最常见，用 0 号空字符串表示
+                period_info = string_id(_compact_json(event["period_info"])) if event["period_info"] != {} else 0
+
+            columns["date_ord"].append(date_ord)
+            columns["fields"].append(fields)
+            columns["flags"].append(flags)
+            columns["category"].append(category)
+            columns["time_slot"].append(time_slot)
+            columns["title"].append(title)
+            columns["description"].append(description)
+            columns["created_at"].append(created_at)
+            columns["period_info"].append(period_info)
+            columns["extras"].append(string_id(_compact_json(extras)) if extras else 0)
+            columns["id"].append(item_id)
+
+    # 字符串整体编码、整体解码，解码时按字符数切分，避免逐个字符串调用 decode
+    strings_blob = "".join(strings).encode("utf-8")
+    rules_blob = _compact_json(periodic_rules).encode("utf-8")
+    parts = [
+        struct.pack(HEADER_FORMAT, BINARY_MAGIC, BINARY_VERSION, len(columns["date_ord"]), len(strings),
+                    len(strings_blob), len(rules_blob)),
+        _column_bytes(array("I", [len(value) for value in strings])),
+        strings_blob,
+    ]
+    parts.extend(_column_bytes(columns[name]) for name, _ in COLUMNS)
+    parts.append(rules_blob)
+    return b"".join(parts)
+
+
+def decode_events(buffer: bytes) -> Tuple[Dict[str, List[Dict]], List[Dict]]:
+    """把紧凑二进制格式解码为 JSON 格式的 (普通事件字典, 周期性规则列表)"""
+    if len(buffer) < HEADER_SIZE:
+        raise ValueError("事件文件过短")
+    magic, version, event_count, string_count, strings_length, rules_length = \
+        struct.unpack_from(HEADER_FORMAT, buffer, 0)
+    if magic != BINARY_MAGIC or version not in SUPPORTED_VERSIONS:
+        raise ValueError("不是受支持的二进制事件文件")
+
+    lengths, offset = _read_column("I", buffer, HEADER_SIZE, string_count)
+    text = buffer[offset:offset + strings_length].decode("utf-8")
+    offset += strings_length
+    strings: List[str] = []
+    position = 0
+    for length in lengths:
+        strings.append(text[position:position + length])
+        position += length
+    columns: Dict[str, List[int]] = {"id": [0] * event_count}
+    for name, typecode in _VERSION_COLUMNS[version]:
+        column, offset = _read_column(typecode, buffer, offset, event_count)
+        columns[name] = column.tolist()
+    if offset + rules_length > len(buffer):
+        raise ValueError("事件文件不完整")
+    periodic_rules = json.loads(buffer[offset:offset + rules_length].decode("utf-8"))
+
+    single_events: Dict[str, List[Dict]] = {}
+    date_keys: Dict[int, str] = {}
+    rows = zip(columns["date_ord"], columns["fields"], columns["flags"], columns["category"],
+               columns["time_slot"], columns["title"], columns["description"], columns["created_at"],
+               columns["period_info"], columns["extras"], columns["id"])
+    for (date_ord, fields, flags, category, time_slot, title, description, created_at, info_id, extras_id,
+         item_id) in rows:
+        date_key = date_keys.get(date_ord)
+        if date_key is None:
+            date_key = date_keys[date_ord] = date.fromordinal(date_ord).isoformat()
+        if fields == ALL_FIELDS and not info_id and not extras_id:
+            # 最常见的情况：字段齐全、没有周期信息和额外字段
+            event = {
+                "id": strings[item_id],
+                "title": strings[title],
+                "category": CATEGORIES[category],
+                "description": strings[description],
+                "event_time": TIME_SLOTS[time_slot],
+                "is_periodic": bool(flags & FLAG_IS_PERIODIC),
+                "period_info": {},
+                "created_at": strings[created_at],
+            }
+            single_events.setdefault(date_key, []).append(event)
+            continue
+        event = {}
+        if fields & FIELD_ID:
+            event["id"] = strings[item_id]
+        if fields & FIELD_TITLE:
+            event["title"] = strings[title]
+        if fields & FIELD_CATEGORY:
+            event["category"] = CATEGORIES[category]
+        if fields & FIELD_DESCRIPTION:
+            event["description"] = strings[description]
+        if fields & FIELD_EVENT_TIME:
+            event["event_time"] = TIME_SLOTS[time_slot]
+        if fields & FIELD_IS_PERIODIC:
+            event["is_periodic"] = bool(flags & FLAG_IS_PERIODIC)
+        if fields & FIELD_PERIOD_INFO:
+            # 每个事件单独解析出自己的字典，避免修改一个事件时影响共用同一字符串的其他事件
+            event["period_info"] = json.loads(strings[info_id]) if info_id else {}
+        if fields & FIELD_CREATED_AT:
+            event["created_at"] = strings[created_at]
+        if extras_id:
+            event.update(json.loads(strings[extras_id]))
+        single_events.setdefault(date_key, []).append(event)
+    return single_events, periodic_rules
+
+
+def is_binary_events(buffer: bytes) -> bool:
+    """判断数据是否为二进制事件格式"""
+    return buffer[:len(BINARY_MAGIC)] == BINARY_MAGIC
+
+
+def json_file_to_binary(json_path: str, binary_path: str) -> None:
+    """把 JSON 事件文件转换为二进制格式"""
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    with open(binary_path, "wb") as f:
+        f.write(encode_events(data.get("single_events", {}), data.get("periodic_rules", [])))
+
+
+def binary_file_to_json(binary_path: str, json_path: str) -> None:
+    """把二进制事件文件转换回 JSON 格式（与应用写出的 JSON 排版一致）"""
+    with open(binary_path, "rb") as f:
+        single_events, periodic_rules = decode_events(f.read())
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump({"single_events": single_events, "periodic_rules": periodic_rules}, f,
+                  ensure_ascii=False, indent=4)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] not in ("to-binary", "to-json"):
+        print("用法: python event_codec.py to-binary|to-json <输入文件> <输出文件>")
+        sys.exit(1)
+    if sys.argv[1] == "to-binary":
+        json_file_to_binary(sys.argv[2], sys.argv[3])
+    else:
+        binary_file_to_json(sys.argv[2], sys.argv[3])
+    print(f"已转换: {sys.argv[2]} -> {sys.argv[3]}")
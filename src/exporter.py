@@ -0,0 +1,266 @@
+import argparse
+import os
+import sys
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from data import Event, RecurrenceRule, TimeSlot, parse_date
+from importer import add_store_arguments, clamped_month_days, open_store
+from recurrence import compile_rule
+
+# 导出为 ICS：生成器逐行产出文本，边生成边写入文件，内存占用与导出的年数无关。
+# 普通事件按日期顺序取自 store.iter_events，分片和 SQLite 存储不会因此把全部年份留在内存中；
+# 周期性规则不展开，写成一个带 RRULE（结束日期为 UNTIL）和 EXDATE（排除日期）的 VEVENT，
+# 自定义日期规则写成 RDATE 列表。
+# 指定展开区间时，另外为区间内的每次命中写一个同 UID、带 RECURRENCE-ID 的实例，
+# 方便不支持 RRULE 的程序读取，支持 RRULE 的程序也不会重复显示。
+# 导出的文件可以用 importer.py 原样导回。
+
+PRODID = "-//Goose's Calendar//CN"
+UID_DOMAIN = "goose-calendar"
+PROGRESS_EVERY = 1000  # 每写出多少个事件报告一次进度
+
+ExportProgress = Callable[[int, float], None]  # (已写出的事件数, 进度 0~1；未指定日期区间时导出完成前为 0)
+
+# 周期类型 -> (FREQ, INTERVAL)
+PERIOD_RRULES: Dict[str, Tuple[str, int]] = {
+    "每天": ("DAILY", 1),
+    "每周": ("WEEKLY", 1),
+    "每月": ("MONTHLY", 1),
+    "每季": ("MONTHLY", 3),
+    "每年": ("YEARLY", 1),
+}
+# 自定义周期的单位 -> FREQ
+UNIT_FREQS: Dict[str, str] = {"天": "DAILY", "周": "WEEKLY", "月": "MONTHLY", "年": "YEARLY"}
+
+
+def escape_text(text: str) -> str:
+    """转义 ICS 文本值中的反斜杠、分号、逗号和换行"""
+    return (text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def fold_line(line: str) -> str:
+    """按 RFC 5545 把超过 75 字节的行折成多行（不拆开多字节字符），返回以 CRLF 结尾的文本"""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    parts = []
+    start, limit = 0, 75
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        while end < len(encoded) and (encoded[end] & 0xC0) == 0x80:
+            end -= 1
+        parts.append(encoded[start:end].decode("utf-8"))
+        start, limit = end, 74  # 续行以一个空格开头
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _ics_date(day: date) -> str:
+    return f"{day.year:04d}{day.month:02d}{day.day:02d}"
+
+
+def _ics_datetime(day: date, minute: int) -> str:
+    moment = datetime(day.year, day.month, day.day) + timedelta(minutes=minute)
+    return f"{_ics_date(moment.date())}T{moment.hour:02d}{moment.minute:02d}00"
+
+
+def _is_timed(slot: TimeSlot) -> bool:
+    return slot.start_minute is not None
+
+
+def _date_list_property(name: str, days: Iterable[date], slot: TimeSlot) -> str:
+    """全天事件写成 VALUE=DATE，其他事件写成时段开始时间（不带时区的本地时间）"""
+    if _is_timed(slot):
+        return f"{name}:" + ",".join(_ics_datetime(day, slot.start_minute) for day in days)
+    return f"{name};VALUE=DATE:" + ",".join(_ics_date(day) for day in days)
+
+
+def _date_property(name: str, day: date, slot: TimeSlot) -> str:
+    return _date_list_property(name, (day,), slot)
+
+
+def _time_lines(day: date, slot: TimeSlot) -> List[str]:
+    if not _is_timed(slot):
+        return [_date_property("DTSTART", day, slot), f"DTEND;VALUE=DATE:{_ics_date(day + timedelta(days=1))}"]
+    lines = [_date_property("DTSTART", day, slot)]
+    if slot.end_minute is not None and slot.end_minute > slot.start_minute:
+        lines.append(f"DTEND:{_ics_datetime(day, slot.end_minute)}")
+    return lines
+
+
+def _common_lines(item, stamp: str) -> List[str]:
+    lines = [f"UID:{item.id}@{UID_DOMAIN}", f"DTSTAMP:{stamp}"]
+    try:
+        created = datetime.strptime(item.created_at, "%Y-%m-%d %H:%M:%S").astimezone(timezone.utc)
+        lines.append(f"CREATED:{created.strftime('%Y%m%dT%H%M%SZ')}")
+    except (TypeError, ValueError, OverflowError, OSError):
+        pass
+    lines.append(f"SUMMARY:{escape_text(item.title)}")
+    if item.description:
+        lines.append(f"DESCRIPTION:{escape_text(item.description)}")
+    lines.append(f"CATEGORIES:{escape_text(item.category)}")
+    return lines
+
+
+def rule_rrule(rule: RecurrenceRule) -> Optional[str]:
+    """把周期性规则映射为 RRULE 的取值；自定义日期规则和无法识别的规则返回 None"""
+    if rule.period_type in PERIOD_RRULES:
+        freq, interval = PERIOD_RRULES[rule.period_type]
+    elif rule.period_type == "自定义周期" and rule.interval > 0 and (rule.unit or "天") in UNIT_FREQS:
+        freq, interval = UNIT_FREQS[rule.unit or "天"], rule.interval
+    else:
+        return None
+    parts = [f"FREQ={freq}"]
+    if interval != 1:
+        parts.append(f"INTERVAL={interval}")
+    start = rule.start_date
+    # 没有起始日的月份取月末（与规则引擎一致）
+    if freq == "MONTHLY" and start.day > 28:
+        parts += [f"BYMONTHDAY={clamped_month_days(start.day)}", "BYSETPOS=-1"]
+    elif freq == "YEARLY" and start.month == 2 and start.day == 29:
+        parts += ["BYMONTH=2", f"BYMONTHDAY={clamped_month_days(29)}", "BYSETPOS=-1"]
+    if rule.end_ord is not None:
+        end = date.fromordinal(rule.end_ord)
+        # DTSTART 带时间时 UNTIL 也要带时间
+        parts.append(f"UNTIL={_ics_date(end)}T235959" if _is_timed(rule.time_slot) else f"UNTIL={_ics_date(end)}")
+    return ";".join(parts)
+
+
+def event_lines(event: Event, stamp: str) -> Iterator[str]:
+    """普通事件的 VEVENT"""
+    yield "BEGIN:VEVENT"
+    yield from _common_lines(event, stamp)
+    yield from _time_lines(event.date, event.time_slot)
+    yield "END:VEVENT"
+
+
+def rule_lines(rule: RecurrenceRule, stamp: str) -> Iterator[str]:
+    """周期性规则的 VEVENT：RRULE + EXDATE，自定义日期规则为 RDATE；没有任何命中日期的规则不输出"""
+    if not rule.start_ord:
+        return
+    compiled = compile_rule(rule)
+    if compiled.kind is None:
+        return
+    rrule = rule_rrule(rule)
+    start = rule.start_date
+    custom_dates: List[date] = []
+    if rrule is None:
+        custom_dates = list(compiled.occurrences(start, date.max))
+        if not custom_dates:
+            return
+        start = custom_dates[0]
+    yield "BEGIN:VEVENT"
+    yield from _common_lines(rule, stamp)
+    yield from _time_lines(start, rule.time_slot)
+    if rrule is not None:
+        yield f"RRULE:{rrule}"
+        if rule.excluded_dates:
+            yield _date_list_property("EXDATE", map(date.fromordinal, rule.excluded_dates), rule.time_slot)
+    else:
+        # 只有一个日期时 RDATE 与 DTSTART 相同（RFC 5545 允许重复），重新导入时仍是自定义日期规则，而不是普通事件
+        yield _date_list_property("RDATE", custom_dates[1:] or custom_dates, rule.time_slot)
+    yield "END:VEVENT"
+
+
+def instance_lines(rule: RecurrenceRule, day: date, stamp: str) -> Iterator[str]:
+    """周期性规则在某一天的展开实例，与规则同 UID，以 RECURRENCE-ID 标明是哪一次"""
+    yield "BEGIN:VEVENT"
+    yield from _common_lines(rule, stamp)
+    yield _date_property("RECURRENCE-ID", day, rule.time_slot)
+    yield from _time_lines(day, rule.time_slot)
+    yield "END:VEVENT"
+
+
+def iter_ics(events: Iterable[Event], rules: Iterable[RecurrenceRule],
+             expand_range: Optional[Tuple[date, date]] = None) -> Iterator[str]:
+    """
+    逐段生成 ICS 文本（每段为一行折行后的内容，含 CRLF）：先写周期性规则，再按 events 的顺序写普通事件。
+    expand_range 为 (开始日期, 结束日期) 时，同时写出规则在该区间内的每次命中。
+    """
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    for line in ("BEGIN:VCALENDAR", "VERSION:2.0", f"PRODID:{PRODID}", "CALSCALE:GREGORIAN"):
+        yield fold_line(line)
+    for rule in rules:
+        for line in rule_lines(rule, stamp):
+            yield fold_line(line)
+        if expand_range is not None and rule.start_ord:
+            for day in compile_rule(rule).occurrences(*expand_range):
+                for line in instance_lines(rule, day, stamp):
+                    yield fold_line(line)
+    for event in events:
+        if event.date_ord < 1:
+            continue
+        for line in event_lines(event, stamp):
+            yield fold_line(line)
+    yield fold_line("END:VCALENDAR")
+
+
+def export_file(store, path: str, start_date: Optional[date] = None, end_date: Optional[date] = None,
+                expand: bool = False, progress: Optional[ExportProgress] = None) -> int:
+    """
+    把 [start_date, end_date] 内的事件（不传表示不限）导出为 ICS 文件，返回写出的普通事件数。
+    先写临时文件再替换，导出中途出错不会留下不完整的文件。
+    expand 为 True 时同时展开周期性规则，此时必须指定起止日期。
+    可以在后台线程中调用：只在逐段读取事件时短暂持有存储的锁。
+    """
+    if expand and (start_date is None or end_date is None):
+        raise ValueError("展开周期性事件需要指定起止日期")
+    with store.lock:
+        rules = [rule for rule in store.periodic_rules
+                 if (end_date is None or rule.start_ord <= end_date.toordinal()) and
+                 (start_date is None or rule.end_ord is None or rule.end_ord >= start_date.toordinal())]
+    low = start_date.toordinal() if start_date else None
+    span = end_date.toordinal() - low + 1 if start_date and end_date else None
+    count = 0
+
+    def events() -> Iterator[Event]:
+        nonlocal count
+        for event in store.iter_events(start_date, end_date):
+            yield event
+            count += 1
+            if progress is not None and count % PROGRESS_EVERY == 0:
+                progress(count, (event.date_ord - low + 1) / span if span else 0.0)
+
+    temp_file = path + ".tmp"
+    try:
+        with open(temp_file, "w", encoding="utf-8", newline="") as f:
+            for chunk in iter_ics(events(), rules, (start_date, end_date) if expand else None):
+                f.write(chunk)
+        os.replace(temp_file, path)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+    if progress is not None:
+        progress(count, 1.0)
+    return count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="把日历事件导出为 ICS 文件（读取与应用相同的数据文件）")
+    parser.add_argument("file", help="导出的 .ics 文件")
+    parser.add_argument("--start", help="开始日期 YYYY-MM-DD（默认不限）")
+    parser.add_argument("--end", help="结束日期 YYYY-MM-DD（默认不限）")
+    parser.add_argument("--expand", action="store_true", help="同时写出周期性事件在区间内的每次命中，需要指定起止日期")
+    add_store_arguments(parser)
+    args = parser.parse_args()
+    start_date, end_date = parse_date(args.start), parse_date(args.end)
+    if (args.start and start_date is None) or (args.end and end_date is None):
+        print("日期格式应为 YYYY-MM-DD")
+        sys.exit(1)
+    store = open_store(args)
+
+    def show_progress(count: int, fraction: float) -> None:
+        print(f"\r已写出 {count} 个事件 ({fraction:.0%})", end="", flush=True)
+
+    try:
+        count = export_file(store, args.file, start_date, end_date, args.expand, show_progress)
+    except (OSError, ValueError) as e:
+        print(f"\n导出失败: {e}")
+        sys.exit(1)
+    print(f"\n已导出 {count} 个事件和 {len(store.periodic_rules)} 条周期性规则到 {args.file}")
+    if hasattr(store, "close"):
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,511 @@
+import argparse
+import csv
+import os
+import re
+import sys
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from data import ALL_DAY, CATEGORIES, TIME_SLOTS, CalendarItem, Event, RecurrenceRule, compact_ordinals, parse_date
+from recurrence import next_occurrences
+from storage import create_event_store
+
+# 从其他日历迁移事件：流式读取 ICS / CSV 文件，逐批校验后交给事件存储的 bulk_add，
+# 全部批次一次写入（SQLite 为同一个事务），不再逐条保存。
+#
+# ICS 的 RRULE 映射为已有的周期类型：
+#   FREQ=DAILY    —— 每天；间隔大于 1 时为自定义周期（天）
+#   FREQ=WEEKLY   —— 每周 / 自定义周期（周）；BYDAY 含多个星期时，每个星期拆成一条规则
+#   FREQ=MONTHLY  —— 每月、每季（间隔 3）、每年（间隔 12）/ 自定义周期（月）
+#   FREQ=YEARLY   —— 每年 / 自定义周期（年）
+#   只有 RDATE    —— 自定义日期（DTSTART 和 RDATE 中的各个日期）
+# UNTIL、COUNT 换算为结束日期，EXDATE 为排除日期；无法表示的规则（如"每月第二个周二"）跳过并记录原因。
+# 带时间的事件按开始时间归入所在的两小时时段，只有日期的事件为全天事件。
+#
+# CSV 第一行为表头，列名为 date/title/category/description/event_time 或 日期/标题/分类/描述/时间，
+# 每行一个普通事件，时间列可以是时段名称（如 08:00-10:00）或开始时间（如 09:30）。
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_CATEGORY = "日常"
+MAX_ERRORS = 100  # 最多记录多少条跳过原因
+
+ProgressCallback = Callable[[int, float], None]  # (已读取的条数, 进度 0~1)
+
+WEEKDAYS: Dict[str, int] = {"MO": 0, "TU": 1, "WE": 2, "TH": 3, "FR": 4, "SA": 5, "SU": 6}
+RRULE_PARTS = frozenset(["FREQ", "INTERVAL", "UNTIL", "COUNT", "BYDAY", "BYMONTHDAY", "BYMONTH", "BYSETPOS",
+                         "WKST"])
+
+CSV_COLUMNS: Dict[str, str] = {
+    "date": "date", "日期": "date",
+    "title": "title", "标题": "title",
+    "category": "category", "分类": "category", "类别": "category",
+    "description": "description", "描述": "description",
+    "event_time": "event_time", "时间": "event_time",
+}
+
+
+class ImportResult:
+    """导入结果：导入的普通事件数、周期性规则数、跳过的条数和部分跳过原因"""
+    __slots__ = ("events", "rules", "skipped", "errors")
+
+    def __init__(self):
+        self.events = 0
+        self.rules = 0
+        self.skipped = 0
+        self.errors: List[str] = []
+
+    def skip(self, reason: str) -> None:
+        self.skipped += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(reason)
+
+    def __str__(self) -> str:
+        return f"导入 {self.events} 个事件、{self.rules} 条周期性规则，跳过 {self.skipped} 条"
+
+
+class LineReader:
+    """逐行读取 UTF-8 文本文件并记录已读取的字节数，用于计算进度"""
+    __slots__ = ("path", "total", "position")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.total = os.path.getsize(path)
+        self.position = 0
+
+    @property
+    def fraction(self) -> float:
+        return self.position / self.total if self.total else 1.0
+
+    def __iter__(self) -> Iterator[str]:
+        with open(self.path, 'rb') as f:
+            for raw in f:
+                line = raw.decode("utf-8", errors="replace")
+                if not self.position:
+                    line = line.lstrip("\ufeff")
+                self.position += len(raw)
+                yield line
+
+
+def time_slot_for(minute: Optional[int]) -> str:
+    """把开始时间（当天的分钟数）换算为所在的两小时时段，没有时间时为全天"""
+    if minute is None:
+        return ALL_DAY
+    return TIME_SLOTS[min(max(minute, 0), 24 * 60 - 1) // 120 + 1]
+
+
+def clamped_month_days(day: int) -> str:
+    """
+    按月重复、起始日大于 28 的规则在没有该日期的月份取月末，
+    对应 RRULE 的 "BYMONTHDAY=28,...,起始日;BYSETPOS=-1"（取当月存在的最后一个）
+    """
+    return ",".join(str(month_day) for month_day in range(28, day + 1))
+
+
+def _pick_category(value: str) -> str:
+    for name in value.split(","):
+        name = _unescape(name).strip()
+        if name in CATEGORIES:
+            return name
+    return DEFAULT_CATEGORY
+
+
+# ===== ICS =====
+
+def _unfold(lines: Iterable[str]) -> Iterator[str]:
+    """合并 ICS 的折行：以空格或制表符开头的行是上一行的延续"""
+    current: Optional[str] = None
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t"):
+            if current is not None:
+                current += line[1:]
+            continue
+        if current:
+            yield current
+        current = line
+    if current:
+        yield current
+
+
+def _parse_property(line: str) -> Tuple[str, Dict[str, str], str]:
+    """把 "NAME;PARAM=值:内容" 拆成 (名称, 参数, 内容)，参数值中带引号的冒号不作分隔"""
+    index = line.find(':')
+    if index < 0:
+        raise ValueError(f"无法解析的行: {line[:80]}")
+    if '"' in line[:index]:
+        in_quotes = False
+        for index, char in enumerate(line):
+            if char == '"':
+                in_quotes = not in_quotes
+            elif char == ':' and not in_quotes:
+                break
+        else:
+            raise ValueError(f"无法解析的行: {line[:80]}")
+    name, *params = line[:index].split(';')
+    parsed = {}
+    for param in params:
+        key, _, value = param.partition('=')
+        parsed[key.upper()] = value.strip('"')
+    return name.upper(), parsed, line[index + 1:]
+
+
+def _unescape(text: str) -> str:
+    if "\\" not in text:
+        return text
+    chars = []
+    index = 0
+    while index < len(text):
+        char = text[index]
+        if char == "\\" and index + 1 < len(text):
+            following = text[index + 1]
+            chars.append("\n" if following in "nN" else following)
+            index += 2
+        else:
+            chars.append(char)
+            index += 1
+    return "".join(chars)
+
+
+def _parse_ics_datetime(params: Dict[str, str], value: str) -> Tuple[date, Optional[int]]:
+    """解析 DTSTART/EXDATE 等的取值，返回 (日期, 当天的分钟数)；只有日期时分钟数为 None"""
+    # 按固定位置切分（YYYYMMDD 或 YYYYMMDDTHHMMSS），比 strptime 快得多
+    value = value.strip()
+    if not value[:8].isdigit():
+        raise ValueError(f"无效的日期: {value}")
+    day = date(int(value[:4]), int(value[4:6]), int(value[6:8]))
+    if params.get("VALUE", "").upper() == "DATE" or len(value) == 8:
+        return day, None
+    clock = value[9:].rstrip("Zz")[:6]
+    if value[8:9] not in "Tt" or len(clock) < 4 or not clock.isdigit():
+        raise ValueError(f"无效的时间: {value}")
+    if value[-1:] not in "Zz":
+        # 带 TZID 或不带时区的时间按其字面时间处理
+        return day, int(clock[:2]) * 60 + int(clock[2:4])
+    moment = datetime(day.year, day.month, day.day, int(clock[:2]), int(clock[2:4]), int(clock[4:6] or 0))
+    # UTC 时间换算为本地时间
+    moment = moment.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    return moment.date(), moment.hour * 60 + moment.minute
+
+
+def iter_ics_events(lines: Iterable[str]) -> Iterator[Dict[str, List[Tuple[Dict[str, str], str]]]]:
+    """逐个生成 VEVENT 的属性 {名称: [(参数, 内容)]}，忽略其中嵌套的组件（如 VALARM）"""
+    event: Optional[Dict[str, List[Tuple[Dict[str, str], str]]]] = None
+    depth = 0  # VEVENT 内嵌套组件的层数
+    for line in _unfold(lines):
+        try:
+            name, params, value = _parse_property(line)
+        except ValueError:
+            continue
+        if name == "BEGIN":
+            if event is not None:
+                depth += 1
+            elif value.strip().upper() == "VEVENT":
+                event = {}
+        elif name == "END":
+            if event is not None:
+                if depth:
+                    depth -= 1
+                elif value.strip().upper() == "VEVENT":
+                    yield event
+                    event = None
+        elif event is not None and not depth:
+            event.setdefault(name, []).append((params, value))
+
+
+def _first(props: Dict[str, List[Tuple[Dict[str, str], str]]], name: str) -> str:
+    values = props.get(name)
+    return values[0][1] if values else ""
+
+
+def _created_at(props: Dict[str, List[Tuple[Dict[str, str], str]]]) -> Optional[str]:
+    for name in ("CREATED", "DTSTAMP"):
+        if name in props:
+            try:
+                day, minute = _parse_ics_datetime(*props[name][0])
+            except ValueError:
+                continue
+            moment = datetime(day.year, day.month, day.day) + timedelta(minutes=minute or 0)
+            return moment.strftime("%Y-%m-%d %H:%M:%S")
+    return None
+
+
+def _rrule_starts(rrule: Dict[str, str], start: date, interval: int) -> Tuple[str, str, List[date]]:
+    """把 RRULE 映射为 (周期类型, 自定义周期单位, 各条规则的起始日期)，无法表示时抛出 ValueError"""
+    freq = rrule.get("FREQ", "").upper()
+    unsupported = set(rrule) - RRULE_PARTS
+    if unsupported:
+        raise ValueError(f"不支持的重复规则: {','.join(sorted(unsupported))}")
+    if "BYMONTH" in rrule and (freq != "YEARLY" or rrule["BYMONTH"] != str(start.month)):
+        raise ValueError(f"不支持的重复规则: BYMONTH={rrule['BYMONTH']}")
+    month_day = rrule.get("BYMONTHDAY")
+    if "BYSETPOS" in rrule:
+        if rrule["BYSETPOS"] != "-1" or month_day != clamped_month_days(start.day):
+            raise ValueError(f"不支持的重复规则: BYSETPOS={rrule['BYSETPOS']}")
+    elif month_day is not None and month_day != str(start.day):
+        raise ValueError(f"不支持的重复规则: BYMONTHDAY={month_day}")
+    if month_day is not None and freq not in ("MONTHLY", "YEARLY"):
+        raise ValueError(f"不支持的重复规则: FREQ={freq};BYMONTHDAY={month_day}")
+    if "BYDAY" in rrule and freq != "WEEKLY":
+        raise ValueError(f"不支持的重复规则: FREQ={freq};BYDAY={rrule['BYDAY']}")
+
+    if freq == "DAILY":
+        return ("每天", "", [start]) if interval == 1 else ("自定义周期", "天", [start])
+    if freq == "MONTHLY":
+        fixed = {1: "每月", 3: "每季", 12: "每年"}
+        return (fixed[interval], "", [start]) if interval in fixed else ("自定义周期", "月", [start])
+    if freq == "YEARLY":
+        return ("每年", "", [start]) if interval == 1 else ("自定义周期", "年", [start])
+    if freq != "WEEKLY":
+        raise ValueError(f"不支持的重复频率: {freq or '(空)'}")
+
+    period_type, unit = ("每周", "") if interval == 1 else ("自定义周期", "周")
+    if "BYDAY" not in rrule:
+        return period_type, unit, [start]
+    week_start_day = WEEKDAYS.get(rrule.get("WKST", "MO").upper(), 0)
+    week_start = start - timedelta(days=(start.weekday() - week_start_day) % 7)
+    starts = set()
+    for token in rrule["BYDAY"].upper().split(","):
+        if token not in WEEKDAYS:
+            raise ValueError(f"不支持的重复规则: BYDAY={rrule['BYDAY']}")
+        # 与 DTSTART 同一周内、早于 DTSTART 的星期从下一个周期开始
+        first = week_start + timedelta(days=(WEEKDAYS[token] - week_start_day) % 7)
+        starts.add(first if first >= start else first + timedelta(weeks=interval))
+    return period_type, unit, sorted(starts)
+
+
+def ics_items(props: Dict[str, List[Tuple[Dict[str, str], str]]], imported_at: str) -> List[CalendarItem]:
+    """把一个 VEVENT 转换为普通事件或周期性规则（BYDAY 含多个星期时为多条规则）"""
+    if "DTSTART" not in props:
+        raise ValueError("缺少 DTSTART")
+    start, minute = _parse_ics_datetime(*props["DTSTART"][0])
+    title = _unescape(_first(props, "SUMMARY")).strip()
+    description = _unescape(_first(props, "DESCRIPTION"))
+    category = _pick_category(_first(props, "CATEGORIES"))
+    event_time = time_slot_for(minute)
+    created_at = _created_at(props) or imported_at
+    if "RRULE" not in props and "RDATE" not in props:
+        return [Event(start.toordinal(), title, category, description, event_time, created_at)]
+    if "RRULE" not in props:
+        custom_dates = sorted(_ics_dates(props, "RDATE") | {start.toordinal()})
+        rules = [RecurrenceRule(custom_dates[0], title, category, description, event_time, "自定义日期",
+                                custom_dates=custom_dates, created_at=created_at)]
+    else:
+        rules = _rrule_rules(props, start, title, category, description, event_time, created_at)
+    excluded = _ics_dates(props, "EXDATE")
+    for rule in rules:
+        rule.excluded_dates = compact_ordinals(excluded, rule.end_ord)
+    return rules
+
+
+def _ics_dates(props: Dict[str, List[Tuple[Dict[str, str], str]]], name: str) -> Set[int]:
+    """EXDATE、RDATE 等日期列表属性（可出现多次，每次逗号分隔）中的日期序数"""
+    ordinals = set()
+    for params, value in props.get(name, []):
+        for item in value.split(","):
+            if item.strip():
+                ordinals.add(_parse_ics_datetime(params, item)[0].toordinal())
+    return ordinals
+
+
+def _rrule_rules(props: Dict[str, List[Tuple[Dict[str, str], str]]], start: date, title: str, category: str,
+                 description: str, event_time: str, created_at: str) -> List[RecurrenceRule]:
+    """按 RRULE 创建周期性规则（排除日期由调用方设置）"""
+    rrule = {}
+    for part in _first(props, "RRULE").split(";"):
+        key, _, value = part.partition("=")
+        if key:
+            rrule[key.strip().upper()] = value.strip()
+    interval = int(rrule.get("INTERVAL", "1"))
+    if interval < 1:
+        raise ValueError(f"无效的重复间隔: {interval}")
+    period_type, unit, starts = _rrule_starts(rrule, start, interval)
+    end_ord = None
+    if "UNTIL" in rrule:
+        end_ord = _parse_ics_datetime({}, rrule["UNTIL"])[0].toordinal()
+    rules = [RecurrenceRule(first.toordinal(), title, category, description, event_time, period_type,
+                            interval if unit else 1, unit, None, created_at, end_ord)
+             for first in starts]
+    if "COUNT" in rrule:
+        # COUNT 计算的是整个系列（拆分后的全部规则）的次数，且不扣除 EXDATE
+        count = int(rrule["COUNT"])
+        before = start - timedelta(days=1)
+        hits = sorted(hit for rule in rules for hit in next_occurrences(rule, before, count))
+        if count < 1 or not hits:
+            raise ValueError(f"无效的重复次数: {count}")
+        last = hits[min(count, len(hits)) - 1].toordinal()
+        for rule in rules:
+            rule.end_ord = last if rule.end_ord is None else min(rule.end_ord, last)
+    return rules
+
+
+def parse_ics(lines: Iterable[str], result: ImportResult) -> Iterator[CalendarItem]:
+    """
+    流式解析 ICS，逐个生成事件或规则；无法转换的 VEVENT 记入 result 后跳过。
+    带 RECURRENCE-ID 的实例如果属于前面已导入的周期性事件（同 UID），不再重复导入。
+    """
+    imported_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    recurring_uids: Set[str] = set()
+    for props in iter_ics_events(lines):
+        uid = _first(props, "UID")
+        if "RECURRENCE-ID" in props and uid in recurring_uids:
+            continue
+        if uid and ("RRULE" in props or "RDATE" in props):
+            recurring_uids.add(uid)
+        try:
+            yield from ics_items(props, imported_at)
+        except (KeyError, ValueError) as e:
+            result.skip(f"VEVENT「{_unescape(_first(props, 'SUMMARY'))[:40]}」: {e}")
+
+
+# ===== CSV =====
+
+def _parse_csv_date(value: str) -> Optional[date]:
+    parsed = parse_date(value)
+    if parsed is None:
+        parts = re.split(r"[-/.年月日]", value.strip().rstrip("日"))
+        try:
+            parsed = date(*map(int, parts)) if len(parts) == 3 else None
+        except ValueError:
+            parsed = None
+    return parsed
+
+
+def _parse_csv_time(value: str) -> str:
+    value = value.strip()
+    if not value or value in TIME_SLOTS:
+        return value or ALL_DAY
+    hours, _, minutes = value.partition(":")
+    if hours.isdigit() and (minutes[:2].isdigit() or not minutes):
+        return time_slot_for(int(hours) * 60 + int(minutes[:2] or 0))
+    raise ValueError(f"无效的时间: {value}")
+
+
+def parse_csv(lines: Iterable[str], result: ImportResult) -> Iterator[CalendarItem]:
+    """流式解析 CSV，每行生成一个普通事件；无效的行记入 result 后跳过"""
+    imported_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = [CSV_COLUMNS.get(name.strip().lower()) for name in header]
+    if "date" not in columns or "title" not in columns:
+        raise ValueError("CSV 表头需要包含日期（date）和标题（title）列")
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        fields = {column: cell for column, cell in zip(columns, row) if column}
+        day = _parse_csv_date(fields.get("date", ""))
+        if day is None:
+            result.skip(f"第 {reader.line_num} 行: 无效的日期 {fields.get('date', '')!r}")
+            continue
+        try:
+            event_time = _parse_csv_time(fields.get("event_time", ""))
+        except ValueError as e:
+            result.skip(f"第 {reader.line_num} 行: {e}")
+            continue
+        category = fields.get("category", "").strip()
+        yield Event(day.toordinal(), fields.get("title", "").strip(),
+                    category if category in CATEGORIES else DEFAULT_CATEGORY,
+                    fields.get("description", ""), event_time, imported_at)
+
+
+# ===== 批量导入 =====
+
+def validate_batch(items: List[CalendarItem], result: ImportResult) -> List[CalendarItem]:
+    """逐批校验：标题不能为空，周期性规则的结束日期不能早于开始日期"""
+    valid = []
+    for item in items:
+        if not item.title:
+            result.skip("缺少标题的事件")
+        elif item.is_periodic and item.end_ord is not None and item.end_ord < item.start_ord:
+            result.skip(f"周期性事件「{item.title}」的结束日期早于开始日期")
+        else:
+            valid.append(item)
+    return valid
+
+
+def _batched(items: Iterable[CalendarItem], size: int) -> Iterator[List[CalendarItem]]:
+    batch: List[CalendarItem] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def read_import_file(path: str, batch_size: int = DEFAULT_BATCH_SIZE,
+                     progress: Optional[ProgressCallback] = None) -> Tuple[List[CalendarItem], ImportResult]:
+    """
+    读取 ICS 或 CSV 文件（按扩展名区分）中的事件和规则：边读边解析，每 batch_size 条校验一次，
+    每处理完一批调用一次 progress(已读取的条数, 进度)。不修改任何存储，可以在后台线程中调用。
+    返回 (校验通过的事件和规则, 导入结果)，导入结果中的事件数、规则数由加入存储的一方填写。
+    """
+    extension = os.path.splitext(path)[1].lower()
+    parsers = {".ics": parse_ics, ".ical": parse_ics, ".ifb": parse_ics, ".csv": parse_csv}
+    if extension not in parsers:
+        raise ValueError(f"不支持的文件类型: {extension or path}（支持 .ics 和 .csv）")
+    reader = LineReader(path)
+    result = ImportResult()
+    items: List[CalendarItem] = []
+    read_count = 0
+    for batch in _batched(parsers[extension](reader, result), batch_size):
+        read_count += len(batch)
+        items.extend(validate_batch(batch, result))
+        if progress is not None:
+            progress(read_count, reader.fraction)
+    if progress is not None:
+        progress(read_count, 1.0)
+    return items, result
+
+
+def import_file(store, path: str, batch_size: int = DEFAULT_BATCH_SIZE,
+                progress: Optional[ProgressCallback] = None) -> ImportResult:
+    """把 ICS 或 CSV 文件导入事件存储：读取全部事件和规则后交给 store.bulk_add 一次写入"""
+    items, result = read_import_file(path, batch_size, progress)
+    result.events, result.rules = store.bulk_add([items])
+    return result
+
+
+def add_store_arguments(parser: argparse.ArgumentParser) -> None:
+    """命令行工具共用的存储参数，默认值与应用的存储配置一致"""
+    parser.add_argument("--backend", default="sharded", choices=["sharded", "json", "sqlite"], help="存储类型")
+    parser.add_argument("--file-format", default="json", choices=["json", "binary"], help="分片文件格式")
+    parser.add_argument("--data-dir", default=".", help="数据文件所在目录（默认当前目录）")
+
+
+def open_store(args: argparse.Namespace):
+    """按命令行参数打开与应用相同的数据文件并加载"""
+    store = create_event_store(args.backend, os.path.join(args.data_dir, "events.json"),
+                               os.path.join(args.data_dir, "events.journal"),
+                               os.path.join(args.data_dir, "events.db"),
+                               os.path.join(args.data_dir, "events"), file_format=args.file_format)
+    store.load()
+    return store
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="把 ICS 或 CSV 文件批量导入日历事件存储（与应用使用相同的数据文件）")
+    parser.add_argument("file", help="要导入的 .ics 或 .csv 文件")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="每批校验的条数")
+    add_store_arguments(parser)
+    args = parser.parse_args()
+    store = open_store(args)
+
+    def show_progress(count: int, fraction: float) -> None:
+        print(f"\r已读取 {count} 条 ({fraction:.0%})", end="", flush=True)
+
+    try:
+        result = import_file(store, args.file, args.batch_size, show_progress)
+    except (OSError, ValueError) as e:
+        print(f"\n导入失败: {e}")
+        sys.exit(1)
+    print(f"\n{result}")
+    for reason in result.errors:
+        print(f"  跳过: {reason}")
+    if hasattr(store, "close"):
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
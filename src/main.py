@@ -1,18 +1,36 @@
 import flet as ft
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from typing import List, Dict, Optional, Tuple
 import calendar
 from lunarcalendar import Converter, Solar
-from lunarcalendar.festival import festivals
-from lunarcalendar.solarterm import solarterms
-import chinese_calendar as cn_cal
-import json
-import os
+import asyncio
+import atexit
+import heapq
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from recurrence import RecurrenceEngine
+from calendar_info import compute_holiday_info, get_festival_info, iter_lunar_dates
+from calendar_table import DEFAULT_TABLE_PATH, CalendarTable, get_calendar_table
+from cache import get_shared_cache
+from metrics import LatencyStats
+from search_index import RankedHits, SearchHit, rank_key
+from storage import create_event_store
+from importer import ImportResult, read_import_file
+from exporter import export_file
+from data import CalendarItem, Event, RecurrenceRule, parse_date, parse_ordinals
 
 LUNAR_AVAILABLE = True
 HOLIDAY_AVAILABLE = True
 
+# 按日期缓存的派生信息（农历、节假日等）最多保留的条目数
+DATE_INFO_CACHE_CAPACITY = 4096
+
+# 按日期的派生信息缓存，键为 (信息类型, 日期)，如 ("lunar", date)、("holiday", date)。
+# 容量有限并按 LRU 淘汰，同一进程的所有会话共用，容量在模块加载时确定一次，
+# 可通过 date_info_cache.stats() 查看命中情况
+date_info_cache = get_shared_cache("date_info", DATE_INFO_CACHE_CAPACITY)
+
 
 def main(page: ft.Page) -> None:
     page.title = "GOOSE'S CALENDAR Version 0.0"
@@ -142,9 +160,25 @@ def main(page: ft.Page) -> None:
         "search_clear_icon_size": 16,  # 清除图标大小
     }
 
-    # 创建缓存字典，用于存储已计算过的日期信息，避免重复计算
-    lunar_info_cache: Dict[date, Tuple[str, str, str, str]] = {}
-    holiday_info_cache: Dict[date, Tuple[bool, bool, str]] = {}
+    # 翻页预取配置：每次渲染后在后台线程中提前计算相邻月份的数据
+    prefetch_config: Dict[str, bool] = {
+        "adjacent_months": True,  # 预取上个月和下个月
+        "adjacent_years": False,  # 同时预取去年和明年的同一个月
+    }
+
+    # 实时搜索建议配置
+    search_config: Dict[str, int] = {
+        "debounce_ms": 150,  # 停止输入多久后才搜索（毫秒），期间的新输入会取消尚未完成的搜索
+        "suggestion_limit": 5,  # 最多显示几个建议
+        "results_page_size": 30,  # 搜索结果对话框每页显示的条数，滚动到底部后点击“显示更多”再取下一页
+        "occurrence_window_months": 12,  # 周期性事件取选中月份前后多少个月内最近的一次发生，窗口内没有时取窗口前后最近的一次
+    }
+    # 搜索建议延迟：从输入到建议显示的耗时（含防抖等待），可通过 suggestion_latency.stats() 查看
+    suggestion_latency = LatencyStats()
+
+    # 预计算的农历/节假日表（1900–2100）随代码提供，直接内存映射读取；
+    # 缺失或与已安装的库版本不符时退回逐日调用库计算，不在启动时生成
+    calendar_table: Optional[CalendarTable] = get_calendar_table(DEFAULT_TABLE_PATH)
 
     # 农历相关数据
     chinese_numbers = ["初", "十", "廿", "三"]
@@ -172,295 +206,314 @@ def main(page: ft.Page) -> None:
         if decade == 0: return f"初{chinese_digits[unit - 1]}"
         return f"{chinese_numbers[decade]}{chinese_digits[unit - 1] if unit > 0 else '十'}"
 
+    def format_lunar_info(current_date_obj: date, lunar_month: int, lunar_day: int, is_leap: bool,
+                          festival: Optional[Tuple[str, str, str]] = None) -> Tuple[str, str, str, str]:
+        """根据农历月日生成 (农历月份, 主要显示文本, 找到的节气名称, 原始农历日名称)"""
+        lunar_month_str = (("闰" if is_leap else "") + chinese_months[lunar_month - 1] + "月")
+        actual_lunar_day_name = get_lunar_day_name(lunar_day)
+        display_text = lunar_month_str if lunar_day == 1 else actual_lunar_day_name
+        # 节日节气按年预先计算，这里只需查表
+        if festival is None:
+            festival = get_festival_info(current_date_obj)
+        found_solar_term, found_major_festival, other_festival = festival
+        if found_solar_term:
+            display_text = found_solar_term
+        elif found_major_festival:
+            display_text = found_major_festival
+        elif other_festival:
+            display_text = other_festival
+        return (lunar_month_str, display_text, found_solar_term,
+                lunar_month_str if lunar_day == 1 else actual_lunar_day_name)
+
     def get_lunar_info(year: int, month: int, day: int) -> Tuple[str, str, str, str]:
         """
         获取农历信息：返回 (农历月份, 主要显示文本, 找到的节气名称, 原始农历日名称)
-        增加了缓存机制以提高性能。
+        优先查预计算表，表外的日期再实时转换；增加了缓存机制以提高性能。
         """
         current_date_obj = date(year, month, day)
-        if current_date_obj in lunar_info_cache:
-            return lunar_info_cache[current_date_obj]
+        cached = date_info_cache.get(("lunar", current_date_obj))
+        if cached is not None:
+            return cached
+        table_entry = calendar_table.lunar(current_date_obj) if calendar_table else None
+        if table_entry is not None:
+            result = format_lunar_info(current_date_obj, *table_entry)
+            date_info_cache.put(("lunar", current_date_obj), result)
+            return result
         if not LUNAR_AVAILABLE:
             return "", "", "", ""
         try:
             solar = Solar(year, month, day)
             lunar = Converter.Solar2Lunar(solar)
-            lunar_month_str = (("闰" if lunar.isleap else "") + chinese_months[lunar.month - 1] + "月")
-            actual_lunar_day_name = get_lunar_day_name(lunar.day)
-            display_text = lunar_month_str if lunar.day == 1 else actual_lunar_day_name
-            all_events = festivals + solarterms
-            today_festivals = [fest.get_lang('zh') for fest in all_events if fest(year) == current_date_obj]
-            solar_term_keywords = ['立春', '雨水', '惊蛰', '春分', '清明', '谷雨', '立夏', '小满', '芒种', '夏至',
-                                   '小暑', '大暑', '立秋', '处暑', '白露', '秋分', '寒露', '霜降', '立冬', '小雪',
-                                   '大雪', '冬至']
-            important_festivals = ['除夕', '春节', '元宵节', '龙抬头', '端午节', '七夕', '中元节', '中秋节', '重阳节',
-                                   '腊八节']
-            found_solar_term = next((fest_name for fest_name in today_festivals if fest_name in solar_term_keywords),
-                                    "")
-            found_major_festival = ""
-            if not found_solar_term:
-                found_major_festival = next(
-                    (fest_name for fest_name in today_festivals if fest_name in important_festivals), "")
-            other_festival = ""
-            if not found_solar_term and not found_major_festival and today_festivals:
-                other_festival = today_festivals[0]
-            if found_solar_term:
-                display_text = found_solar_term
-            elif found_major_festival:
-                display_text = found_major_festival
-            elif other_festival:
-                display_text = other_festival
-            result = (lunar_month_str, display_text, found_solar_term,
-                      lunar_month_str if lunar.day == 1 else actual_lunar_day_name)
-            lunar_info_cache[current_date_obj] = result
+            result = format_lunar_info(current_date_obj, lunar.month, lunar.day, lunar.isleap)
+            date_info_cache.put(("lunar", current_date_obj), result)
             return result
         except Exception as e:
             print(f"Error in get_lunar_info for {year}-{month}-{day}: {e}")
             return "", "", "", ""
 
+    def get_lunar_info_for_range(start_date: date, end_date: date) -> None:
+        """
+        批量计算区间内的农历信息并写入缓存：只对第一天做一次完整转换，
+        之后逐日递增农历日期，跨农历月时才根据月份天数表重新同步。
+        """
+        if not LUNAR_AVAILABLE:
+            return
+        # 预计算表覆盖的区间由 get_lunar_info 直接查表
+        if calendar_table and calendar_table.covers(start_date) and calendar_table.covers(end_date):
+            return
+        # 区间内的日期都已缓存时直接返回
+        first_missing = start_date
+        while first_missing <= end_date and ("lunar", first_missing) in date_info_cache:
+            first_missing += timedelta(days=1)
+        if first_missing > end_date:
+            return
+        try:
+            for current_date_obj, lunar_month, lunar_day, is_leap in iter_lunar_dates(first_missing, end_date):
+                if ("lunar", current_date_obj) not in date_info_cache:
+                    date_info_cache.put(("lunar", current_date_obj),
+                                        format_lunar_info(current_date_obj, lunar_month, lunar_day, is_leap))
+        except Exception as e:
+            # 超出农历数据范围等情况下交给 get_lunar_info 逐日处理
+            print(f"Error in get_lunar_info_for_range for {start_date} - {end_date}: {e}")
+
     def get_holiday_info(year: int, month: int, day: int) -> Tuple[bool, bool, str]:
         """
         获取节假日信息：返回 (是否休息日, 是否调休上班, 节日名称)
-        增加了缓存机制和对库年份范围的异常处理。
+        优先查预计算表，其次查按年生成的节假日位图，并缓存结果。
         """
         check_date = date(year, month, day)
-        if check_date in holiday_info_cache:
-            return holiday_info_cache[check_date]
+        cached = date_info_cache.get(("holiday", check_date))
+        if cached is not None:
+            return cached
+        table_entry = calendar_table.holiday(check_date) if calendar_table else None
+        if table_entry is not None:
+            date_info_cache.put(("holiday", check_date), table_entry)
+            return table_entry
         if not HOLIDAY_AVAILABLE:
             return False, False, ""
         try:
-            is_holiday = cn_cal.is_holiday(check_date)
-            is_workday = cn_cal.is_workday(check_date)
-            holiday_detail = cn_cal.get_holiday_detail(check_date)
-            holiday_name = holiday_detail[1] if holiday_detail and holiday_detail[1] else ""
-            is_makeup_workday = (check_date.weekday() >= 5) and is_workday
-            is_statutory_holiday = is_holiday and bool(holiday_name)
-            result = (is_statutory_holiday, is_makeup_workday, holiday_name)
-            holiday_info_cache[check_date] = result
+            # 按年位图查询，库中没有数据的年份直接返回 (False, False, "")
+            result = compute_holiday_info(check_date)
+            date_info_cache.put(("holiday", check_date), result)
             return result
-        except ValueError:
-            return False, False, ""
         except Exception as e:
             print(f"Unexpected error in get_holiday_info for {year}-{month}-{day}: {e}")
             return False, False, ""
 
     # 事件数据管理
-    events_data: Dict[str, List[Dict]] = {}  # 事件数据字典
-    periodic_events_rules: List[Dict] = []  # 专门存储周期性事件规则
-    events_file = "events.json"  # 定义事件数据文件名
-
-    def save_events() -> None:
-        """将事件数据保存到用户目录下的 events.json 文件中。"""
-        try:
-            data_to_save = {
-                "single_events": events_data,
-                "periodic_rules": periodic_events_rules
-            }
-            with open(events_file, 'w', encoding='utf-8') as f:
-                json.dump(data_to_save, f, ensure_ascii=False, indent=4)
-            print(f"Events saved successfully to {events_file}.")
-        except Exception as e:
-            print(f"保存事件到文件时出错: {e}")
+    events_data: Dict[str, List[Event]] = {}  # 事件数据字典
+    periodic_events_rules: List[RecurrenceRule] = []  # 专门存储周期性事件规则
+    events_file = "events.json"  # 定义事件数据文件名（快照）
+    events_journal_file = "events.journal"  # 事件修改日志，每次修改追加一行
+    events_database_file = "events.db"  # SQLite 存储的数据库文件
+    events_shard_dir = "events"  # 按年份分片存储的目录：每年一个文件，周期性规则单独存放
+    events_version = 0  # 事件数据版本号，每次修改后递增，用于判断预取结果是否过期
+
+    # 存储配置
+    storage_config: Dict[str, object] = {
+        "backend": "sharded",  # "sharded"：按年份分片；"json"：快照 + 修改日志；"sqlite"：本地数据库
+        "file_format": "json",  # 分片文件格式："json" 便于查看和手工修改；"binary" 为紧凑二进制格式，体积小、读写快
+        "loaded_year_radius": 1,  # 内存中保留当前查看年份和今年前后各几年的普通事件，其余年份可移除
+        "evict_idle_seconds": 120,  # 最近多少秒内访问过的年份（如搜索结果所在的年份）即使不在上述范围内也暂不移除
+        "compact_every": 200,  # 日志累计多少条后压缩：JSON 存储写入新的快照，分片存储重写有修改的年份分片（SQLite 存储不使用）
+        "write_delay": 0.5,  # 后台合并写入的时间窗口（秒），窗口内的多次修改只写一次磁盘；0 表示立即写入
+    }
+    event_store = create_event_store(storage_config["backend"], events_file, events_journal_file,
+                                     events_database_file, events_shard_dir, storage_config["compact_every"],
+                                     storage_config["write_delay"], storage_config["file_format"])
 
     def load_events() -> None:
-        """从用户目录下的 events.json 文件中加载事件数据。"""
+        """从存储加载周期性规则和今年前后一年的普通事件，其他年份在翻到时再加载。"""
         nonlocal events_data, periodic_events_rules
-        if os.path.exists(events_file):
-            try:
-                with open(events_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    events_data = data.get("single_events", {})
-                    periodic_events_rules = data.get("periodic_rules", [])
-                    print(f"Events loaded successfully from {events_file}.")
-            except (json.JSONDecodeError, TypeError) as e:
-                print(f"读取事件文件时出错: {e}. 将使用空数据。")
-                events_data = {}
-                periodic_events_rules = []
-        else:
-            print(f"未找到事件文件 '{events_file}'。将为您创建一个新的。")
-            events_data = {}
-            periodic_events_rules = []
-            save_events()
+        events_data, periodic_events_rules = event_store.load()
+        this_year = datetime.now().year
+        event_store.ensure_range_loaded(date(this_year - 1, 1, 1), date(this_year + 1, 12, 31))
+
+    def evict_cold_years() -> None:
+        """从内存中移除远离当前查看年份和今年、且最近没有访问过的普通事件，翻到这些年份时会重新加载"""
+        nonlocal events_version
+        radius = storage_config["loaded_year_radius"]
+        keep_years = set()
+        for center in (selected_year, datetime.now().year):
+            keep_years.update(range(center - radius, center + radius + 1))
+        if event_store.evict_years(keep_years, storage_config["evict_idle_seconds"]):
+            # 已预取的月份可能引用被移除的事件，递增版本号使其失效
+            events_version += 1
+
+    def flush_events(e=None) -> None:
+        """立即写入所有待写入的事件修改，页面关闭和程序退出时调用。"""
+        event_store.flush()
+
+    def apply_change(op: Dict) -> None:
+        """
+        应用一次事件修改：立即更新内存数据和周期性规则引擎，磁盘写入交给后台线程合并完成。
+        两者都更新完之后才递增版本号，预取线程不会把按旧数据算出的结果当作最新版本。
+        """
+        nonlocal events_version
+        kind = op["op"]
+        rule = None
+        if kind == "add_rule":
+            rule = op["rule"]
+        elif kind in ("update_rule", "exclude_date", "set_end_date", "delete_series"):
+            rule = event_store.get(op["id"])
+        event_store.apply(op)
+        if rule is not None:
+            if kind == "add_rule":
+                recurrence_engine.add(rule)
+            elif kind == "delete_series":
+                recurrence_engine.remove(rule)
+            else:
+                recurrence_engine.refresh(rule)
+        events_version += 1
 
     # 初始化数据
     load_events()
+    # 程序退出前写入尚在合并窗口内的修改；会话先结束时由 close_session 写入并注销
+    atexit.register(flush_events)
+    # 周期性规则编译后交给引擎，规则变更时增量维护
+    recurrence_engine = RecurrenceEngine(periodic_events_rules)
 
     # 获取当前日期信息
     current_date: datetime = datetime.now()
     selected_year: int = current_date.year
     selected_month: int = current_date.month
     selected_day: Optional[int] = current_date.day  # 当前选中的日期
+    visible_events: Dict[date, List[CalendarItem]] = {}  # 当前月视图（含跨月填充日期）的事件表
 
     def get_date_key(year: int, month: int, day: int) -> str:
         """生成日期键：创建日期的唯一标识"""
         return f"{year}-{month:02d}-{day:02d}"
 
-    def check_if_date_matches_rule(target_date: date, rule: Dict) -> bool:
-        """辅助函数：检查给定日期是否匹配周期性规则，支持end_date限制"""
-        start_date_str = rule.get("original_date")
-        if not start_date_str: return False
-
-        target_date_key = target_date.strftime("%Y-%m-%d")
-        if target_date_key in rule.get("excluded_dates", []):
-            return False
-
-        try:
-            start_date = date.fromisoformat(start_date_str)
-        except ValueError:
-            return False
-
-        # 检查结束日期限制（新增功能）
-        end_date_str = rule.get("end_date")
-        if end_date_str:
-            try:
-                end_date = date.fromisoformat(end_date_str)
-                if target_date > end_date:
-                    return False
-            except ValueError:
-                pass
+    def event_sort_key(event: CalendarItem) -> int:
+        """事件排序键：全天事件排在最前，其他按预先解析的开始时间排序"""
+        return event.time_slot.sort_minute
 
-        period_info = rule.get("period_info", {})
-        period_type = period_info.get("type")
-        if target_date < start_date: return False
-
-        if period_type == "每天":
-            return True
-        elif period_type == "每周":
-            return (target_date - start_date).days % 7 == 0
-        elif period_type == "每月":
-            if target_date.day == start_date.day: return True
-            try:
-                target_date.replace(day=start_date.day)
-                return False
-            except ValueError:
-                return target_date.day == calendar.monthrange(target_date.year, target_date.month)[1]
-        elif period_type == "每季":
-            month_diff = (target_date.year - start_date.year) * 12 + (target_date.month - start_date.month)
-            if month_diff >= 0 and month_diff % 3 == 0:
-                if target_date.day == start_date.day:
-                    return True
-                last_day_of_target_month = calendar.monthrange(target_date.year, target_date.month)[1]
-                if start_date.day > last_day_of_target_month and target_date.day == last_day_of_target_month:
-                    return True
-            return False
-        elif period_type == "每年":
-            if target_date.month == start_date.month and target_date.day == start_date.day:
-                return True
-            if start_date.month == 2 and start_date.day == 29 and not calendar.isleap(target_date.year):
-                return target_date.month == 2 and target_date.day == 28
-            return False
-        elif period_type == "自定义周期":
-            interval = period_info.get("interval", 1)
-            unit = period_info.get("unit", "天")
-            if unit == "天":
-                return (target_date - start_date).days % interval == 0
-        elif period_type == "自定义日期":
-            return target_date_key in period_info.get("custom_dates", [])
-        return False
-
-    def get_events_for_date(year: int, month: int, day: int) -> List[Dict]:
+    def get_events_for_date(year: int, month: int, day: int) -> List[CalendarItem]:
         """获取指定日期的事件：组合普通事件和动态计算的周期性事件，按时间排序。"""
         date_key = get_date_key(year, month, day)
         target_date = date(year, month, day)
-        events_for_date = events_data.get(date_key, []).copy()
-        for rule in periodic_events_rules:
-            if check_if_date_matches_rule(target_date, rule):
-                events_for_date.append(rule)
-
-        # 按事件时间排序：全天事件排在最前，其他按时间顺序
-        def sort_key(event):
-            event_time = event.get("event_time", "全天")
-            if event_time == "全天":
-                return "00:00"  # 全天事件排在最前
-            return event_time.split("-")[0]  # 取开始时间进行排序
-
-        events_for_date.sort(key=sort_key)
+        with event_store.lock:
+            event_store.ensure_range_loaded(target_date, target_date)
+            events_for_date = events_data.get(date_key, []).copy()
+        events_for_date.extend(recurrence_engine.rules_on(target_date))
+        events_for_date.sort(key=event_sort_key)
         return events_for_date
 
+    def get_events_in_range(start_date: date, end_date: date) -> Dict[date, List[CalendarItem]]:
+        """
+        获取日期区间内每天的事件：一次遍历区间内的普通事件和全部周期性规则，
+        返回 {日期: 按时间排序的事件列表}，区间内没有事件的日期对应空列表。
+        """
+        events_by_date: Dict[date, List[CalendarItem]] = {}
+        # 预取线程也会调用：持有存储的锁读取，不会遇到界面线程改到一半的数据
+        with event_store.lock:
+            event_store.ensure_range_loaded(start_date, end_date)
+            current = start_date
+            while current <= end_date:
+                date_key = get_date_key(current.year, current.month, current.day)
+                events_by_date[current] = events_data.get(date_key, []).copy()
+                current += timedelta(days=1)
+        for hit_date, rule in recurrence_engine.occurrences(start_date, end_date):
+            events_by_date[hit_date].append(rule)
+        for day_events in events_by_date.values():
+            day_events.sort(key=event_sort_key)
+        return events_by_date
+
     def add_event(year: int, month: int, day: int, title: str, category: str, description: str = "",
-                  event_time: str = "全天", is_periodic: bool = False, period_info: Dict = None) -> None:
+                  event_time: str = "全天") -> None:
         """添加单个普通事件，新增事件时间字段。"""
         date_key = get_date_key(year, month, day)
-        if date_key not in events_data:
-            events_data[date_key] = []
-        event = {
-            "title": title,
-            "category": category,
-            "description": description,
-            "event_time": event_time,  # 新增字段
-            "is_periodic": is_periodic,
-            "period_info": period_info or {},
-            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        events_data[date_key].append(event)
-        save_events()
+        event = Event(date(year, month, day).toordinal(), title, category, description, event_time,
+                      created_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        apply_change({"op": "add", "date": date_key, "event": event})
 
     def add_periodic_event(year: int, month: int, day: int, title: str, category: str,
                            description: str, event_time: str, period_info: Dict) -> None:
         """添加周期性事件规则，新增事件时间字段。"""
-        rule = {
-            "title": title,
-            "category": category,
-            "description": description,
-            "event_time": event_time,  # 新增字段
-            "is_periodic": True,
-            "period_info": period_info,
-            "original_date": get_date_key(year, month, day),
-            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "excluded_dates": []
+        rule = RecurrenceRule(
+            date(year, month, day).toordinal(), title, category, description, event_time,
+            period_type=period_info["type"], interval=period_info.get("interval", 1),
+            unit=period_info.get("unit", ""), custom_dates=parse_ordinals(period_info.get("custom_dates")),
+            created_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        )
+        apply_change({"op": "add_rule", "rule": rule})
+
+    def search_reference_ord() -> int:
+        """搜索结果按与当前选中日期的距离排序"""
+        return date(selected_year, selected_month, selected_day or 1).toordinal()
+
+    def search_window() -> Tuple[int, int]:
+        """周期性事件搜索结果的日期窗口：选中月份前后各 occurrence_window_months 个月"""
+        months = search_config["occurrence_window_months"]
+        low_year, low_month = shift_month(selected_year, selected_month, -months)
+        high_year, high_month = shift_month(selected_year, selected_month, months)
+        low = date(low_year, low_month, 1) if low_year >= date.min.year else date.min
+        high = date(high_year, high_month, calendar.monthrange(high_year, high_month)[1]) \
+            if high_year <= date.max.year else date.max
+        return low.toordinal(), high.toordinal()
+
+    def date_search_hits(hits: List[SearchHit]) -> List[SearchHit]:
+        """
+        规则命中（日期为 0）的日期换成窗口内离选中日期最近的一次实际发生，按周期直接计算，
+        跳过排除日期、不超过结束日期；从不发生的规则无法跳转，不返回
+        """
+        reference_ord = search_reference_ord()
+        low, high = search_window()
+        dated = []
+        for field, date_ord, key in hits:
+            if not date_ord:
+                date_ord = recurrence_engine.nearest_occurrence(key, reference_ord, low, high)
+                if date_ord is None:
+                    continue
+            dated.append((field, date_ord, key))
+        return dated
+
+    def search_result(item: CalendarItem, date_ord: int) -> Dict:
+        """把一条搜索命中整理为结果字典（只为实际显示的结果生成日期文字），周期性事件取命中的发生日期"""
+        day = date.fromordinal(date_ord)
+        date_text = f"{day.year}年{day.month}月{day.day}日"
+        if item.is_periodic:
+            date_text += f" ({item.period_type})"
+        return {
+            "event": item,
+            "date": date_text,
+            "year": day.year,
+            "month": day.month,
+            "day": day.day,
+            "type": "periodic" if item.is_periodic else "normal"
         }
-        periodic_events_rules.append(rule)
-        save_events()
 
-    def search_events(keyword: str) -> List[Dict]:
-        """搜索事件：返回包含关键词的事件及其日期信息"""
+    def resolve_search_hits(hits: List[SearchHit]) -> List[Dict]:
+        """取出命中对应的事件并生成结果，搜索之后已被删除的不再返回"""
+        rule_dates = {id(key): date_ord for _, date_ord, key in hits if isinstance(key, RecurrenceRule)}
+        return [search_result(item, rule_dates[id(item)] if item.is_periodic else item.date_ord)
+                for item in event_store.resolve_hits([hit[2] for hit in hits])]
+
+    def search_hits(keyword: str, limit: Optional[int] = None) -> List[SearchHit]:
+        """标题、描述或分类包含关键词的命中，规则命中取最近一次发生的日期"""
         if not keyword.strip():
             return []
+        return date_search_hits(event_store.search_hits(keyword, search_reference_ord(), limit))
+
+    def search_events(keyword: str, limit: Optional[int] = None) -> List[Dict]:
+        """
+        搜索事件：标题命中优先于描述、分类命中，相关度相同时离当前选中日期越近越靠前，周期性事件按最近一次发生计算。
+        limit 为 k 时由搜索索引从选中日期向两侧查找，找够 k 条标题命中即停止，再与命中的规则一起取前 k 条，
+        只为这 k 条取出事件、生成日期文字；不传时返回全部。
+        """
+        if limit is None:
+            ranked = open_search(keyword)
+            return next_search_page(ranked, ranked.total)
+        reference_ord = search_reference_ord()
+        hits = heapq.nsmallest(limit, search_hits(keyword, limit), key=lambda hit: rank_key(hit, reference_ord))
+        return resolve_search_hits(hits)
+
+    def open_search(keyword: str) -> RankedHits:
+        """按 search_events 的顺序逐页取出全部搜索结果，供结果对话框翻页"""
+        return RankedHits(search_hits(keyword), search_reference_ord())
 
-        keyword = keyword.lower()
-        search_results = []
-
-        # 搜索普通事件
-        for date_key, events_list in events_data.items():
-            for event in events_list:
-                title = event.get("title", "").lower()
-                description = event.get("description", "").lower()
-                category = event.get("category", "").lower()
-
-                if keyword in title or keyword in description or keyword in category:
-                    year, month, day = date_key.split('-')
-                    search_results.append({
-                        "event": event,
-                        "date": f"{int(year)}年{int(month)}月{int(day)}日",
-                        "year": int(year),
-                        "month": int(month),
-                        "day": int(day),
-                        "type": "normal"
-                    })
-
-        # 搜索周期性事件
-        for rule in periodic_events_rules:
-            title = rule.get("title", "").lower()
-            description = rule.get("description", "").lower()
-            category = rule.get("category", "").lower()
-
-            if keyword in title or keyword in description or keyword in category:
-                original_date = rule.get("original_date", "")
-                if original_date:
-                    year, month, day = original_date.split('-')
-                    period_type = rule.get("period_info", {}).get("type", "")
-                    search_results.append({
-                        "event": rule,
-                        "date": f"{int(year)}年{int(month)}月{int(day)}日 ({period_type})",
-                        "year": int(year),
-                        "month": int(month),
-                        "day": int(day),
-                        "type": "periodic"
-                    })
-
-        # 按日期排序
-        search_results.sort(key=lambda x: (x["year"], x["month"], x["day"]))
-        return search_results
+    def next_search_page(ranked: RankedHits, size: int) -> List[Dict]:
+        return resolve_search_hits(ranked.next_page(size))
 
     def get_prev_next_month_dates(year: int, month: int) -> Tuple[List[int], List[int]]:
         """获取上个月末尾和下个月开头的日期，用于填充日历空白"""
@@ -487,6 +540,88 @@ def main(page: ft.Page) -> None:
 
         return prev_month_dates, next_month_dates
 
+    def get_visible_date_range(year: int, month: int) -> Tuple[date, date]:
+        """获取月视图中可见的日期区间（包含上下月的填充日期）"""
+        prev_month_dates, next_month_dates = get_prev_next_month_dates(year, month)
+        first_day = date(year, month, 1) - timedelta(days=len(prev_month_dates))
+        last_day = date(year, month, calendar.monthrange(year, month)[1]) + timedelta(days=len(next_month_dates))
+        return first_day, last_day
+
+    # ===== 相邻月份后台预取 =====
+    prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="calendar-prefetch")
+    prefetch_generation = 0  # 每次安排预取时递增，后台任务发现编号变化即放弃
+    prefetch_future: Optional[Future] = None
+    session_closed = False  # 会话关闭后不再安排预取
+    prefetched_events: Dict[Tuple[int, int], Tuple[int, Dict[date, List[CalendarItem]]]] = {}  # (年, 月) -> (数据版本, 事件表)
+
+    def close_session(e=None) -> None:
+        """
+        会话关闭时释放本会话的资源：写入尚在合并窗口内的修改，停止预取线程并取消排队的预取，
+        注销退出时的写入回调，避免每个结束的会话都在进程中留下一个线程池和一个退出回调。可重复调用。
+        """
+        nonlocal session_closed, prefetch_generation
+        session_closed = True
+        prefetch_generation += 1  # 正在运行的预取在下一个月份前停止
+        flush_events()
+        prefetch_executor.shutdown(wait=False, cancel_futures=True)
+        atexit.unregister(flush_events)
+
+    # 断开连接后会话还可能重新连上，只写入修改；会话真正关闭时再释放资源
+    page.on_disconnect = flush_events
+    page.on_close = close_session
+
+    def shift_month(year: int, month: int, delta: int) -> Tuple[int, int]:
+        """计算相对某月偏移 delta 个月后的年月"""
+        month_index = year * 12 + month - 1 + delta
+        return month_index // 12, month_index % 12 + 1
+
+    def prefetch_month(year: int, month: int, generation: int) -> None:
+        """在后台计算某个月视图所需的事件、农历和节假日信息"""
+        visible_start, visible_end = get_visible_date_range(year, month)
+        version = events_version
+        events_map = get_events_in_range(visible_start, visible_end)
+        if generation != prefetch_generation or version != events_version:
+            # 计算期间数据被修改过，结果可能混有新旧数据，丢弃
+            return
+        prefetched_events[(year, month)] = (version, events_map)
+        get_lunar_info_for_range(visible_start, visible_end)
+        current = visible_start
+        while current <= visible_end:
+            if generation != prefetch_generation:
+                return
+            get_lunar_info(current.year, current.month, current.day)
+            get_holiday_info(current.year, current.month, current.day)
+            current += timedelta(days=1)
+
+    def run_prefetch(targets: List[Tuple[int, int]], generation: int) -> None:
+        """依次预取目标月份，用户继续翻页后（编号变化）立即停止"""
+        for year, month in targets:
+            if generation != prefetch_generation:
+                return
+            try:
+                prefetch_month(year, month, generation)
+            except Exception as e:
+                # 与界面线程并发修改数据时可能失败，丢弃即可，渲染时会重新计算
+                print(f"预取 {year}-{month} 时出错: {e}")
+
+    def schedule_prefetch(year: int, month: int) -> None:
+        """安排预取当前月份的相邻月份，并取消尚未完成的旧预取"""
+        nonlocal prefetch_generation, prefetch_future
+        prefetch_generation += 1
+        if prefetch_future is not None:
+            prefetch_future.cancel()
+        deltas = []
+        if prefetch_config["adjacent_months"]:
+            deltas += [1, -1]
+        if prefetch_config["adjacent_years"]:
+            deltas += [12, -12]
+        targets = [shift_month(year, month, delta) for delta in deltas]
+        for key in list(prefetched_events):
+            if key not in targets:
+                prefetched_events.pop(key, None)
+        if targets and not session_closed:
+            prefetch_future = prefetch_executor.submit(run_prefetch, targets, prefetch_generation)
+
     def create_search_component() -> ft.Container:
         """创建优雅的搜索组件"""
         search_input = ft.TextField(
@@ -550,19 +685,44 @@ def main(page: ft.Page) -> None:
             width=sizes["search_container_width"]
         )
 
-        def handle_search_input_change(value: str):
-            """处理搜索输入变化，显示实时建议"""
-            clear_button.visible = bool(value.strip())
-
-            if value.strip():
-                results = search_events(value)
-                if results:
-                    create_search_suggestions(results[:5])  # 最多显示5个建议
-                else:
-                    suggestions_container.visible = False
+        suggestion_task: Optional[Future] = None
+        suggestion_generation = 0  # 每次输入递增，过期的搜索结果直接丢弃
+
+        def cancel_suggestions() -> None:
+            """取消尚未完成的建议搜索；已在后台线程中运行的搜索无法中断，其结果也不会显示"""
+            nonlocal suggestion_generation
+            suggestion_generation += 1
+            if suggestion_task is not None and not suggestion_task.done():
+                suggestion_task.cancel()
+                suggestion_latency.record_cancelled()
+
+        async def update_suggestions(keyword: str, generation: int, started: float) -> None:
+            """防抖等待后在后台线程中搜索，仍是最新的输入时才显示建议"""
+            await asyncio.sleep(search_config["debounce_ms"] / 1000)
+            results = await asyncio.to_thread(search_events, keyword, search_config["suggestion_limit"])
+            if generation != suggestion_generation:
+                return
+            if results:
+                create_search_suggestions(results)
             else:
                 suggestions_container.visible = False
             page.update()
+            suggestion_latency.record(time.perf_counter() - started)
+
+        def handle_search_input_change(value: str):
+            """处理搜索输入变化：取消上一次的建议搜索，防抖后异步显示实时建议"""
+            nonlocal suggestion_task
+            cancel_suggestions()
+            has_keyword = bool(value.strip())
+            changed = clear_button.visible != has_keyword or (not has_keyword and suggestions_container.visible)
+            clear_button.visible = has_keyword
+            if has_keyword:
+                suggestion_task = page.run_task(update_suggestions, value, suggestion_generation,
+                                                time.perf_counter())
+            else:
+                suggestions_container.visible = False
+            if changed:
+                page.update()
 
         def handle_search_submit():
             """处理搜索提交"""
@@ -572,6 +732,7 @@ def main(page: ft.Page) -> None:
 
         def clear_search():
             """清除搜索"""
+            cancel_suggestions()
             search_input.value = ""
             clear_button.visible = False
             suggestions_container.visible = False
@@ -592,7 +753,7 @@ def main(page: ft.Page) -> None:
                     content=ft.Column(
                         controls=[
                             ft.Text(
-                                result["event"]["title"],
+                                result["event"].title,
                                 size=font_sizes["body"],
                                 color=colors["text_primary"],
                                 weight=ft.FontWeight.W_500,
@@ -615,6 +776,11 @@ def main(page: ft.Page) -> None:
                 )
                 suggestions.append(suggestion_item)
 
+            suggestions_container.content = ft.Column(controls=suggestions, spacing=2, scroll=ft.ScrollMode.AUTO)
+            suggestions_container.height = min(len(suggestions) * sizes["search_suggestion_item_height"],
+                                               sizes["search_suggestion_height"])
+            suggestions_container.visible = True
+
         def handle_suggestion_hover(e: ft.ControlEvent):
             """处理建议项悬停效果"""
             if e.data == "true":
@@ -631,6 +797,7 @@ def main(page: ft.Page) -> None:
             selected_day = result["day"]
 
             # 清除搜索状态
+            cancel_suggestions()
             search_input.value = ""
             clear_button.visible = False
             suggestions_container.visible = False
@@ -640,10 +807,10 @@ def main(page: ft.Page) -> None:
             update_event_panel()
 
         def show_search_results_dialog(keyword: str):
-            """显示搜索结果对话框"""
-            results = search_events(keyword)
+            """显示搜索结果对话框：结果按相关度和日期距离排序，先显示一页，点击“显示更多”再取下一页"""
+            ranked = open_search(keyword)
 
-            if not results:
+            if not ranked.total:
                 # 无结果对话框
                 no_results_dialog = ft.AlertDialog(
                     title=ft.Text("搜索结果", color=colors["text_primary"], weight=ft.FontWeight.BOLD),
@@ -668,23 +835,21 @@ def main(page: ft.Page) -> None:
                 """创建结果项点击处理函数的闭包"""
                 return lambda e: jump_to_result_and_close(result_data)
 
-            # 创建结果列表
-            result_items = []
-            for result in results:
+            def create_result_item(result: Dict) -> ft.Container:
                 event = result["event"]
 
                 # 安全地获取事件类别对应的颜色
-                category_key = f"event_{event['category'].lower()}"
+                category_key = f"event_{event.category.lower()}"
                 category_bgcolor = colors.get(category_key, colors["text_secondary"])
 
-                result_item = ft.Container(
+                return ft.Container(
                     content=ft.Column(
                         controls=[
                             ft.Row(
                                 controls=[
                                     ft.Container(
                                         content=ft.Text(
-                                            event["category"],
+                                            event.category,
                                             size=font_sizes["tiny"],
                                             color=colors["text_white"],
                                             weight=ft.FontWeight.BOLD
@@ -702,18 +867,18 @@ def main(page: ft.Page) -> None:
                                 alignment=ft.MainAxisAlignment.SPACE_BETWEEN
                             ),
                             ft.Text(
-                                event["title"],
+                                event.title,
                                 size=font_sizes["body"],
                                 color=colors["text_primary"],
                                 weight=ft.FontWeight.W_500
                             ),
                             ft.Text(
-                                event.get("description", ""),
+                                event.description,
                                 size=font_sizes["caption"],
                                 color=colors["text_secondary"],
                                 max_lines=2,
                                 overflow=ft.TextOverflow.ELLIPSIS
-                            ) if event.get("description") else ft.Container()
+                            ) if event.description else ft.Container()
                         ],
                         spacing=5
                     ),
@@ -727,18 +892,32 @@ def main(page: ft.Page) -> None:
                                                colors["search_suggestion_hover"] if e.data == "true"
                                                else colors["surface"]) or e.control.update()  # 悬停效果
                 )
-                result_items.append(result_item)
+
+            result_list = ft.Column(controls=[], spacing=5, scroll=ft.ScrollMode.AUTO)
+
+            def load_more_results(e=None):
+                """取出下一页结果追加到列表末尾，还有剩余结果时在末尾保留“显示更多”按钮"""
+                controls = result_list.controls
+                if controls and isinstance(controls[-1], ft.TextButton):
+                    controls.pop()
+                controls.extend(create_result_item(result)
+                                for result in next_search_page(ranked, search_config["results_page_size"]))
+                if ranked.remaining:
+                    controls.append(ft.TextButton(
+                        f"显示更多（还有 {ranked.remaining} 条）", on_click=load_more_results,
+                        style=ft.ButtonStyle(color=colors["primary"])
+                    ))
+                if e is not None:
+                    page.update()
+
+            load_more_results()
 
             # 搜索结果对话框
             results_dialog = ft.AlertDialog(
-                title=ft.Text(f"搜索{keyword}的结果 ({len(results)}条)",
+                title=ft.Text(f"搜索{keyword}的结果 ({ranked.total}条)",
                 color = colors["text_primary"], weight = ft.FontWeight.BOLD),
                 content = ft.Container(
-                    content=ft.Column(
-                    controls=result_items,
-                    spacing=5,
-                    scroll=ft.ScrollMode.AUTO
-                ),
+                    content=result_list,
                 width=400,
                 height=400
             ),
@@ -756,6 +935,7 @@ def main(page: ft.Page) -> None:
 
     def create_month_view(year: int, month: int) -> ft.Container:
         """创建月份视图：增大日期块，显示事件摘要，填充跨月日期"""
+        nonlocal visible_events
         cal = calendar.monthcalendar(year, month)
         weekday_labels = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
 
@@ -777,6 +957,14 @@ def main(page: ft.Page) -> None:
 
         # 获取上下月的填充日期
         prev_month_dates, next_month_dates = get_prev_next_month_dates(year, month)
+        # 一次性计算整个可见区间的事件和农历信息，供日期格子和事件面板共用
+        visible_start, visible_end = get_visible_date_range(year, month)
+        prefetched = prefetched_events.get((year, month))
+        if prefetched is not None and prefetched[0] == events_version:
+            visible_events = prefetched[1]
+        else:
+            visible_events = get_events_in_range(visible_start, visible_end)
+        get_lunar_info_for_range(visible_start, visible_end)
         next_month_index = 0  # 用于追踪下个月日期的索引
 
         for week_index, week in enumerate(cal):
@@ -799,7 +987,8 @@ def main(page: ft.Page) -> None:
                                 fill_year == selected_year and fill_month == selected_month and fill_day == selected_day)
 
                         day_container = create_date_container(fill_year, fill_month, fill_day, True, is_today_cross,
-                                                              is_selected_cross)
+                                                              is_selected_cross,
+                                                              visible_events[date(fill_year, fill_month, fill_day)])
                     elif next_month_index < len(next_month_dates):
                         # 最后一周，填充下个月日期 - 修复：使用正确的索引逻辑
                         fill_day = next_month_dates[next_month_index]
@@ -817,7 +1006,8 @@ def main(page: ft.Page) -> None:
                                 fill_year == selected_year and fill_month == selected_month and fill_day == selected_day)
 
                         day_container = create_date_container(fill_year, fill_month, fill_day, True, is_today_cross,
-                                                              is_selected_cross)
+                                                              is_selected_cross,
+                                                              visible_events[date(fill_year, fill_month, fill_day)])
                     else:
                         # 如果没有更多跨月日期需要填充，创建空容器
                         day_container = ft.Container(width=sizes["date_container_width"],
@@ -826,7 +1016,8 @@ def main(page: ft.Page) -> None:
                     # 当前月的日期
                     is_today = (year == today.year and month == today.month and day == today.day)
                     is_selected = (year == selected_year and month == selected_month and day == selected_day)
-                    day_container = create_date_container(year, month, day, False, is_today, is_selected)
+                    day_container = create_date_container(year, month, day, False, is_today, is_selected,
+                                                          visible_events[date(year, month, day)])
 
                 week_controls.append(day_container)
             date_rows.append(ft.Row(controls=week_controls, alignment=ft.MainAxisAlignment.CENTER, spacing=3))
@@ -843,11 +1034,13 @@ def main(page: ft.Page) -> None:
         )
 
     def create_date_container(year: int, month: int, day: int, is_other_month: bool = False,
-                              is_today: bool = False, is_selected: bool = False) -> ft.Container:
+                              is_today: bool = False, is_selected: bool = False,
+                              day_events: Optional[List[CalendarItem]] = None) -> ft.Container:
         """创建单个日期容器，支持条纹状事件摘要显示"""
         day_of_week = date(year, month, day).weekday()
         is_weekend = day_of_week >= 5
-        day_events = get_events_for_date(year, month, day)
+        if day_events is None:
+            day_events = get_events_for_date(year, month, day)
         has_events = len(day_events) > 0
 
         # 获取农历和节假日信息
@@ -984,7 +1177,7 @@ def main(page: ft.Page) -> None:
 
         return day_container
 
-    def create_event_summary(events: List[Dict]) -> ft.Container:
+    def create_event_summary(events: List[CalendarItem]) -> ft.Container:
         """创建事件摘要显示，醒目的条纹状UI"""
         event_strips = []
 
@@ -993,12 +1186,11 @@ def main(page: ft.Page) -> None:
 
         for i, event in enumerate(display_events):
             time_prefix = ""
-            if event.get("event_time", "全天") != "全天":
-                time_text = event["event_time"]
-                if "-" in time_text:
-                    time_prefix = time_text.split("-")[0] + " "
+            start_minute = event.time_slot.start_minute
+            if start_minute is not None:
+                time_prefix = f"{start_minute // 60:02d}:{start_minute % 60:02d} "
 
-            title = event["title"]
+            title = event.title
             # 根据是否有时间前缀调整标题长度
             max_title_length = 4 if time_prefix else 6
             if len(title) > max_title_length:
@@ -1014,7 +1206,7 @@ def main(page: ft.Page) -> None:
                 "自定义": colors["event_custom"],
                 "周期性": colors["event_periodic"]
             }
-            strip_color = category_colors.get(event["category"], colors["text_secondary"])
+            strip_color = category_colors.get(event.category, colors["text_secondary"])
 
             # 创建条纹状事件条
             event_strip = ft.Container(
@@ -1241,6 +1433,181 @@ def main(page: ft.Page) -> None:
         )
         page.show_dialog(jump_dialog)
 
+    def show_import_dialog() -> None:
+        """导入其他日历：在后台线程中读取 ICS 或 CSV 文件，读完后在界面线程中一次加入存储，对话框中显示进度"""
+        importing = False
+
+        def on_progress(count: int, fraction: float) -> None:
+            page.run_task(show_progress, count, fraction)
+
+        async def show_progress(count: int, fraction: float) -> None:
+            progress_bar.value = fraction
+            status_text.value = f"已读取 {count} 条…"
+            page.update()
+
+        def run_import(path: str) -> None:
+            """后台线程：只读取和校验文件，不接触存储和规则引擎，结果交给界面线程加入"""
+            try:
+                items, result = read_import_file(path, progress=on_progress)
+            except (OSError, ValueError) as e:
+                page.run_task(finish_import, [], None, f"导入失败: {e}")
+                return
+            page.run_task(finish_import, items, result, "")
+
+        async def finish_import(items: List[CalendarItem], result: Optional[ImportResult], error: str) -> None:
+            """
+            界面线程：把读出的事件和规则一次加入存储（与界面的其他修改一样在界面线程中进行，
+            渲染和预取读取时不会遇到改到一半的数据），新规则加入规则引擎后再递增版本号，只刷新一次界面
+            """
+            nonlocal importing, events_version
+            if result is None:
+                status_text.value = error
+            else:
+                result.events, result.rules = event_store.bulk_add([items])
+                for item in items:
+                    if item.is_periodic:
+                        recurrence_engine.add(item)
+                events_version += 1
+                update_calendar()
+                update_event_panel()
+                message = str(result)
+                if result.errors:
+                    message += "\n" + "\n".join(result.errors[:3])
+                status_text.value = message
+            importing = False
+            import_button.disabled = False
+            page.update()
+
+        def handle_import():
+            nonlocal importing
+            path = (path_input.value or "").strip().strip('"')
+            if importing or not path:
+                return
+            importing = True
+            import_button.disabled = True
+            progress_bar.value = 0
+            status_text.value = "正在导入…"
+            page.update()
+            threading.Thread(target=run_import, args=(path,), daemon=True).start()
+
+        path_input = ft.TextField(
+            label="文件路径", hint_text="例如: D:\\calendar.ics", bgcolor=colors["background"],
+            color=colors["text_primary"], border_color=colors["primary"]
+        )
+        progress_bar = ft.ProgressBar(value=0, color=colors["primary"], bgcolor=colors["surface"])
+        status_text = ft.Text("支持 .ics（含重复规则）和 .csv 文件", size=font_sizes["caption"],
+                              color=colors["text_secondary"])
+        import_button = ft.ElevatedButton(
+            "导入", on_click=lambda e: handle_import(),
+            style=ft.ButtonStyle(bgcolor=colors["accent"], color=colors["text_white"], elevation=2)
+        )
+
+        import_dialog = ft.AlertDialog(
+            title=ft.Text("导入日历", color=colors["text_primary"], weight=ft.FontWeight.BOLD),
+            content=ft.Container(
+                content=ft.Column(controls=[path_input, progress_bar, status_text], spacing=12, tight=True),
+                width=sizes["dialog_content_width"]
+            ),
+            actions=[
+                ft.TextButton("关闭", on_click=lambda e: page.pop_dialog(),
+                              style=ft.ButtonStyle(color=colors["text_secondary"])),
+                import_button
+            ],
+            actions_alignment=ft.MainAxisAlignment.SPACE_BETWEEN
+        )
+        page.show_dialog(import_dialog)
+
+    def show_export_dialog() -> None:
+        """导出为 ICS：在后台线程中边生成边写入文件，导出多年数据也不会卡住界面"""
+        exporting = False
+
+        def on_progress(count: int, fraction: float) -> None:
+            page.run_task(show_progress, count, fraction)
+
+        async def show_progress(count: int, fraction: float) -> None:
+            progress_bar.value = fraction
+            status_text.value = f"已写出 {count} 个事件…"
+            page.update()
+
+        def run_export(path: str, start: Optional[date], end: Optional[date], expand: bool) -> None:
+            """后台线程：只生成和写入文件，界面由 finish_export 在界面线程中更新"""
+            try:
+                count = export_file(event_store, path, start, end, expand, progress=on_progress)
+            except (OSError, ValueError) as e:
+                page.run_task(finish_export, f"导出失败: {e}")
+            else:
+                page.run_task(finish_export, f"已导出 {count} 个事件到 {path}")
+
+        async def finish_export(message: str) -> None:
+            nonlocal exporting
+            status_text.value = message
+            exporting = False
+            export_button.disabled = False
+            page.update()
+
+        def handle_export():
+            nonlocal exporting
+            path = (path_input.value or "").strip().strip('"')
+            if exporting or not path:
+                return
+            start, end = parse_date(start_input.value), parse_date(end_input.value)
+            if (start_input.value and start is None) or (end_input.value and end is None):
+                status_text.value = "日期格式应为 YYYY-MM-DD"
+                page.update()
+                return
+            if expand_checkbox.value and (start is None or end is None):
+                status_text.value = "展开周期性事件需要填写起止日期"
+                page.update()
+                return
+            exporting = True
+            export_button.disabled = True
+            progress_bar.value = 0 if start and end else None
+            status_text.value = "正在导出…"
+            page.update()
+            threading.Thread(target=run_export, args=(path, start, end, bool(expand_checkbox.value)),
+                             daemon=True).start()
+
+        def date_field(label: str) -> ft.TextField:
+            return ft.TextField(
+                label=label, hint_text="YYYY-MM-DD，留空表示不限", bgcolor=colors["background"],
+                color=colors["text_primary"], border_color=colors["primary"], expand=True
+            )
+
+        path_input = ft.TextField(
+            label="文件路径", hint_text="例如: D:\\calendar_backup.ics", bgcolor=colors["background"],
+            color=colors["text_primary"], border_color=colors["primary"]
+        )
+        start_input = date_field("开始日期")
+        end_input = date_field("结束日期")
+        expand_checkbox = ft.Checkbox(label="同时写出周期性事件在区间内的每次重复", value=False,
+                                      active_color=colors["primary"])
+        progress_bar = ft.ProgressBar(value=0, color=colors["primary"], bgcolor=colors["surface"])
+        status_text = ft.Text("周期性事件以重复规则导出，可用其他日历程序或本程序导入",
+                              size=font_sizes["caption"], color=colors["text_secondary"])
+        export_button = ft.ElevatedButton(
+            "导出", on_click=lambda e: handle_export(),
+            style=ft.ButtonStyle(bgcolor=colors["accent"], color=colors["text_white"], elevation=2)
+        )
+
+        export_dialog = ft.AlertDialog(
+            title=ft.Text("导出日历", color=colors["text_primary"], weight=ft.FontWeight.BOLD),
+            content=ft.Container(
+                content=ft.Column(
+                    controls=[path_input, ft.Row(controls=[start_input, end_input], spacing=10),
+                              expand_checkbox, progress_bar, status_text],
+                    spacing=12, tight=True
+                ),
+                width=sizes["dialog_content_width"]
+            ),
+            actions=[
+                ft.TextButton("关闭", on_click=lambda e: page.pop_dialog(),
+                              style=ft.ButtonStyle(color=colors["text_secondary"])),
+                export_button
+            ],
+            actions_alignment=ft.MainAxisAlignment.SPACE_BETWEEN
+        )
+        page.show_dialog(export_dialog)
+
     calendar_container = ft.Container()
     calendar_container.content = create_month_view(selected_year, selected_month)
 
@@ -1256,14 +1623,20 @@ def main(page: ft.Page) -> None:
 
     def update_calendar() -> None:
         """更新日历显示"""
+        evict_cold_years()
         calendar_container.content = create_month_view(selected_year, selected_month)
         month_title.value = f"{calendar.month_name[selected_month]} {selected_year}"
         page.update()
+        schedule_prefetch(selected_year, selected_month)
 
     def update_event_panel() -> None:
         """更新事件面板，包含农历和节假日信息"""
         if selected_day:
-            events = get_events_for_date(selected_year, selected_month, selected_day)
+            panel_date = date(selected_year, selected_month, selected_day)
+            if panel_date in visible_events:
+                events = visible_events[panel_date]
+            else:
+                events = get_events_for_date(selected_year, selected_month, selected_day)
             lunar_month, _, solar_term, actual_lunar_day = get_lunar_info(selected_year, selected_month, selected_day)
             is_holiday, is_makeup_workday, holiday_name = get_holiday_info(selected_year, selected_month, selected_day)
 
@@ -1281,8 +1654,8 @@ def main(page: ft.Page) -> None:
             events_column.controls.clear()
 
             if events:
-                for i, event in enumerate(events):
-                    event_card = create_event_card(event, i)
+                for event in events:
+                    event_card = create_event_card(event)
                     events_column.controls.append(event_card)
             else:
                 events_column.controls.append(
@@ -1295,7 +1668,7 @@ def main(page: ft.Page) -> None:
                 )
         page.update()
 
-    def create_event_card(event: Dict, index: int) -> ft.Container:
+    def create_event_card(event: CalendarItem) -> ft.Container:
         """创建事件卡片：美观地展示事件信息，包含时间信息和编辑功能"""
         # 修正：使用colors字典中的事件颜色
         category_colors = {
@@ -1308,21 +1681,18 @@ def main(page: ft.Page) -> None:
             "自定义周期": colors["custom_period"]
         }
 
-        title_text = event["title"]
-        if event.get("is_periodic", False):
-            period_info = event.get("period_info", {})
-            period_type = period_info.get("type", "")
+        title_text = event.title
+        if event.is_periodic:
+            period_type = event.period_type
             if period_type == "自定义周期":
-                interval = period_info.get("interval", 1)
-                unit = period_info.get("unit", "")
-                title_text += f" (每{interval}{unit})"
+                title_text += f" (每{event.interval}{event.unit})"
             elif period_type == "自定义日期":
                 title_text += " (自定义日期)"
             elif period_type:
                 title_text += f" ({period_type})"
 
-        display_category = event["category"]
-        event_time = event.get("event_time", "全天")
+        display_category = event.category
+        event_time = event.event_time
 
         return ft.Container(
             content=ft.Column(
@@ -1347,14 +1717,14 @@ def main(page: ft.Page) -> None:
                                     ft.IconButton(
                                         icon=ft.Icons.EDIT_OUTLINED, icon_size=sizes["icon_button"],
                                         icon_color=colors["accent"], tooltip="编辑事件",
-                                        on_click=lambda e, idx=index: edit_event_dialog(idx),
+                                        on_click=lambda e, item_id=event.id: edit_event_dialog(item_id),
                                         style=ft.ButtonStyle(
                                             overlay_color=ft.Colors.with_opacity(0.1, colors["accent"]))
                                     ),
                                     ft.IconButton(
                                         icon=ft.Icons.DELETE_OUTLINE, icon_size=sizes["icon_button"],
                                         icon_color=colors["text_secondary"], tooltip="删除事件",
-                                        on_click=lambda e, idx=index: delete_event(idx),
+                                        on_click=lambda e, item_id=event.id: delete_event(item_id),
                                         style=ft.ButtonStyle(
                                             overlay_color=ft.Colors.with_opacity(0.1, colors["text_secondary"]))
                                     )
@@ -1366,70 +1736,47 @@ def main(page: ft.Page) -> None:
                     ),
                     ft.Text(title_text, size=font_sizes["body"], color=colors["text_primary"],
                             weight=ft.FontWeight.W_500),
-                    ft.Text(event.get("description", ""), size=font_sizes["caption"],
-                            color=colors["text_secondary"]) if event.get("description") else ft.Container()
+                    ft.Text(event.description, size=font_sizes["caption"],
+                            color=colors["text_secondary"]) if event.description else ft.Container()
                 ],
                 spacing=5
             ),
             padding=12, bgcolor=colors["surface"], border_radius=8, margin=ft.Margin(bottom=8)
         )
 
-    def delete_event(event_index: int) -> None:
+    def delete_event(item_id: str) -> None:
         """删除事件：智能处理普通和周期性事件，新增"删除此后"选项"""
         if not selected_day: return
-        all_events_for_day = get_events_for_date(selected_year, selected_month, selected_day)
-        if event_index >= len(all_events_for_day):
-            print("Error: Event index out of range.")
+        # 事件卡片绑定的是编号，直接从存储的编号索引取得事件或规则本身
+        event_to_delete = event_store.get(item_id)
+        if event_to_delete is None:
+            print("Error: Event not found.")
             return
 
-        event_to_delete = all_events_for_day[event_index]
         date_key = get_date_key(selected_year, selected_month, selected_day)
-        is_periodic = event_to_delete.get("is_periodic", False)
+        is_periodic = event_to_delete.is_periodic
 
         if is_periodic:
-            original_rule = None
-            for rule in periodic_events_rules:
-                if (rule.get("created_at") == event_to_delete.get("created_at") and
-                        rule.get("title") == event_to_delete.get("title")):
-                    original_rule = rule
-                    break
-
-            if not original_rule:
-                print("Error: Could not find the original periodic rule to delete.")
-                return
-
             def delete_single_occurrence():
                 """仅删除当天的事件实例"""
-                if "excluded_dates" not in original_rule:
-                    original_rule["excluded_dates"] = []
-                if date_key not in original_rule["excluded_dates"]:
-                    original_rule["excluded_dates"].append(date_key)
-                save_events()
+                apply_change({"op": "exclude_date", "id": item_id, "date": date_key})
                 update_calendar()
                 update_event_panel()
                 page.pop_dialog()
 
             def delete_after_date():
                 """删除此后的所有周期性事件（新功能）"""
-                current_selected_date = date(selected_year, selected_month, selected_day)
-                end_date = current_selected_date
-                original_rule["end_date"] = end_date.strftime("%Y-%m-%d")
-
-                # 同时将当前日期加入排除列表，确保当前日期也被删除
-                if "excluded_dates" not in original_rule:
-                    original_rule["excluded_dates"] = []
-                if date_key not in original_rule["excluded_dates"]:
-                    original_rule["excluded_dates"].append(date_key)
+                # 结束日期设为前一天，当前日期也随之删除，不必再加入排除列表；之后的排除日期由规则自动丢弃
+                end_date = date(selected_year, selected_month, selected_day) - timedelta(days=1)
+                apply_change({"op": "set_end_date", "id": item_id, "end_date": end_date.strftime("%Y-%m-%d")})
 
-                save_events()
                 update_calendar()
                 update_event_panel()
                 page.pop_dialog()
 
             def delete_entire_series():
                 """删除整个周期性事件系列"""
-                periodic_events_rules.remove(original_rule)
-                save_events()
+                apply_change({"op": "delete_series", "id": item_id})
                 update_calendar()
                 update_event_panel()
                 page.pop_dialog()
@@ -1443,7 +1790,7 @@ def main(page: ft.Page) -> None:
                 content=ft.Container(
                     content=ft.Column(
                         controls=[
-                            ft.Text(f"您想如何删除周期性事件「{event_to_delete['title']}」？",
+                            ft.Text(f"您想如何删除周期性事件「{event_to_delete.title}」？",
                                     color=colors["text_primary"], size=font_sizes["body"]),
                             ft.Container(height=10),
                             ft.Text("• 仅删除今天：只删除当前日期的事件实例",
@@ -1472,11 +1819,9 @@ def main(page: ft.Page) -> None:
             page.show_dialog(confirm_dialog)
         else:
             def confirm_delete():
-                if date_key in events_data and event_to_delete in events_data[date_key]:
-                    events_data[date_key].remove(event_to_delete)
-                    if not events_data[date_key]:
-                        del events_data[date_key]
-                    save_events()
+                # 对话框打开期间事件可能已被删除
+                if event_store.get(item_id) is event_to_delete:
+                    apply_change({"op": "delete", "date": event_to_delete.date.isoformat(), "id": item_id})
                     update_calendar()
                     update_event_panel()
                 page.pop_dialog()
@@ -1486,7 +1831,7 @@ def main(page: ft.Page) -> None:
 
             confirm_dialog = ft.AlertDialog(
                 title=ft.Text("确认删除", color=colors["text_primary"], weight=ft.FontWeight.BOLD),
-                content=ft.Text(f"确定要删除事件「{event_to_delete['title']}」吗？"),
+                content=ft.Text(f"确定要删除事件「{event_to_delete.title}」吗？"),
                 actions=[
                     ft.TextButton("取消", on_click=cancel_delete),
                     ft.ElevatedButton("删除", on_click=confirm_delete,
@@ -1916,22 +2261,21 @@ def main(page: ft.Page) -> None:
         )
         page.show_dialog(dialog)
 
-    def edit_event_dialog(event_index: int) -> None:
+    def edit_event_dialog(item_id: str) -> None:
         """显示编辑事件对话框"""
         if not selected_day: return
 
-        all_events_for_day = get_events_for_date(selected_year, selected_month, selected_day)
-        if event_index >= len(all_events_for_day):
-            print("Error: Event index out of range.")
+        event_to_edit = event_store.get(item_id)
+        if event_to_edit is None:
+            print("Error: Event not found.")
             return
 
-        event_to_edit = all_events_for_day[event_index]
-        is_periodic = event_to_edit.get("is_periodic", False)
+        is_periodic = event_to_edit.is_periodic
 
         # 预填充表单数据
         title_field = ft.TextField(
             label="事件标题", hint_text="请输入事件标题",
-            value=event_to_edit.get("title", ""),
+            value=event_to_edit.title,
             bgcolor=colors["background"], color=colors["text_primary"], border_color=colors["primary"]
         )
 
@@ -1939,20 +2283,20 @@ def main(page: ft.Page) -> None:
             label="事件类别",
             options=[ft.dropdown.Option("工作"), ft.dropdown.Option("日常"),
                      ft.dropdown.Option("个人生活"), ft.dropdown.Option("自定义")],
-            value=event_to_edit.get("category", "日常"),
+            value=event_to_edit.category,
             bgcolor=colors["background"], color=colors["text_primary"], border_color=colors["primary"]
         )
 
         time_dropdown = ft.Dropdown(
             label="事件时间",
             options=[ft.dropdown.Option(time_opt) for time_opt in time_options],
-            value=event_to_edit.get("event_time", "全天"),
+            value=event_to_edit.event_time,
             bgcolor=colors["background"], color=colors["text_primary"], border_color=colors["primary"]
         )
 
         description_field = ft.TextField(
             label="事件描述（可选）", hint_text="添加一些详细描述...",
-            value=event_to_edit.get("description", ""),
+            value=event_to_edit.description,
             multiline=True, min_lines=2, max_lines=4,
             bgcolor=colors["background"], color=colors["text_primary"], border_color=colors["primary"]
         )
@@ -1963,19 +2307,9 @@ def main(page: ft.Page) -> None:
                 """仅编辑单个事件实例"""
                 if title_field.value:
                     # 先从周期性规则中排除当前日期
-                    original_rule = None
-                    for rule in periodic_events_rules:
-                        if (rule.get("created_at") == event_to_edit.get("created_at") and
-                                rule.get("title") == event_to_edit.get("title")):
-                            original_rule = rule
-                            break
-
-                    if original_rule:
+                    if event_store.get(item_id) is event_to_edit:
                         date_key = get_date_key(selected_year, selected_month, selected_day)
-                        if "excluded_dates" not in original_rule:
-                            original_rule["excluded_dates"] = []
-                        if date_key not in original_rule["excluded_dates"]:
-                            original_rule["excluded_dates"].append(date_key)
+                        apply_change({"op": "exclude_date", "id": item_id, "date": date_key})
 
                     # 添加新的单独事件
                     add_event(
@@ -1984,7 +2318,6 @@ def main(page: ft.Page) -> None:
                         description_field.value or "", time_dropdown.value
                     )
 
-                    save_events()
                     update_calendar()
                     update_event_panel()
                     page.pop_dialog()
@@ -1992,17 +2325,14 @@ def main(page: ft.Page) -> None:
             def edit_entire_series():
                 """编辑整个周期性事件系列"""
                 if title_field.value:
-                    # 找到并编辑原始规则
-                    for rule in periodic_events_rules:
-                        if (rule.get("created_at") == event_to_edit.get("created_at") and
-                                rule.get("title") == event_to_edit.get("title")):
-                            rule["title"] = title_field.value
-                            rule["category"] = category_dropdown.value
-                            rule["description"] = description_field.value or ""
-                            rule["event_time"] = time_dropdown.value
-                            break
-
-                    save_events()
+                    if event_store.get(item_id) is event_to_edit:
+                        apply_change({"op": "update_rule", "id": item_id, "fields": {
+                            "title": title_field.value,
+                            "category": category_dropdown.value,
+                            "description": description_field.value or "",
+                            "event_time": time_dropdown.value
+                        }})
+
                     update_calendar()
                     update_event_panel()
                     page.pop_dialog()
@@ -2045,15 +2375,15 @@ def main(page: ft.Page) -> None:
             def save_edited_event():
                 """保存编辑后的普通事件"""
                 if title_field.value:
-                    date_key = get_date_key(selected_year, selected_month, selected_day)
-                    if date_key in events_data and event_to_edit in events_data[date_key]:
+                    if event_store.get(item_id) is event_to_edit:
                         # 更新事件数据
-                        event_to_edit["title"] = title_field.value
-                        event_to_edit["category"] = category_dropdown.value
-                        event_to_edit["description"] = description_field.value or ""
-                        event_to_edit["event_time"] = time_dropdown.value
-
-                        save_events()
+                        date_key = event_to_edit.date.isoformat()
+                        apply_change({"op": "update", "date": date_key, "id": item_id, "fields": {
+                            "title": title_field.value,
+                            "category": category_dropdown.value,
+                            "description": description_field.value or "",
+                            "event_time": time_dropdown.value
+                        }})
                         update_calendar()
                         update_event_panel()
                     page.pop_dialog()
@@ -2136,7 +2466,9 @@ def main(page: ft.Page) -> None:
         controls=[
             create_quick_action_button(ft.Icons.TODAY, "今天", lambda _: go_to_today()),
             create_quick_action_button(ft.Icons.CALENDAR_MONTH, "快速跳转", lambda _: jump_to_date()),
-            create_quick_action_button(ft.Icons.ADD, "添加事件", lambda _: show_add_event_dialog())
+            create_quick_action_button(ft.Icons.ADD, "添加事件", lambda _: show_add_event_dialog()),
+            create_quick_action_button(ft.Icons.UPLOAD_FILE, "导入", lambda _: show_import_dialog()),
+            create_quick_action_button(ft.Icons.DOWNLOAD, "导出", lambda _: show_export_dialog())
         ],
         alignment=ft.MainAxisAlignment.CENTER, spacing=15
     )
@@ -2219,6 +2551,7 @@ def main(page: ft.Page) -> None:
 
     page.add(main_content)
     update_event_panel()
+    schedule_prefetch(selected_year, selected_month)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,42 @@
+import threading
+from collections import deque
+from typing import Deque, Dict
+
+
+class LatencyStats:
+    """
+    记录一项操作最近若干次的耗时，统计平均值和分位数，便于观察界面响应是否变慢。
+    另外记录被新请求取代而取消的次数。读写都加锁，可以在后台线程中记录。
+    """
+
+    def __init__(self, window: int = 200):
+        if window <= 0:
+            raise ValueError("统计窗口必须大于 0")
+        self._samples: Deque[float] = deque(maxlen=window)  # 最近的耗时（秒）
+        self._lock = threading.Lock()
+        self.count = 0
+        self.cancelled = 0
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+
+    def record_cancelled(self) -> None:
+        with self._lock:
+            self.cancelled += 1
+
+    def stats(self) -> Dict[str, float]:
+        """返回统计：完成次数、取消次数，以及最近窗口内耗时（毫秒）的最近一次、平均、p50、p95、最大值"""
+        with self._lock:
+            samples = sorted(self._samples)
+            result: Dict[str, float] = {"count": self.count, "cancelled": self.cancelled}
+            if samples:
+                result.update({
+                    "last_ms": self._samples[-1] * 1000,
+                    "mean_ms": sum(samples) / len(samples) * 1000,
+                    "p50_ms": samples[len(samples) // 2] * 1000,
+                    "p95_ms": samples[min(len(samples) - 1, len(samples) * 95 // 100)] * 1000,
+                    "max_ms": samples[-1] * 1000,
+                })
+            return result
@@ -0,0 +1,348 @@
+import calendar
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import date
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+from data import RecurrenceRule
+
+# 按天步进的周期类型：周期步长（天）
+DAY_STEP_PERIODS: Dict[str, int] = {
+    "每天": 1,
+    "每周": 7,
+}
+
+# 按月步进的周期类型：周期步长（月），目标月份没有对应日期时取该月最后一天
+MONTH_STEP_PERIODS: Dict[str, int] = {
+    "每月": 1,
+    "每季": 3,
+    "每年": 12,
+}
+
+# 自定义周期的时间单位：(步进方式, 每个单位对应的步长)
+CUSTOM_PERIOD_UNITS: Dict[str, Tuple[str, int]] = {
+    "天": ("days", 1),
+    "周": ("days", 7),
+    "月": ("months", 1),
+    "年": ("months", 12),
+}
+
+
+class CompiledRule:
+    """
+    编译后的周期性规则：排除日期转为序数集合，周期换算成步长。
+    kind 取值：
+      "days"   —— 每 step 天命中一次
+      "months" —— 每 step 个月命中一次，日期按月末截断
+      "dates"  —— 命中 custom_ords 中的日期
+      None     —— 无法识别的规则，永不命中
+    """
+    __slots__ = ("rule", "kind", "start", "start_ord", "end_ord", "step",
+                 "start_month_index", "excluded", "custom_ords")
+
+    def __init__(self, rule: RecurrenceRule):
+        self.rule = rule
+        self.kind: Optional[str] = None
+        self.step = 0
+        self.start = rule.start_date
+        self.start_ord = rule.start_ord if self.start else 0
+        self.start_month_index = self.start.year * 12 + self.start.month - 1 if self.start else 0
+        self.end_ord = rule.end_ord if rule.end_ord is not None else date.max.toordinal()
+        self.excluded = frozenset(rule.excluded_dates)
+        self.custom_ords: List[int] = []
+        if not self.start:
+            return
+
+        period_type = rule.period_type
+        if period_type in DAY_STEP_PERIODS:
+            self.kind, self.step = "days", DAY_STEP_PERIODS[period_type]
+        elif period_type in MONTH_STEP_PERIODS:
+            self.kind, self.step = "months", MONTH_STEP_PERIODS[period_type]
+        elif period_type == "自定义周期":
+            unit = rule.unit or "天"
+            if rule.interval > 0 and unit in CUSTOM_PERIOD_UNITS:
+                kind, unit_step = CUSTOM_PERIOD_UNITS[unit]
+                self.kind, self.step = kind, rule.interval * unit_step
+        elif period_type == "自定义日期":
+            self.kind = "dates"
+            self.custom_ords = rule.custom_dates  # 规则中已是去重后的升序列表
+
+    def _month_hit(self, month_index: int) -> int:
+        """返回第 month_index 个月中的命中日期序数（按月末截断）"""
+        year, month = divmod(month_index, 12)
+        last_day = calendar.monthrange(year, month + 1)[1]
+        return date(year, month + 1, min(self.start.day, last_day)).toordinal()
+
+    def matches(self, target_date: date) -> bool:
+        """检查给定日期是否命中该规则"""
+        if self.kind is None:
+            return False
+        target_ord = target_date.toordinal()
+        if target_ord < self.start_ord or target_ord > self.end_ord or target_ord in self.excluded:
+            return False
+        if self.kind == "days":
+            return (target_ord - self.start_ord) % self.step == 0
+        if self.kind == "months":
+            month_index = target_date.year * 12 + target_date.month - 1
+            return (month_index - self.start_month_index) % self.step == 0 and \
+                self._month_hit(month_index) == target_ord
+        index = bisect_left(self.custom_ords, target_ord)
+        return index < len(self.custom_ords) and self.custom_ords[index] == target_ord
+
+    def _iter_hits(self, low: int) -> Iterator[int]:
+        """从序数 low 起按升序生成命中日期的序数，跳过排除日期，截止于结束日期"""
+        if self.kind is None:
+            return
+        low = max(low, self.start_ord)
+        if low > self.end_ord:
+            return
+
+        if self.kind == "days":
+            first = self.start_ord + -(-(low - self.start_ord) // self.step) * self.step
+            for hit_ord in range(first, self.end_ord + 1, self.step):
+                if hit_ord not in self.excluded:
+                    yield hit_ord
+        elif self.kind == "months":
+            low_date = date.fromordinal(low)
+            months_ahead = low_date.year * 12 + low_date.month - 1 - self.start_month_index
+            month_index = self.start_month_index + -(-months_ahead // self.step) * self.step
+            while month_index // 12 <= date.max.year:
+                hit_ord = self._month_hit(month_index)
+                if hit_ord > self.end_ord:
+                    break
+                if hit_ord >= low and hit_ord not in self.excluded:
+                    yield hit_ord
+                month_index += self.step
+        else:
+            for hit_ord in self.custom_ords[bisect_left(self.custom_ords, low):]:
+                if hit_ord > self.end_ord:
+                    break
+                if hit_ord not in self.excluded:
+                    yield hit_ord
+
+    def _last_hit(self, high: int, low: int) -> Optional[int]:
+        """[low, high] 区间内最后一个命中日期的序数，跳过排除日期；直接按周期向前跳转，不逐日检查"""
+        low = max(low, self.start_ord)
+        high = min(high, self.end_ord)
+        if self.kind is None or high < low:
+            return None
+
+        if self.kind == "days":
+            hit_ord = self.start_ord + (high - self.start_ord) // self.step * self.step
+            while hit_ord >= low:
+                if hit_ord not in self.excluded:
+                    return hit_ord
+                hit_ord -= self.step
+        elif self.kind == "months":
+            high_date = date.fromordinal(high)
+            months_ahead = high_date.year * 12 + high_date.month - 1 - self.start_month_index
+            month_index = self.start_month_index + months_ahead // self.step * self.step
+            while month_index >= self.start_month_index:
+                hit_ord = self._month_hit(month_index)
+                if hit_ord < low:
+                    break
+                if hit_ord <= high and hit_ord not in self.excluded:
+                    return hit_ord
+                month_index -= self.step
+        else:
+            index = bisect_right(self.custom_ords, high) - 1
+            while index >= 0 and self.custom_ords[index] >= low:
+                if self.custom_ords[index] not in self.excluded:
+                    return self.custom_ords[index]
+                index -= 1
+        return None
+
+    @staticmethod
+    def _closer(reference_ord: int, before: Optional[int], after: Optional[int]) -> Optional[int]:
+        """before、after 中离 reference_ord 较近的一个（距离相同时取 after），都为 None 时返回 None"""
+        if before is None or (after is not None and after - reference_ord <= reference_ord - before):
+            return after
+        return before
+
+    def nearest_occurrence(self, reference_ord: int, low: int, high: int) -> Optional[int]:
+        """
+        [low, high] 区间内离 reference_ord 最近的命中日期序数（距离相同时取之后的一次）；
+        区间内没有命中时，取区间之前最后一次和之后第一次命中中离 reference_ord 较近的一个（例如已结束的规则
+        取最后一次），从不命中时返回 None。每侧只按周期跳转一次，不展开区间内的每一天。
+        """
+        after = next(self._iter_hits(max(reference_ord + 1, low)), None)
+        nearest = self._closer(reference_ord, self._last_hit(min(reference_ord, high), low),
+                               after if after is not None and after <= high else None)
+        if nearest is None:
+            nearest = self._closer(reference_ord, self._last_hit(low - 1, self.start_ord),
+                                   next(self._iter_hits(high + 1), None))
+        return nearest
+
+    def occurrences(self, start: date, end: date) -> Iterator[date]:
+        """一次性生成 [start, end] 区间内的所有命中日期（升序）"""
+        high = end.toordinal()
+        for hit_ord in self._iter_hits(start.toordinal()):
+            if hit_ord > high:
+                break
+            yield date.fromordinal(hit_ord)
+
+    def next_occurrences(self, after: date, n: int) -> List[date]:
+        """返回 after 之后（不含 after）的最多 n 个命中日期，直接按周期跳转而不逐日检查"""
+        return [date.fromordinal(hit_ord) for hit_ord in islice(self._iter_hits(after.toordinal() + 1), max(n, 0))]
+
+
+def compile_rule(rule: RecurrenceRule) -> CompiledRule:
+    """编译单条周期性规则"""
+    return CompiledRule(rule)
+
+
+def next_occurrences(rule: Union[RecurrenceRule, CompiledRule], after: date, n: int) -> List[date]:
+    """返回规则在 after 之后的最多 n 个命中日期，供日程列表和提醒使用"""
+    compiled = rule if isinstance(rule, CompiledRule) else CompiledRule(rule)
+    return compiled.next_occurrences(after, n)
+
+
+class RecurrenceEngine:
+    """
+    周期性规则引擎：持有全部已编译规则，规则增删改时增量维护。
+    规则按加入顺序保存，与 periodic_events_rules 列表顺序一致。
+
+    按日期查询时只检查可能命中的规则，规则按周期类型和余数分桶：
+      按天步进（每天/每周/自定义天、周）—— (步长, 起始序数 % 步长)，每周规则即按星期几分桶
+      按月步进（每月/每季/每年/自定义月、年）—— (步长, 起始月序号 % 步长, 起始日)，每月规则按几号、
+                                      每季按月份模 3、每年按 (月, 日) 分桶
+      自定义日期                    —— 每个日期一个桶
+
+    修改和查询都持有同一把锁，界面线程修改规则时后台预取线程也可以安全查询；
+    按区间生成命中时先在锁内取得已编译规则的快照（已编译规则不会被修改，刷新时整体替换）。
+    """
+
+    def __init__(self, rules: Optional[List[RecurrenceRule]] = None):
+        self._lock = threading.RLock()
+        self._compiled: Dict[int, CompiledRule] = {}
+        self._sequence: Dict[int, int] = {}
+        self._next_sequence = 0
+        self._buckets: Dict[tuple, Dict[int, CompiledRule]] = {}
+        self._day_steps: Dict[int, int] = {}  # 步长 -> 使用该步长的规则数
+        self._month_steps: Dict[int, int] = {}
+        self.rebuild(rules or [])
+
+    @staticmethod
+    def _bucket_keys(compiled: CompiledRule) -> List[tuple]:
+        """计算规则所属的索引桶"""
+        if compiled.kind == "days":
+            return [("days", compiled.step, compiled.start_ord % compiled.step)]
+        if compiled.kind == "months":
+            return [("months", compiled.step, compiled.start_month_index % compiled.step, compiled.start.day)]
+        if compiled.kind == "dates":
+            return [("dates", hit_ord) for hit_ord in compiled.custom_ords]
+        return []
+
+    def _index(self, compiled: CompiledRule) -> None:
+        rule_id = id(compiled.rule)
+        for key in self._bucket_keys(compiled):
+            self._buckets.setdefault(key, {})[rule_id] = compiled
+        steps = {"days": self._day_steps, "months": self._month_steps}.get(compiled.kind)
+        if steps is not None:
+            steps[compiled.step] = steps.get(compiled.step, 0) + 1
+
+    def _unindex(self, compiled: CompiledRule) -> None:
+        rule_id = id(compiled.rule)
+        for key in self._bucket_keys(compiled):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.pop(rule_id, None)
+                if not bucket:
+                    del self._buckets[key]
+        steps = {"days": self._day_steps, "months": self._month_steps}.get(compiled.kind)
+        if steps is not None:
+            steps[compiled.step] -= 1
+            if not steps[compiled.step]:
+                del steps[compiled.step]
+
+    def rebuild(self, rules: List[RecurrenceRule]) -> None:
+        """根据规则列表重新编译全部规则并重建索引"""
+        with self._lock:
+            self._compiled.clear()
+            self._sequence.clear()
+            self._buckets.clear()
+            self._day_steps.clear()
+            self._month_steps.clear()
+            self._next_sequence = 0
+            for rule in rules:
+                self.add(rule)
+
+    def add(self, rule: RecurrenceRule) -> None:
+        """加入一条新规则"""
+        with self._lock:
+            if id(rule) in self._compiled:
+                self.refresh(rule)
+                return
+            compiled = CompiledRule(rule)
+            self._compiled[id(rule)] = compiled
+            self._sequence[id(rule)] = self._next_sequence
+            self._next_sequence += 1
+            self._index(compiled)
+
+    def remove(self, rule: RecurrenceRule) -> None:
+        """移除一条规则"""
+        with self._lock:
+            compiled = self._compiled.pop(id(rule), None)
+            if compiled is not None:
+                self._unindex(compiled)
+                del self._sequence[id(rule)]
+
+    def refresh(self, rule: RecurrenceRule) -> None:
+        """规则的日期、排除列表或周期被修改后重新编译，保持原有顺序"""
+        with self._lock:
+            old = self._compiled.get(id(rule))
+            if old is None:
+                self.add(rule)
+                return
+            self._unindex(old)
+            compiled = CompiledRule(rule)
+            self._compiled[id(rule)] = compiled
+            self._index(compiled)
+
+    def _candidates(self, target_date: date) -> Dict[int, CompiledRule]:
+        """收集可能在指定日期命中的规则，开销只与相关桶的大小有关"""
+        target_ord = target_date.toordinal()
+        candidates: Dict[int, CompiledRule] = {}
+        for step in self._day_steps:
+            candidates.update(self._buckets.get(("days", step, target_ord % step), {}))
+
+        if self._month_steps:
+            month_index = target_date.year * 12 + target_date.month - 1
+            last_day = calendar.monthrange(target_date.year, target_date.month)[1]
+            # 月末需要同时检查起始日大于当月天数、被截断到月末的规则
+            days = range(target_date.day, 32) if target_date.day == last_day else (target_date.day,)
+            for step in self._month_steps:
+                residue = month_index % step
+                for day in days:
+                    candidates.update(self._buckets.get(("months", step, residue, day), {}))
+
+        candidates.update(self._buckets.get(("dates", target_ord), {}))
+        return candidates
+
+    def rules_on(self, target_date: date) -> List[RecurrenceRule]:
+        """返回在指定日期命中的全部规则（按规则加入顺序）"""
+        with self._lock:
+            candidates = self._candidates(target_date)
+            matched = [rule_id for rule_id, compiled in candidates.items() if compiled.matches(target_date)]
+            matched.sort(key=self._sequence.__getitem__)
+            return [candidates[rule_id].rule for rule_id in matched]
+
+    def next_occurrences(self, rule: RecurrenceRule, after: date, n: int) -> List[date]:
+        """使用已编译的规则计算 after 之后的最多 n 个命中日期"""
+        with self._lock:
+            compiled = self._compiled.get(id(rule))
+        return next_occurrences(compiled or rule, after, n)
+
+    def nearest_occurrence(self, rule: RecurrenceRule, reference_ord: int, low: int, high: int) -> Optional[int]:
+        """使用已编译的规则计算 [low, high] 内离 reference_ord 最近的命中日期序数，供搜索结果跳转"""
+        with self._lock:
+            compiled = self._compiled.get(id(rule)) or CompiledRule(rule)
+        return compiled.nearest_occurrence(reference_ord, low, high)
+
+    def occurrences(self, start: date, end: date) -> Iterator[Tuple[date, RecurrenceRule]]:
+        """按规则顺序生成 [start, end] 区间内的全部 (日期, 规则) 命中"""
+        with self._lock:
+            snapshot = list(self._compiled.values())
+        for compiled in snapshot:
+            for hit_date in compiled.occurrences(start, end):
+                yield hit_date, compiled.rule
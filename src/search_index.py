@@ -0,0 +1,269 @@
+import heapq
+from array import array
+from collections import OrderedDict
+from bisect import bisect_left
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+# 各字段之间的分隔符，不会出现在事件文本中，关键词也就不会跨字段匹配
+FIELD_SEPARATOR = "\0"
+
+# 关键词所在的字段（数值越小越相关）：标题、描述、分类
+FIELD_TITLE, FIELD_DESCRIPTION, FIELD_CATEGORY = 0, 1, 2
+
+# 一条搜索命中：(关键词最先出现的字段, 日期序数, 键)，排序时不需要取出事件本身。
+# 日期随查询变化的文档（周期性规则的发生日期取决于参考日期）加入时不带日期，命中的日期序数为 0，由调用方计算
+SearchHit = Tuple[int, int, Hashable]
+
+
+def search_text(title: str, description: str, category: str) -> str:
+    """事件或规则参与搜索的文本：标题、描述、分类转为小写后拼接"""
+    return FIELD_SEPARATOR.join((title, description, category)).lower()
+
+
+def item_search_text(item) -> str:
+    return search_text(item.title, item.description, item.category)
+
+
+def _grams(text: str) -> Set[str]:
+    """文本中的单字和相邻两字（不跨字段）"""
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return {gram for gram in grams if FIELD_SEPARATOR not in gram}
+
+
+def rank_key(hit: SearchHit, reference_ord: int) -> Tuple[int, int, int]:
+    """搜索结果的排序：标题命中优先于描述、分类命中，相关度相同时离参考日期越近越靠前，距离相同时较早的在前"""
+    return hit[0], abs(hit[1] - reference_ord), hit[1]
+
+
+class SearchIndex:
+    """
+    字符二元组倒排索引，适合不分词的中文文本：每个单字和相邻两字对应一个倒排表，记录包含它的文档。
+    搜索时取关键词各个二元组（单字关键词取该字）的倒排表，从短到长求交集得到候选，
+    再用子串比较确认，结果与逐个检查标题、描述、分类是否包含关键词完全一致。
+    键可以是任意可哈希的值（事件对象、数据库行号等），由调用方在增删改时同步维护。
+    倒排表存放递增的内部文档号（array，每项 4 字节）；删除只清空文档。
+    文档号按日期顺序分配：前 _sorted_count 个文档的日期不减，之后新加入的文档日期可能乱序；
+    已删除的文档或乱序的文档过多时按日期整体重建。不带日期的文档按日期 0 排在最前。
+    逐字输入时新关键词通常包含上一个关键词，命中也就是上一次命中的子集：最近几次搜索的命中文档号
+    缓存起来，新关键词包含某个缓存的关键词且缓存的命中比倒排表少时，只在缓存的命中中筛选。
+    每次增删改都使版本号加一，版本号变化后缓存失效。
+    """
+
+    # 交集时，下一个倒排表比当前候选多这么多倍就不再求交，直接逐个确认候选更快
+    INTERSECT_RATIO = 8
+    # 已删除的文档超过这个数量且超过一半时重建
+    COMPACT_MIN = 1000
+    # 乱序的文档超过这个数量且超过十分之一时重建
+    UNSORTED_MIN = 1000
+    # 缓存最近多少个关键词的命中
+    CACHE_SIZE = 8
+
+    def __init__(self):
+        self._postings: Dict[str, array] = {}
+        self._texts: List[Optional[str]] = []  # 文档号 -> 小写文本，已删除为 None
+        self._keys: List[Optional[Hashable]] = []  # 文档号 -> 键
+        self._dates = array("i")  # 文档号 -> 日期序数
+        self._docs: Dict[Hashable, int] = {}  # 键 -> 文档号
+        self._sorted_count = 0
+        self._removed = 0
+        self.version = 0
+        self._cache: "OrderedDict[str, array]" = OrderedDict()  # 关键词 -> 命中的文档号（升序）
+        self._cache_version = 0
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._docs
+
+    def add(self, key: Hashable, text: str, date_ord: Optional[int]) -> None:
+        """加入或更新一个文档（text 需已由 search_text 转为小写，date_ord 为 None 表示不带日期）"""
+        date_ord = date_ord or 0
+        old_doc = self._docs.get(key)
+        if old_doc is not None:
+            if self._texts[old_doc] == text and self._dates[old_doc] == date_ord:
+                return
+            self._drop(old_doc)
+        doc = len(self._texts)
+        self._texts.append(text)
+        self._keys.append(key)
+        self._dates.append(date_ord)
+        self._docs[key] = doc
+        self.version += 1
+        if doc == self._sorted_count and (doc == 0 or date_ord >= self._dates[doc - 1]):
+            self._sorted_count += 1
+        postings = self._postings
+        for gram in _grams(text):
+            posting = postings.get(gram)
+            if posting is None:
+                posting = postings[gram] = array("I")
+            posting.append(doc)
+        self._maybe_compact()
+
+    def add_all(self, entries: Iterable[Tuple[Hashable, str, Optional[int]]]) -> None:
+        """按日期顺序加入一批 (键, 文本, 日期序数)，建立索引时使用"""
+        for key, text, date_ord in sorted(entries, key=lambda entry: entry[2] or 0):
+            self.add(key, text, date_ord)
+
+    def remove(self, key: Hashable) -> None:
+        doc = self._docs.get(key)
+        if doc is not None:
+            self._drop(doc)
+            self._maybe_compact()
+
+    def _drop(self, doc: int) -> None:
+        del self._docs[self._keys[doc]]
+        self._texts[doc] = None
+        self._keys[doc] = None
+        self._removed += 1
+        self.version += 1
+
+    def _maybe_compact(self) -> None:
+        total = len(self._texts)
+        unsorted = total - self._sorted_count
+        if ((self._removed >= self.COMPACT_MIN and self._removed * 2 >= total) or
+                (unsorted >= self.UNSORTED_MIN and unsorted * 10 >= total)):
+            self._rebuild()
+
+    def _rebuild(self) -> None:
+        """丢弃已删除的文档，按日期重新编号并重建倒排表"""
+        live = [(key, text, date_ord) for key, text, date_ord in zip(self._keys, self._texts, self._dates)
+                if text is not None]
+        version = self.version
+        self.__init__()
+        self.add_all(live)
+        self.version = version + 1
+
+    def _postings_for(self, keyword: str) -> List[array]:
+        """关键词各个二元组（单字关键词取该字）的倒排表，从短到长排列；有二元组没有出现过时返回空列表"""
+        grams = {keyword} if len(keyword) == 1 else {keyword[i:i + 2] for i in range(len(keyword) - 1)}
+        postings = []
+        for gram in grams:
+            posting = self._postings.get(gram)
+            if posting is None:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+        return postings
+
+    def _candidates(self, postings: List[array]) -> Iterable[int]:
+        """倒排表求交得到的候选文档号（升序，可能包含已删除或不含关键词的文档）"""
+        candidates = postings[0]
+        if len(postings) > 1:
+            candidates = set(candidates)
+            for posting in postings[1:]:
+                if len(posting) > len(candidates) * self.INTERSECT_RATIO:
+                    break
+                candidates.intersection_update(posting)
+                if not candidates:
+                    return []
+            candidates = sorted(candidates)
+        return candidates
+
+    def _matches(self, keyword: str) -> array:
+        """文本包含 keyword 的文档号（升序，调用方不能修改），优先从缓存的命中中筛选"""
+        cache = self._cache
+        if self._cache_version != self.version:
+            cache.clear()
+            self._cache_version = self.version
+        matches = cache.get(keyword)
+        if matches is not None:
+            cache.move_to_end(keyword)
+            return matches
+        if not keyword:
+            return array("I")
+        postings = self._postings_for(keyword)
+        texts = self._texts
+        if not postings:
+            matches = array("I")
+        elif len(keyword) <= 2:
+            # 一两个字的关键词只有一个倒排表，其中未删除的文档都包含关键词
+            matches = postings[0] if not self._removed else array(
+                "I", [doc for doc in postings[0] if texts[doc] is not None])
+        else:
+            source = min((cached for previous, cached in cache.items() if previous in keyword),
+                         key=len, default=None)
+            if source is None or len(source) > len(postings[0]):
+                source = self._candidates(postings)
+            matches = array("I", [doc for doc in source if texts[doc] is not None and keyword in texts[doc]])
+        cache[keyword] = matches
+        if len(cache) > self.CACHE_SIZE:
+            cache.popitem(last=False)
+        return matches
+
+    def _field(self, doc: int, keyword: str) -> int:
+        """关键词最先出现的字段（文档需包含关键词）"""
+        text = self._texts[doc]
+        return text.count(FIELD_SEPARATOR, 0, text.find(keyword))
+
+    def search(self, keyword: str) -> List[SearchHit]:
+        """返回文本包含 keyword（需已转为小写）的全部文档，按文档号排列，不排序"""
+        keys, dates = self._keys, self._dates
+        return [(self._field(doc, keyword), dates[doc], keys[doc]) for doc in self._matches(keyword)]
+
+    def top(self, keyword: str, reference_ord: int, k: int) -> List[SearchHit]:
+        """
+        按 rank_key 的顺序返回排在最前的 k 个带日期的命中，之后是全部不带日期的命中（由调用方计算日期后再排序）。
+        日期有序的命中从参考日期向两侧由近到远检查字段，已找到 k 个标题命中后，
+        更远的命中不可能排进前 k 个，立即停止；乱序的命中逐个检查。
+        """
+        if k <= 0:
+            return []
+        matches = self._matches(keyword)
+        dates = self._dates
+        split = bisect_left(matches, self._sorted_count)
+        ordered = matches[:split]
+        undated = list(ordered[:bisect_left(ordered, 1, key=dates.__getitem__)])
+        ranked: List[Tuple[int, int, int, int]] = []  # (字段, 距离, 日期序数, 文档号)
+        titles = 0
+        title_distance = 0  # 第 k 个标题命中的距离
+        left = bisect_left(ordered, reference_ord, key=dates.__getitem__) - 1
+        right = left + 1
+        while left >= len(undated) or right < len(ordered):
+            if right >= len(ordered) or (left >= len(undated) and
+                                         reference_ord - dates[ordered[left]] <= dates[ordered[right]] - reference_ord):
+                doc = ordered[left]
+                left -= 1
+            else:
+                doc = ordered[right]
+                right += 1
+            distance = abs(dates[doc] - reference_ord)
+            if titles >= k and distance > title_distance:
+                break
+            field = self._field(doc, keyword)
+            ranked.append((field, distance, dates[doc], doc))
+            if field == FIELD_TITLE:
+                titles += 1
+                if titles == k:
+                    title_distance = distance
+        for doc in matches[split:]:
+            if dates[doc]:
+                ranked.append((self._field(doc, keyword), abs(dates[doc] - reference_ord), dates[doc], doc))
+            else:
+                undated.append(doc)
+        keys = self._keys
+        hits = [(field, date_ord, keys[doc]) for field, _, date_ord, doc in heapq.nsmallest(k, ranked)]
+        hits.extend((self._field(doc, keyword), 0, keys[doc]) for doc in undated)
+        return hits
+
+
+class RankedHits:
+    """
+    按 rank_key 的顺序逐页取出全部命中：建堆 O(n)，每取一页 O(页大小 × log n)，
+    只翻看前几页时不必对全部命中排序，也只有取出的命中才需要转换为事件。
+    """
+
+    def __init__(self, hits: Iterable[SearchHit], reference_ord: int):
+        # 序号保证排序时不会比较到键
+        self._heap = [rank_key(hit, reference_ord) + (number, hit) for number, hit in enumerate(hits)]
+        heapq.heapify(self._heap)
+        self.total = len(self._heap)
+
+    @property
+    def remaining(self) -> int:
+        return len(self._heap)
+
+    def next_page(self, size: int) -> List[SearchHit]:
+        heap = self._heap
+        return [heapq.heappop(heap)[-1] for _ in range(min(size, len(heap)))]
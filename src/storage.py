@@ -0,0 +1,1364 @@
+import itertools
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import date
+from typing import Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Set, Tuple
+from data import (CalendarItem, Event, RecurrenceRule, compact_ordinals, events_from_json, events_to_json, parse_date,
+                  rules_from_json, rules_to_json)
+from event_codec import decode_events, encode_events
+from search_index import SearchHit, SearchIndex, item_search_text, search_text
+
+# 事件修改操作（日志中的一行）：
+#   {"op": "add", "date": 日期键, "event": 事件}                    添加普通事件
+#   {"op": "update", "date": 日期键, "id": 编号, "fields": {...}}   修改普通事件
+#   {"op": "delete", "date": 日期键, "id": 编号}                    删除普通事件
+#   {"op": "add_rule", "rule": 规则}                                添加周期性规则
+#   {"op": "update_rule", "id": 编号, "fields": {...}}              修改周期性规则
+#   {"op": "exclude_date", "id": 编号, "date": 日期键}              周期性规则排除某天
+#   {"op": "set_end_date", "id": 编号, "end_date": 日期键}          设置周期性规则结束日期
+#   {"op": "delete_series", "id": 编号}                             删除整个周期性规则
+# 内存中的 event/rule 为 Event/RecurrenceRule 对象，写入日志时才转换为 JSON 字典。
+# 旧版日志用 "index"（当天列表中的序号）或 "rule_index"（规则列表中的序号）代替 "id"，回放时仍然支持。
+
+
+class CoalescingWriter:
+    """
+    后台合并写入：修改时只标记为"脏"，在 delay 秒的时间窗口结束后由后台线程统一写一次，
+    连续多次修改合并为一次磁盘写入，界面操作不再等待磁盘 I/O。
+    """
+
+    def __init__(self, write: Callable[[], None], delay: float):
+        self._write = write
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._timer: Optional[threading.Timer] = None
+
+    def mark_dirty(self) -> None:
+        """标记有待写入的修改，时间窗口内尚未安排写入时安排一次"""
+        with self._lock:
+            self._dirty = True
+            if self._timer is None:
+                self._timer = threading.Timer(self.delay, self._run)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _run(self) -> None:
+        with self._lock:
+            self._timer = None
+            dirty, self._dirty = self._dirty, False
+        # 写入在锁外进行，避免与存储自身的锁形成相反的加锁顺序
+        if dirty:
+            self._write()
+
+    def flush(self) -> None:
+        """取消等待中的定时写入并立即写入（页面关闭、程序退出时调用）"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+        self._run()
+
+
+def index_of(items: List, target) -> int:
+    """按对象身份查找下标（不用 == 比较，避免内容相同的两个事件被混淆），找不到返回 -1"""
+    for index, item in enumerate(items):
+        if item is target:
+            return index
+    return -1
+
+
+def encode_operation(op: Dict) -> Dict:
+    """把修改操作转换为可写入日志的 JSON 格式"""
+    if "event" in op:
+        return dict(op, event=op["event"].to_dict())
+    if "rule" in op:
+        return dict(op, rule=op["rule"].to_dict())
+    return op
+
+
+def decode_operation(data: Dict) -> Dict:
+    """把日志中的 JSON 格式操作还原为使用事件对象的操作"""
+    if "event" in data:
+        return dict(data, event=Event.from_dict(data["date"], data["event"]))
+    if "rule" in data:
+        return dict(data, rule=RecurrenceRule.from_dict(data["rule"]))
+    return data
+
+
+def read_journal(journal_file: str) -> Tuple[List[Dict], bool]:
+    """读取修改日志，返回 (操作列表, 是否有损坏的行)"""
+    if not os.path.exists(journal_file):
+        return [], False
+    ops = []
+    damaged = False
+    with open(journal_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                ops.append(json.loads(line))
+            except json.JSONDecodeError:
+                # 最后一行可能因异常退出只写了一半，忽略即可
+                print(f"忽略损坏的事件日志行: {line[:80]}")
+                damaged = True
+    return ops, damaged
+
+
+def index_items(events_data: Dict[str, List[Event]], rules: List[RecurrenceRule]) -> Dict[str, CalendarItem]:
+    """建立 {编号: 事件或规则} 索引"""
+    items: Dict[str, CalendarItem] = {rule.id: rule for rule in rules}
+    for events_list in events_data.values():
+        for event in events_list:
+            items[event.id] = event
+    return items
+
+
+def missing_ids(single_events: Dict[str, List[Dict]], periodic_rules: List[Dict]) -> bool:
+    """JSON 格式的数据中是否有没有编号的事件或规则（旧版本保存的数据），需要重新保存以固定编号"""
+    return (any("id" not in event for events_list in single_events.values() for event in events_list) or
+            any("id" not in rule for rule in periodic_rules))
+
+
+def find_target(events_data: Dict[str, List[Event]], rules: List[RecurrenceRule],
+                items: Dict[str, CalendarItem], op: Dict) -> CalendarItem:
+    """找出修改、删除操作针对的事件或规则：按编号直接查索引，旧版日志按序号查找"""
+    if "id" in op:
+        item = items.get(op["id"])
+        if item is None:
+            raise KeyError(f"找不到编号为 {op['id']} 的事件")
+        return item
+    if op["op"] in ("update", "delete"):
+        index, candidates = op["index"], events_data[op["date"]]
+    else:
+        index, candidates = op["rule_index"], rules
+    # 序号为 -1 表示调用方没找到目标，不能让它按 Python 负下标误删最后一项
+    if index < 0:
+        raise IndexError(f"事件操作 {op['op']} 的序号无效")
+    return candidates[index]
+
+
+def apply_operation(events_data: Dict[str, List[Event]], rules: List[RecurrenceRule],
+                    items: Dict[str, CalendarItem], op: Dict) -> None:
+    """把一次修改操作应用到内存中的事件数据和编号索引上；加载时回放日志也使用同一个函数"""
+    kind = op["op"]
+    if kind == "add":
+        event = op["event"]
+        events_data.setdefault(op["date"], []).append(event)
+        items[event.id] = event
+    elif kind == "update":
+        find_target(events_data, rules, items, op).update_fields(op["fields"])
+    elif kind == "delete":
+        event = find_target(events_data, rules, items, op)
+        day_events = events_data.get(op["date"], [])
+        index = index_of(day_events, event)
+        if index < 0:
+            raise KeyError(f"{op['date']} 没有编号为 {event.id} 的事件")
+        del day_events[index]
+        if not day_events:
+            del events_data[op["date"]]
+        items.pop(event.id, None)
+    elif kind == "add_rule":
+        rule = op["rule"]
+        rules.append(rule)
+        items[rule.id] = rule
+    elif kind == "update_rule":
+        find_target(events_data, rules, items, op).update_fields(op["fields"])
+    elif kind == "exclude_date":
+        find_target(events_data, rules, items, op).exclude(_date_ordinal(op["date"]))
+    elif kind == "set_end_date":
+        find_target(events_data, rules, items, op).set_end(_date_ordinal(op["end_date"]))
+    elif kind == "delete_series":
+        rule = find_target(events_data, rules, items, op)
+        del rules[index_of(rules, rule)]
+        items.pop(rule.id, None)
+    else:
+        raise ValueError(f"未知的事件操作: {kind}")
+
+
+def object_key(item: CalendarItem) -> Hashable:
+    """搜索索引的键为事件或规则对象本身（按对象比较），适用于全部事件常驻内存的存储"""
+    return item
+
+
+def dated_key(item: CalendarItem) -> Hashable:
+    """不依赖事件是否在内存中的键：普通事件为 (日期序数, 编号)，周期性规则始终在内存中，仍为对象本身"""
+    return item if item.is_periodic else (item.date_ord, item.id)
+
+
+def apply_indexed(search_index: Optional[SearchIndex], events_data: Dict[str, List[Event]],
+                  rules: List[RecurrenceRule], items: Dict[str, CalendarItem], op: Dict,
+                  item_key: Callable[[CalendarItem], Hashable] = object_key) -> None:
+    """应用一次修改，并增量更新以 item_key 为键的搜索索引（尚未建立索引时只应用修改）"""
+    if search_index is None:
+        apply_operation(events_data, rules, items, op)
+        return
+    kind = op["op"]
+    target = None
+    if kind in ("update", "delete", "update_rule", "delete_series"):
+        target = find_target(events_data, rules, items, op)
+    apply_operation(events_data, rules, items, op)
+    if kind in ("add", "add_rule"):
+        item = op["event"] if kind == "add" else op["rule"]
+        index_item(search_index, item, item_key)
+    elif kind in ("update", "update_rule"):
+        index_item(search_index, target, item_key)
+    elif kind in ("delete", "delete_series"):
+        search_index.remove(item_key(target))
+
+
+def item_ordinal(item: CalendarItem) -> Optional[int]:
+    """搜索排序使用的日期：普通事件的日期；周期性规则不带日期，由调用方按参考日期计算发生日期"""
+    return None if item.is_periodic else item.date_ord
+
+
+def index_item(search_index: SearchIndex, item: CalendarItem,
+               item_key: Callable[[CalendarItem], Hashable] = object_key) -> None:
+    search_index.add(item_key(item), item_search_text(item), item_ordinal(item))
+
+
+def build_search_index(items: Iterable[CalendarItem],
+                       item_key: Callable[[CalendarItem], Hashable] = object_key) -> SearchIndex:
+    """为给定的全部事件和规则建立搜索索引，键由 item_key 生成（默认为对象本身）"""
+    search_index = SearchIndex()
+    search_index.add_all((item_key(item), item_search_text(item), item_ordinal(item)) for item in items)
+    return search_index
+
+
+def query_index(search_index: SearchIndex, keyword: str, reference_ord: Optional[int],
+                limit: Optional[int]) -> List[SearchHit]:
+    """
+    不传 limit 时返回全部命中（不排序），否则返回离 reference_ord 最近、最相关的 limit 个带日期的命中（已排序），
+    之后是全部不带日期的命中
+    """
+    keyword = keyword.lower()
+    if limit is None:
+        return search_index.search(keyword)
+    return search_index.top(keyword, reference_ord or 0, limit)
+
+
+def recently_used(last_used: Dict[int, float], min_idle: float) -> Set[int]:
+    """最近 min_idle 秒内访问过的年份，按年份移除内存数据时保留"""
+    now = time.monotonic()
+    return {year for year, used in last_used.items() if now - used < min_idle}
+
+
+def live_items(items: Dict[str, CalendarItem], keys: Iterable[CalendarItem]) -> List[CalendarItem]:
+    """搜索之后可能已被删除的事件和规则不再返回"""
+    return [item for item in keys if items.get(item.id) is item]
+
+
+class JsonEventStore:
+    """
+    JSON 快照 + 追加日志的事件存储。
+    每次修改只向日志文件追加一行 JSON，写入量与修改大小成正比；
+    日志累计到 compact_every 条后压缩：写入新的快照并清空日志。
+    快照记录已包含的最后一条日志序号，压缩中途退出也不会重复回放。
+    items 按编号索引全部事件和规则，修改、删除时直接定位，无需遍历。
+    搜索索引在第一次搜索时建立，之后随每次修改增量更新。
+    write_delay 大于 0 时日志由后台线程在时间窗口结束后批量追加，否则每次修改立即写入。
+    """
+
+    def __init__(self, snapshot_file: str, journal_file: str, compact_every: int = 200,
+                 write_delay: float = 0.0):
+        self.snapshot_file = snapshot_file
+        self.journal_file = journal_file
+        self.compact_every = compact_every
+        self.events_data: Dict[str, List[Event]] = {}
+        self.periodic_rules: List[RecurrenceRule] = []
+        self.items: Dict[str, CalendarItem] = {}
+        self.lock = threading.RLock()
+        self._search_index: Optional[SearchIndex] = None
+        self._journal_seq = 0  # 最后一条日志的序号
+        self._journal_length = 0  # 日志中尚未压缩的条数
+        self._pending_lines: List[str] = []  # 尚未写入日志文件的修改
+        self._snapshot_pending = False  # 批量导入后需要写入完整快照
+        self._writer = CoalescingWriter(self._write_pending, write_delay) if write_delay > 0 else None
+
+    def load(self) -> Tuple[Dict[str, List[Event]], List[RecurrenceRule]]:
+        """加载快照并回放日志，返回 (普通事件字典, 周期性规则列表)"""
+        with self.lock:
+            self.events_data, self.periodic_rules = {}, []
+            self._search_index = None
+            snapshot_seq = 0
+            needs_ids = False
+            if os.path.exists(self.snapshot_file):
+                try:
+                    with open(self.snapshot_file, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                    single_events, periodic_rules = data.get("single_events", {}), data.get("periodic_rules", [])
+                    self.events_data = events_from_json(single_events)
+                    self.periodic_rules = rules_from_json(periodic_rules)
+                    snapshot_seq = data.get("journal_seq", 0)
+                    needs_ids = missing_ids(single_events, periodic_rules)
+                    print(f"Events loaded successfully from {self.snapshot_file}.")
+                except (json.JSONDecodeError, TypeError) as e:
+                    print(f"读取事件文件时出错: {e}. 将使用空数据。")
+                    self.events_data, self.periodic_rules = {}, []
+            else:
+                print(f"未找到事件文件 '{self.snapshot_file}'。将为您创建一个新的。")
+                self.save()
+
+            self.items = index_items(self.events_data, self.periodic_rules)
+            self._journal_seq = snapshot_seq
+            self._journal_length = 0
+            ops, damaged = read_journal(self.journal_file)
+            for op in ops:
+                if op.get("seq", 0) <= snapshot_seq:
+                    continue
+                added = op.get("event") or op.get("rule")
+                if isinstance(added, dict) and "id" not in added:
+                    needs_ids = True
+                try:
+                    apply_operation(self.events_data, self.periodic_rules, self.items, decode_operation(op))
+                except (KeyError, IndexError, ValueError) as e:
+                    print(f"回放事件日志第 {op.get('seq')} 条时出错: {e}")
+                self._journal_seq = op.get("seq", self._journal_seq)
+                self._journal_length += 1
+            # 旧版本的数据没有编号，每次加载都会重新生成；立即压缩为快照，之后的日志才能按编号回放。
+            # 日志末尾有写了一半的行时也立即压缩，否则之后追加的行会接在半行后面一起损坏
+            if self._journal_length >= self.compact_every or needs_ids or damaged:
+                self.save()
+            return self.events_data, self.periodic_rules
+
+    def get(self, item_id: str) -> Optional[CalendarItem]:
+        """按编号查找已加载的事件或规则"""
+        with self.lock:
+            return self.items.get(item_id)
+
+    def apply(self, op: Dict) -> None:
+        """应用一次修改并记入日志，累计到阈值时压缩为快照"""
+        with self.lock:
+            apply_indexed(self._search_index, self.events_data, self.periodic_rules, self.items, op)
+            self._journal_seq += 1
+            self._pending_lines.append(json.dumps(dict(encode_operation(op), seq=self._journal_seq),
+                                                  ensure_ascii=False))
+        if self._writer is not None:
+            self._writer.mark_dirty()
+        else:
+            self._write_pending()
+
+    def _write_pending(self) -> None:
+        """把待写入的修改一次性追加到日志文件；批量导入之后改为写入完整快照"""
+        with self.lock:
+            if self._snapshot_pending:
+                self.save()
+                return
+            if not self._pending_lines:
+                return
+            lines, self._pending_lines = self._pending_lines, []
+            try:
+                with open(self.journal_file, 'a', encoding='utf-8') as f:
+                    f.write("".join(line + "\n" for line in lines))
+                self._journal_length += len(lines)
+            except OSError as e:
+                print(f"写入事件日志时出错: {e}")
+            if self._journal_length >= self.compact_every:
+                self.save()
+
+    def flush(self) -> None:
+        """立即写入所有待写入的修改"""
+        if self._writer is not None:
+            self._writer.flush()
+        else:
+            self._write_pending()
+
+    def save(self) -> None:
+        """写入完整快照（先写临时文件再替换），然后清空日志"""
+        with self.lock:
+            # 快照包含内存中的全部修改，待写入的日志行不再需要
+            self._pending_lines = []
+            self._snapshot_pending = False
+            try:
+                data_to_save = {
+                    "single_events": events_to_json(self.events_data),
+                    "periodic_rules": rules_to_json(self.periodic_rules),
+                    "journal_seq": self._journal_seq
+                }
+                temp_file = self.snapshot_file + ".tmp"
+                with open(temp_file, 'w', encoding='utf-8') as f:
+                    json.dump(data_to_save, f, ensure_ascii=False, indent=4)
+                os.replace(temp_file, self.snapshot_file)
+                # 快照已包含全部日志，清空日志文件
+                open(self.journal_file, 'w', encoding='utf-8').close()
+                self._journal_length = 0
+                print(f"Events saved successfully to {self.snapshot_file}.")
+            except Exception as e:
+                print(f"保存事件到文件时出错: {e}")
+
+    def bulk_add(self, batches: Iterable[List[CalendarItem]]) -> Tuple[int, int]:
+        """
+        批量导入：读完全部批次后一次加入内存数据和编号索引，只写一次快照（不逐条记日志）；
+        读取批次时出错不会留下导入了一半的数据。快照与其他修改一样交给写入线程，持有锁的时间只用于更新内存。
+        返回 (导入的普通事件数, 导入的周期性规则数)
+        """
+        event_count = rule_count = 0
+        imported = [item for batch in batches for item in batch]
+        with self.lock:
+            for item in imported:
+                if item.is_periodic:
+                    self.periodic_rules.append(item)
+                    rule_count += 1
+                else:
+                    self.events_data.setdefault(item.date.isoformat(), []).append(item)
+                    event_count += 1
+                self.items[item.id] = item
+                if self._search_index is not None:
+                    index_item(self._search_index, item)
+            if not imported:
+                return 0, 0
+            self._snapshot_pending = True
+        if self._writer is not None:
+            self._writer.mark_dirty()
+        else:
+            self._write_pending()
+        return event_count, rule_count
+
+    def iter_events(self, start_date: Optional[date] = None, end_date: Optional[date] = None) -> Iterator[Event]:
+        """按日期顺序逐个生成 [start_date, end_date] 内的普通事件（不传表示不限），只在取每天的事件时加锁"""
+        low = start_date.isoformat() if start_date else ""
+        high = end_date.isoformat() if end_date else "9999-12-31"
+        with self.lock:
+            date_keys = sorted(key for key in self.events_data if low <= key <= high)
+        for date_key in date_keys:
+            with self.lock:
+                events_list = list(self.events_data.get(date_key, ()))
+            yield from events_list
+
+    def ensure_range_loaded(self, start_date: date, end_date: date) -> None:
+        """JSON 存储启动时已加载全部事件，无需额外加载"""
+
+    def evict_years(self, keep_years: Set[int], min_idle: float = 0.0) -> int:
+        """JSON 存储的全部事件都在同一个快照中，不按年份移除"""
+        return 0
+
+    def search_hits(self, keyword: str, reference_ord: Optional[int] = None,
+                    limit: Optional[int] = None) -> List[SearchHit]:
+        """
+        搜索标题、描述或分类包含关键词的事件和规则，返回 [(命中字段, 日期序数, 键)]，键交给 resolve_hits。
+        传入 limit 时只返回按相关度和离 reference_ord 的距离排在最前的 limit 个事件，以及全部命中的规则。
+        规则命中的日期序数为 0、键为规则对象本身，由调用方计算发生日期。
+        """
+        with self.lock:
+            if self._search_index is None:
+                self._search_index = build_search_index(self.items.values())
+            return query_index(self._search_index, keyword, reference_ord, limit)
+
+    def resolve_hits(self, keys: Iterable[CalendarItem]) -> List[CalendarItem]:
+        """把搜索命中的键转换为事件或规则（键就是对象本身）"""
+        with self.lock:
+            return live_items(self.items, keys)
+
+
+def _date_ordinal(date_key: Optional[str]) -> Optional[int]:
+    parsed = parse_date(date_key)
+    return parsed.toordinal() if parsed else None
+
+
+def _month_index(day: date) -> int:
+    return day.year * 12 + day.month - 1
+
+
+class SqliteEventStore:
+    """
+    SQLite 事件存储，对外提供与 JsonEventStore 相同的 load/apply/save 接口。
+      events         —— 普通事件，按日期序数建索引，月视图只读取需要的月份
+      rules          —— 周期性规则，按 (周期类型, 起始序数, 结束序数) 建索引
+      excluded_dates —— 周期性规则的排除日期，按规则 id 存放
+    周期性规则数量少，启动时全部读入交给规则引擎；普通事件按月懒加载到 events_data，
+    已加载的事件对象在会话内保持不变，界面对它们的增删改与 JSON 存储的用法一致。
+    旧版本写入的行没有编号，读入时补上编号并写回，之后每次加载编号不变。
+    首次使用且数据库为空时，自动导入已有的 events.json 快照和日志。
+    搜索不用 SQL 筛选：内存中的二元组索引在第一次搜索时由各列建立（普通事件的键为 (日期序数, 行 id)，
+    规则的键为规则对象），之后随每次修改增量更新，批量导入后重建；只有取出的命中才加载所在月份。
+    write_delay 大于 0 时修改先写入未提交的事务，由后台线程在时间窗口结束后统一提交。
+    """
+
+    # 批量导入超过这么多条事件时先删除日期索引，导入完成后重建一次
+    BULK_INDEX_THRESHOLD = 10000
+    # 逐个生成事件时每次查询的行数
+    ITER_CHUNK = 1000
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY,
+            date_ord INTEGER NOT NULL,
+            title TEXT NOT NULL DEFAULT '',
+            category TEXT NOT NULL DEFAULT '',
+            description TEXT NOT NULL DEFAULT '',
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_events_date ON events (date_ord);
+        CREATE TABLE IF NOT EXISTS rules (
+            id INTEGER PRIMARY KEY,
+            period_type TEXT NOT NULL DEFAULT '',
+            start_ord INTEGER,
+            end_ord INTEGER,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_rules_period ON rules (period_type, start_ord, end_ord);
+        CREATE TABLE IF NOT EXISTS excluded_dates (
+            rule_id INTEGER NOT NULL,
+            date_ord INTEGER NOT NULL,
+            PRIMARY KEY (rule_id, date_ord)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, database_file: str, import_snapshot_file: Optional[str] = None,
+                 import_journal_file: Optional[str] = None, write_delay: float = 0.0):
+        self.database_file = database_file
+        self.import_snapshot_file = import_snapshot_file
+        self.import_journal_file = import_journal_file
+        self.events_data: Dict[str, List[Event]] = {}
+        self.periodic_rules: List[RecurrenceRule] = []
+        self.items: Dict[str, CalendarItem] = {}  # 编号 -> 已加载的事件或规则
+        self.lock = threading.RLock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._event_row_ids: Dict[str, int] = {}  # 事件编号 -> 行 id
+        self._rule_row_ids: Dict[str, int] = {}  # 规则编号 -> 行 id
+        self._loaded_months: Set[int] = set()  # 已加载到内存的月份（年 * 12 + 月 - 1）
+        self._year_used: Dict[int, float] = {}  # 年份 -> 最近一次访问的时刻（time.monotonic）
+        self._search_index: Optional[SearchIndex] = None
+        self._writer = CoalescingWriter(self.save, write_delay) if write_delay > 0 else None
+
+    def load(self) -> Tuple[Dict[str, List[Event]], List[RecurrenceRule]]:
+        """打开数据库并读入全部周期性规则，返回 (普通事件字典, 周期性规则列表)；普通事件按需加载"""
+        with self.lock:
+            if self._connection is None:
+                # 预取线程也会读取数据，连接在锁的保护下跨线程使用
+                self._connection = sqlite3.connect(self.database_file, check_same_thread=False)
+                self._connection.executescript(self.SCHEMA)
+            self.events_data, self.periodic_rules, self.items = {}, [], {}
+            self._event_row_ids, self._rule_row_ids = {}, {}
+            self._loaded_months = set()
+            self._search_index = None
+            if self._is_empty() and self.import_snapshot_file and os.path.exists(self.import_snapshot_file):
+                self._import_json()
+
+            excluded: Dict[int, List[int]] = {}
+            for rule_id, date_ord in self._connection.execute(
+                    "SELECT rule_id, date_ord FROM excluded_dates ORDER BY rule_id, date_ord"):
+                excluded.setdefault(rule_id, []).append(date_ord)
+            without_ids = []
+            for rule_id, data in self._connection.execute("SELECT id, data FROM rules ORDER BY id").fetchall():
+                rule_data = json.loads(data)
+                rule = RecurrenceRule.from_dict(rule_data)
+                rule.excluded_dates = compact_ordinals(excluded.get(rule_id), rule.end_ord)
+                self.periodic_rules.append(rule)
+                self.items[rule.id] = rule
+                self._rule_row_ids[rule.id] = rule_id
+                if "id" not in rule_data:
+                    without_ids.append(self._rule_columns(rule)[3:] + (rule_id,))
+            if without_ids:
+                self._write_ids("rules", without_ids)
+            print(f"Events loaded successfully from {self.database_file}.")
+            return self.events_data, self.periodic_rules
+
+    def _is_empty(self) -> bool:
+        return (self._connection.execute("SELECT 1 FROM events LIMIT 1").fetchone() is None and
+                self._connection.execute("SELECT 1 FROM rules LIMIT 1").fetchone() is None)
+
+    def _import_json(self) -> None:
+        """把 JSON 快照（含未压缩的日志）整体导入数据库，只在数据库为空时执行一次"""
+        json_store = JsonEventStore(self.import_snapshot_file, self.import_journal_file or os.devnull)
+        events_data, rules = json_store.load()
+        with self._connection:
+            for date_key, events_list in events_data.items():
+                date_ord = _date_ordinal(date_key)
+                if date_ord is None:
+                    continue
+                for event in events_list:
+                    self._insert_event(date_ord, event)
+            for rule in rules:
+                self._insert_rule(rule)
+        print(f"已将 {self.import_snapshot_file} 导入 {self.database_file}。")
+
+    def ensure_range_loaded(self, start_date: date, end_date: date) -> None:
+        """确保 [start_date, end_date] 所在月份的普通事件已加载到 events_data，一个月只查询一次"""
+        with self.lock:
+            now = time.monotonic()
+            for year in range(start_date.year, end_date.year + 1):
+                self._year_used[year] = now
+            first, last = _month_index(start_date), _month_index(end_date)
+            missing = [index for index in range(first, last + 1) if index not in self._loaded_months]
+            if not missing:
+                return
+            # 把连续的未加载月份合并成一次按日期序数的索引查询
+            low = date(missing[0] // 12, missing[0] % 12 + 1, 1).toordinal()
+            high_year, high_month = divmod(missing[-1] + 1, 12)
+            high = date(high_year, high_month + 1, 1).toordinal() - 1
+            rows = self._connection.execute(
+                "SELECT id, date_ord, data FROM events WHERE date_ord BETWEEN ? AND ? ORDER BY date_ord, id",
+                (low, high)).fetchall()
+            without_ids = []
+            for row_id, date_ord, data in rows:
+                day = date.fromordinal(date_ord)
+                if _month_index(day) in self._loaded_months:
+                    continue
+                date_key = day.isoformat()
+                event_data = json.loads(data)
+                event = Event.from_dict(date_key, event_data)
+                self.events_data.setdefault(date_key, []).append(event)
+                self.items[event.id] = event
+                self._event_row_ids[event.id] = row_id
+                if "id" not in event_data:
+                    without_ids.append(self._event_columns(event)[3:] + (row_id,))
+            self._loaded_months.update(missing)
+            if without_ids:
+                self._write_ids("events", without_ids)
+
+    def _write_ids(self, table: str, rows: List[Tuple[str, int]]) -> None:
+        """把新生成的编号写回旧版本的行，提交后下次加载得到相同的编号"""
+        try:
+            self._connection.executemany(f"UPDATE {table} SET data = ? WHERE id = ?", rows)
+        except sqlite3.Error as e:
+            print(f"写入事件编号时出错: {e}")
+        if self._writer is not None:
+            self._writer.mark_dirty()
+        else:
+            self.save()
+
+    def get(self, item_id: str) -> Optional[CalendarItem]:
+        """按编号查找已加载的事件或规则"""
+        with self.lock:
+            return self.items.get(item_id)
+
+    def evict_years(self, keep_years: Set[int], min_idle: float = 0.0) -> int:
+        """
+        从内存中移除 keep_years 以外年份的已加载月份（数据已在数据库中），返回移除的年份数；
+        最近 min_idle 秒内访问过的年份（例如刚显示的搜索结果所在的年份）也保留
+        """
+        with self.lock:
+            keep_years = keep_years | recently_used(self._year_used, min_idle)
+            cold_months = {index for index in self._loaded_months if index // 12 not in keep_years}
+            if not cold_months:
+                return 0
+            for date_key in [key for key in self.events_data if int(key.split('-')[0]) not in keep_years]:
+                for event in self.events_data.pop(date_key):
+                    self.items.pop(event.id, None)
+                    self._event_row_ids.pop(event.id, None)
+            self._loaded_months -= cold_months
+            return len({index // 12 for index in cold_months})
+
+    def iter_events(self, start_date: Optional[date] = None, end_date: Optional[date] = None) -> Iterator[Event]:
+        """
+        按日期顺序逐个生成 [start_date, end_date] 内的普通事件（不传表示不限）。
+        按 (日期序数, 行 id) 分段查询，每段 ITER_CHUNK 行，查询结果不加入 events_data，内存占用与事件总数无关。
+        """
+        last_ord = (start_date.toordinal() if start_date else 1) - 1
+        last_id = 0
+        high = end_date.toordinal() if end_date else date.max.toordinal()
+        while True:
+            with self.lock:
+                rows = self._connection.execute(
+                    "SELECT id, date_ord, data FROM events "
+                    "WHERE (date_ord > ? OR (date_ord = ? AND id > ?)) AND date_ord <= ? "
+                    "ORDER BY date_ord, id LIMIT ?",
+                    (last_ord, last_ord, last_id, high, self.ITER_CHUNK)).fetchall()
+            if not rows:
+                return
+            for row_id, date_ord, data in rows:
+                yield Event.from_dict(date.fromordinal(date_ord).isoformat(), json.loads(data))
+            last_id, last_ord = rows[-1][0], rows[-1][1]
+
+    def search_hits(self, keyword: str, reference_ord: Optional[int] = None,
+                    limit: Optional[int] = None) -> List[SearchHit]:
+        """
+        搜索标题、描述或分类包含关键词的事件和规则，返回 [(命中字段, 日期序数, 键)]，键交给 resolve_hits。
+        传入 limit 时只返回按相关度和离 reference_ord 的距离排在最前的 limit 个事件，以及全部命中的规则。
+        规则命中的日期序数为 0、键为规则对象本身，由调用方计算发生日期。只查询搜索索引，不加载任何月份。
+        """
+        with self.lock:
+            if self._search_index is None:
+                self._search_index = self._build_search_index()
+            return query_index(self._search_index, keyword, reference_ord, limit)
+
+    def resolve_hits(self, keys: Iterable) -> List[CalendarItem]:
+        """把搜索命中的键转换为事件或规则，只加载这些事件所在的月份；已被删除的不再返回"""
+        with self.lock:
+            resolved = []
+            for key in keys:
+                if not isinstance(key, tuple):
+                    if self.items.get(key.id) is key:
+                        resolved.append(key)
+                    continue
+                date_ord, row_id = key
+                day = date.fromordinal(date_ord)
+                self.ensure_range_loaded(day, day)
+                for event in self.events_data.get(day.isoformat(), []):
+                    if self._event_row_ids.get(event.id) == row_id:
+                        resolved.append(event)
+                        break
+            return resolved
+
+    def _build_search_index(self) -> SearchIndex:
+        """事件的键为 (日期序数, 行号)，规则的键为规则对象"""
+        search_index = SearchIndex()
+        search_index.add_all(itertools.chain(
+            (((date_ord, row_id), search_text(title, description, category), date_ord)
+             for row_id, date_ord, title, description, category in self._connection.execute(
+                "SELECT id, date_ord, title, description, category FROM events")),
+            ((rule, item_search_text(rule), None) for rule in self.periodic_rules)))
+        return search_index
+
+    def apply(self, op: Dict) -> None:
+        """应用一次修改：先更新内存数据，再在同一事务中写入对应的行"""
+        with self.lock:
+            kind = op["op"]
+            date_key = op.get("date")
+            if kind in ("add", "update", "delete"):
+                day = parse_date(date_key)
+                if day is None:
+                    raise ValueError(f"无效的事件日期: {date_key}")
+                self.ensure_range_loaded(day, day)
+            # 修改和删除在内存数据变化前先找到目标，再按编号取得行 id
+            target = None
+            if kind not in ("add", "add_rule"):
+                target = find_target(self.events_data, self.periodic_rules, self.items, op)
+            apply_operation(self.events_data, self.periodic_rules, self.items, op)
+
+            search_index = self._search_index
+            try:
+                if kind == "add":
+                    new_id = self._insert_event(_date_ordinal(date_key), op["event"])
+                    self._event_row_ids[op["event"].id] = new_id
+                    if search_index is not None:
+                        date_ord = _date_ordinal(date_key)
+                        search_index.add((date_ord, new_id), item_search_text(op["event"]), date_ord)
+                elif kind == "update":
+                    row_id = self._event_row_ids[target.id]
+                    self._connection.execute(
+                        "UPDATE events SET title = ?, category = ?, description = ?, data = ? WHERE id = ?",
+                        self._event_columns(target) + (row_id,))
+                    if search_index is not None:
+                        search_index.add((target.date_ord, row_id), item_search_text(target), target.date_ord)
+                elif kind == "delete":
+                    row_id = self._event_row_ids.pop(target.id)
+                    self._connection.execute("DELETE FROM events WHERE id = ?", (row_id,))
+                    if search_index is not None:
+                        search_index.remove((target.date_ord, row_id))
+                elif kind == "add_rule":
+                    self._rule_row_ids[op["rule"].id] = self._insert_rule(op["rule"])
+                    if search_index is not None:
+                        index_item(search_index, op["rule"])
+                elif kind in ("update_rule", "set_end_date"):
+                    row_id = self._rule_row_ids[target.id]
+                    self._connection.execute(
+                        "UPDATE rules SET period_type = ?, start_ord = ?, end_ord = ?, data = ? WHERE id = ?",
+                        self._rule_columns(target) + (row_id,))
+                    if kind == "set_end_date" and target.end_ord is not None:
+                        self._connection.execute(
+                            "DELETE FROM excluded_dates WHERE rule_id = ? AND date_ord > ?", (row_id, target.end_ord))
+                    if search_index is not None:
+                        index_item(search_index, target)
+                elif kind == "exclude_date":
+                    if target.is_excluded(_date_ordinal(op["date"])):
+                        self._connection.execute(
+                            "INSERT OR IGNORE INTO excluded_dates (rule_id, date_ord) VALUES (?, ?)",
+                            (self._rule_row_ids[target.id], _date_ordinal(op["date"])))
+                elif kind == "delete_series":
+                    row_id = self._rule_row_ids.pop(target.id)
+                    self._connection.execute("DELETE FROM excluded_dates WHERE rule_id = ?", (row_id,))
+                    self._connection.execute("DELETE FROM rules WHERE id = ?", (row_id,))
+                    if search_index is not None:
+                        search_index.remove(target)
+            except sqlite3.Error as e:
+                print(f"写入事件数据库时出错: {e}")
+                # 内存数据与数据库可能已不一致，下次搜索时重建索引
+                self._search_index = None
+        if self._writer is not None:
+            self._writer.mark_dirty()
+        else:
+            self.save()
+
+    def bulk_add(self, batches: Iterable[List[CalendarItem]]) -> Tuple[int, int]:
+        """
+        批量导入：先在锁外读完全部批次（解析文件期间界面仍可读取数据），再在同一个事务中写入，
+        出错时整体回滚，内存数据在提交成功后才更新。
+        只有已加载月份的事件才加入内存，其余月份翻到时再从数据库读取；
+        导入量较大时先删除日期索引，导入完成后重建一次，避免逐行维护索引。
+        返回 (导入的普通事件数, 导入的周期性规则数)
+        """
+        event_count = rule_count = 0
+        index_dropped = False
+        loaded: List[Tuple[CalendarItem, int]] = []  # 提交后加入内存的 (事件或规则, 行 id)
+        batches = [list(batch) for batch in batches]
+        with self.lock:
+            # 先提交尚在合并窗口内的修改，导入出错回滚时不影响它们
+            self.save()
+            try:
+                self._connection.execute("BEGIN")
+                for batch in batches:
+                    rows = []
+                    for item in batch:
+                        if item.is_periodic:
+                            loaded.append((item, self._insert_rule(item)))
+                            rule_count += 1
+                            continue
+                        if _month_index(item.date) in self._loaded_months:
+                            loaded.append((item, self._insert_event(item.date_ord, item)))
+                        else:
+                            rows.append((item.date_ord,) + self._event_columns(item))
+                        event_count += 1
+                    if not index_dropped and event_count >= self.BULK_INDEX_THRESHOLD:
+                        self._connection.execute("DROP INDEX IF EXISTS idx_events_date")
+                        index_dropped = True
+                    self._connection.executemany(
+                        "INSERT INTO events (date_ord, title, category, description, data) VALUES (?, ?, ?, ?, ?)",
+                        rows)
+                if index_dropped:
+                    self._connection.execute("CREATE INDEX IF NOT EXISTS idx_events_date ON events (date_ord)")
+                self._connection.commit()
+            except BaseException:
+                self._connection.rollback()
+                raise
+
+            # 大部分导入的事件不在内存中，下次搜索时由数据库各列重建索引
+            self._search_index = None
+            for item, row_id in loaded:
+                self.items[item.id] = item
+                if item.is_periodic:
+                    self.periodic_rules.append(item)
+                    self._rule_row_ids[item.id] = row_id
+                else:
+                    self.events_data.setdefault(item.date.isoformat(), []).append(item)
+                    self._event_row_ids[item.id] = row_id
+        return event_count, rule_count
+
+    def save(self) -> None:
+        """提交尚未提交的修改"""
+        with self.lock:
+            if self._connection is not None:
+                try:
+                    self._connection.commit()
+                except sqlite3.Error as e:
+                    print(f"提交事件数据库时出错: {e}")
+
+    def flush(self) -> None:
+        """立即提交所有待写入的修改"""
+        if self._writer is not None:
+            self._writer.flush()
+        else:
+            self.save()
+
+    def close(self) -> None:
+        self.flush()
+        with self.lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    @staticmethod
+    def _event_columns(event: Event) -> Tuple[str, str, str, str]:
+        return (event.title, event.category, event.description, json.dumps(event.to_dict(), ensure_ascii=False))
+
+    @staticmethod
+    def _rule_columns(rule: RecurrenceRule) -> Tuple[str, Optional[int], Optional[int], str]:
+        # 排除日期单独存放在 excluded_dates 表中
+        data = rule.to_dict()
+        del data["excluded_dates"]
+        return (rule.period_type, rule.start_ord or None, rule.end_ord, json.dumps(data, ensure_ascii=False))
+
+    def _insert_event(self, date_ord: int, event: Event) -> int:
+        cursor = self._connection.execute(
+            "INSERT INTO events (date_ord, title, category, description, data) VALUES (?, ?, ?, ?, ?)",
+            (date_ord,) + self._event_columns(event))
+        return cursor.lastrowid
+
+    def _insert_rule(self, rule: RecurrenceRule) -> int:
+        cursor = self._connection.execute(
+            "INSERT INTO rules (period_type, start_ord, end_ord, data) VALUES (?, ?, ?, ?)",
+            self._rule_columns(rule))
+        rule_id = cursor.lastrowid
+        excluded = [(rule_id, date_ord) for date_ord in rule.excluded_dates]
+        self._connection.executemany(
+            "INSERT OR IGNORE INTO excluded_dates (rule_id, date_ord) VALUES (?, ?)", excluded)
+        return rule_id
+
+
+class ShardedEventStore:
+    """
+    按年份分片的事件存储：每年的普通事件一个文件（如 2025.json），周期性规则单独存放在 rules.json。
+    启动时只读取规则文件，普通事件按年份懒加载，启动耗时不随历史年数增长；冷门年份可以从内存中移除。
+    与 JsonEventStore 相同，每次修改只向分片目录中的日志追加一行；日志累计到 compact_every 条、
+    移出有修改的年份或批量导入时才重写受影响年份的分片和规则文件，然后清空日志。
+    日志操作按编号定位，回放已写入分片的操作时跳过已存在的新增和已不存在的目标，压缩中途退出也不会重复回放。
+    启动时日志不为空则加载其中涉及的年份回放，并立即压缩。
+    _year_keys 记录每个已加载年份在 events_data 中的日期键，重写和移出年份时不必遍历全部已加载的事件。
+    file_format 为 "binary" 时使用紧凑二进制格式（2025.bin、rules.bin），读取时两种格式都识别，
+    写入时使用当前格式并删除另一种格式的旧文件，切换格式后随写入逐步转换。
+    旧版本写入的分片没有编号，读入时补上编号并标记为待写入，之后每次加载编号不变。
+    分片目录不存在时，自动从已有的 events.json 快照和日志迁移（迁移中途退出时下次启动重新迁移）。
+    """
+
+    RULES_STEM = "rules"
+    JOURNAL_NAME = "changes.journal"
+    FILE_EXTENSIONS: Dict[str, str] = {"json": ".json", "binary": ".bin"}
+
+    def __init__(self, shard_dir: str, import_snapshot_file: Optional[str] = None,
+                 import_journal_file: Optional[str] = None, write_delay: float = 0.0,
+                 file_format: str = "json", compact_every: int = 200):
+        if file_format not in self.FILE_EXTENSIONS:
+            print(f"未知的存储格式 '{file_format}'，将使用 JSON 格式。")
+            file_format = "json"
+        self.file_format = file_format
+        self.shard_dir = shard_dir
+        self.journal_file = os.path.join(shard_dir, self.JOURNAL_NAME)
+        self.compact_every = compact_every
+        self.import_snapshot_file = import_snapshot_file
+        self.import_journal_file = import_journal_file
+        self.events_data: Dict[str, List[Event]] = {}
+        self.periodic_rules: List[RecurrenceRule] = []
+        self.items: Dict[str, CalendarItem] = {}  # 编号 -> 已加载的事件或规则
+        self.lock = threading.RLock()
+        self._shard_years: Set[int] = set()  # 磁盘上已有分片的年份
+        self._loaded_years: Set[int] = set()
+        self._year_keys: Dict[int, Set[str]] = {}  # 已加载的年份 -> 该年在 events_data 中的日期键
+        self._year_used: Dict[int, float] = {}  # 年份 -> 最近一次访问的时刻（time.monotonic）
+        self._dirty_years: Set[int] = set()
+        self._rules_dirty = False
+        self._pending_lines: List[str] = []  # 尚未追加到日志文件的修改
+        self._journal_length = 0  # 日志中尚未压缩的条数
+        self._imported: Dict[int, List[Event]] = {}  # 批量导入到未加载年份、尚未写入分片的事件
+        self._compact_pending = False  # 批量导入不记日志，需要尽快压缩
+        self._search_index: Optional[SearchIndex] = None
+        self._writer = CoalescingWriter(self._write_pending, write_delay) if write_delay > 0 else None
+
+    def load(self) -> Tuple[Dict[str, List[Event]], List[RecurrenceRule]]:
+        """读取周期性规则，返回 (普通事件字典, 周期性规则列表)；普通事件按年份懒加载"""
+        with self.lock:
+            self.events_data, self.periodic_rules, self.items = {}, [], {}
+            self._loaded_years, self._dirty_years, self._year_keys = set(), set(), {}
+            self._rules_dirty = False
+            self._pending_lines, self._journal_length = [], 0
+            self._imported, self._compact_pending = {}, False
+            self._search_index = None
+            if not os.path.isdir(self.shard_dir):
+                if self.import_snapshot_file and os.path.exists(self.import_snapshot_file):
+                    self._migrate()
+                else:
+                    os.makedirs(self.shard_dir, exist_ok=True)
+
+            try:
+                contents = self._read_file(self.RULES_STEM)
+                if contents is not None:
+                    self.periodic_rules = contents[1]
+                    self.items = index_items({}, self.periodic_rules)
+                    # 旧版本的规则没有编号，立即写回固定编号，之后的日志才能按编号回放
+                    if contents[2]:
+                        self._write_file(self.RULES_STEM, None, self.periodic_rules)
+            except (OSError, ValueError, TypeError) as e:
+                print(f"读取周期性规则文件时出错: {e}. 将使用空数据。")
+            self._shard_years = set()
+            extensions = set(self.FILE_EXTENSIONS.values())
+            for name in (os.listdir(self.shard_dir) if os.path.isdir(self.shard_dir) else []):
+                stem, ext = os.path.splitext(name)
+                if ext in extensions and stem.isdigit():
+                    self._shard_years.add(int(stem))
+            ops, damaged = read_journal(self.journal_file)
+            if ops or damaged:
+                self._replay(ops)
+                self._write_dirty()
+            print(f"Events loaded successfully from {self.shard_dir} ({len(self._shard_years)} year shards).")
+            return self.events_data, self.periodic_rules
+
+    def _replay(self, ops: List[Dict]) -> None:
+        """回放上次退出前尚未压缩的日志；已写入分片的新增（编号已存在）和目标已不存在的修改直接跳过"""
+        for data in ops:
+            try:
+                op = decode_operation(data)
+                day = parse_date(op.get("date")) if op["op"] in ("add", "update", "delete") else None
+                if day is not None:
+                    self._load_year(day.year)
+                added = op.get("event") or op.get("rule")
+                if added is not None and added.id in self.items:
+                    continue
+                if "id" in op and op["id"] not in self.items:
+                    continue
+                self._apply_locked(op)
+            except (KeyError, IndexError, ValueError, TypeError) as e:
+                print(f"回放事件日志时出错: {e}")
+
+    def _migrate(self) -> None:
+        """
+        把 events.json 快照（含未压缩的日志）拆分为年份分片和规则文件，原文件保留作为备份。
+        先写入临时目录，全部写完后再改名为分片目录：迁移中途退出不会留下不完整的分片目录，下次启动时重新迁移
+        """
+        json_store = JsonEventStore(self.import_snapshot_file, self.import_journal_file or os.devnull)
+        events_data, rules = json_store.load()
+        shards: Dict[int, Dict[str, List[Event]]] = {}
+        for date_key, events_list in events_data.items():
+            day = parse_date(date_key)
+            if day is not None:
+                shards.setdefault(day.year, {})[date_key] = events_list
+        temp_dir = self.shard_dir.rstrip(os.sep) + ".migrating"
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        try:
+            os.makedirs(temp_dir)
+            written = all([self._write_file(str(year), shard, None, temp_dir) for year, shard in shards.items()])
+            if not (written and self._write_file(self.RULES_STEM, None, rules, temp_dir)):
+                raise OSError("部分分片写入失败")
+            os.rename(temp_dir, self.shard_dir)
+        except OSError as e:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            print(f"迁移 {self.import_snapshot_file} 时出错: {e}. 下次启动时将重新迁移。")
+            return
+        print(f"已将 {self.import_snapshot_file} 迁移为按年份分片的存储: {self.shard_dir}")
+
+    def _path(self, stem: str, file_format: str, directory: Optional[str] = None) -> str:
+        return os.path.join(directory or self.shard_dir, stem + self.FILE_EXTENSIONS[file_format])
+
+    def _read_file(self, stem: str) -> Optional[Tuple[Dict[str, List[Event]], List[RecurrenceRule], bool]]:
+        """
+        读取分片或规则文件，优先读取当前格式，返回 (普通事件字典, 周期性规则列表, 是否缺少编号)；
+        文件不存在时返回 None
+        """
+        other_formats = [name for name in self.FILE_EXTENSIONS if name != self.file_format]
+        for file_format in [self.file_format] + other_formats:
+            path = self._path(stem, file_format)
+            if not os.path.exists(path):
+                continue
+            if file_format == "binary":
+                with open(path, 'rb') as f:
+                    single_events, periodic_rules = decode_events(f.read())
+            else:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                single_events, periodic_rules = data.get("single_events", {}), data.get("periodic_rules", [])
+            return (events_from_json(single_events), rules_from_json(periodic_rules),
+                    missing_ids(single_events, periodic_rules))
+        return None
+
+    def _write_file(self, stem: str, single_events: Optional[Dict[str, List[Event]]],
+                    periodic_rules: Optional[List[RecurrenceRule]], directory: Optional[str] = None) -> bool:
+        """按当前格式写入分片或规则文件（先写临时文件再替换），并删除另一种格式的旧文件；directory 默认为分片目录"""
+        path = self._path(stem, self.file_format, directory)
+        try:
+            temp_file = path + ".tmp"
+            if self.file_format == "binary":
+                with open(temp_file, 'wb') as f:
+                    f.write(encode_events(events_to_json(single_events or {}), rules_to_json(periodic_rules or [])))
+            else:
+                data = {}
+                if single_events is not None:
+                    data["single_events"] = events_to_json(single_events)
+                if periodic_rules is not None:
+                    data["periodic_rules"] = rules_to_json(periodic_rules)
+                with open(temp_file, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, indent=4)
+            os.replace(temp_file, path)
+            for file_format in self.FILE_EXTENSIONS:
+                other_path = self._path(stem, file_format, directory)
+                if file_format != self.file_format and os.path.exists(other_path):
+                    os.remove(other_path)
+            return True
+        except (OSError, ValueError) as e:
+            print(f"写入 {path} 时出错: {e}")
+            return False
+
+    def _load_year(self, year: int) -> None:
+        self._year_used[year] = time.monotonic()
+        if year in self._loaded_years:
+            return
+        self._loaded_years.add(year)
+        if year in self._shard_years:
+            try:
+                contents = self._read_file(str(year))
+                if contents is not None:
+                    self.events_data.update(contents[0])
+                    self._year_keys[year] = set(contents[0])
+                    # 搜索索引建立时已包含全部分片的事件（键不依赖事件是否在内存中），加载时无需更新
+                    self.items.update(index_items(contents[0], []))
+                    # 旧版本的分片没有编号，立即写回固定编号，之后的日志才能按编号回放
+                    if contents[2]:
+                        self._write_file(str(year), contents[0], None)
+            except (OSError, ValueError, TypeError) as e:
+                print(f"读取 {year} 年事件分片时出错: {e}")
+        # 批量导入后尚未写入分片的事件并入内存，由之后的压缩连同其他修改一起写入
+        imported = self._imported.pop(year, None)
+        if imported:
+            for event in imported:
+                date_key = event.date.isoformat()
+                self.events_data.setdefault(date_key, []).append(event)
+                self._year_keys.setdefault(year, set()).add(date_key)
+                self.items[event.id] = event
+            self._dirty_years.add(year)
+
+    def ensure_range_loaded(self, start_date: date, end_date: date) -> None:
+        """确保 [start_date, end_date] 涉及的年份分片已加载"""
+        with self.lock:
+            for year in range(start_date.year, end_date.year + 1):
+                self._load_year(year)
+
+    def evict_years(self, keep_years: Set[int], min_idle: float = 0.0) -> int:
+        """
+        从内存中移除 keep_years 以外的已加载年份（有修改的年份先写入分片），返回移除的年份数；
+        最近 min_idle 秒内访问过的年份（例如刚显示的搜索结果所在的年份）也保留
+        """
+        with self.lock:
+            cold_years = self._loaded_years - keep_years - recently_used(self._year_used, min_idle)
+            if not cold_years:
+                return 0
+            # 有修改的年份移出前需要先写入分片
+            if cold_years & self._dirty_years:
+                self._write_dirty()
+                cold_years -= self._dirty_years  # 写入失败的年份留在内存中
+            for year in cold_years:
+                for date_key in self._year_keys.pop(year, ()):
+                    for event in self.events_data.pop(date_key, ()):
+                        # 搜索索引保留这些事件，之后搜索不必重新加载这个年份
+                        self.items.pop(event.id, None)
+            self._loaded_years -= cold_years
+            return len(cold_years)
+
+    def iter_events(self, start_date: Optional[date] = None, end_date: Optional[date] = None) -> Iterator[Event]:
+        """
+        按日期顺序逐个生成 [start_date, end_date] 内的普通事件（不传表示不限）。
+        一次只处理一个年份：已加载的年份取内存中的事件，未加载的年份临时读取分片，用完即丢弃，不加入 events_data。
+        """
+        low = start_date.isoformat() if start_date else ""
+        high = end_date.isoformat() if end_date else "9999-12-31"
+        with self.lock:
+            years = sorted(year for year in self._shard_years | self._loaded_years | set(self._imported)
+                           if (start_date is None or year >= start_date.year) and
+                           (end_date is None or year <= end_date.year))
+        for year in years:
+            with self.lock:
+                if year in self._loaded_years:
+                    shard = self._year_shard(year, copy=True)
+                else:
+                    try:
+                        contents = self._read_file(str(year))
+                    except (OSError, ValueError, TypeError) as e:
+                        print(f"读取 {year} 年事件分片时出错: {e}")
+                        contents = None
+                    shard = contents[0] if contents is not None else {}
+                    for event in self._imported.get(year, ()):
+                        shard.setdefault(event.date.isoformat(), []).append(event)
+            for date_key in sorted(shard):
+                if low <= date_key <= high:
+                    yield from shard[date_key]
+
+    def search_hits(self, keyword: str, reference_ord: Optional[int] = None,
+                    limit: Optional[int] = None) -> List[SearchHit]:
+        """
+        搜索标题、描述或分类包含关键词的事件和规则，返回 [(命中字段, 日期序数, 键)]，键交给 resolve_hits。
+        传入 limit 时只返回按相关度和离 reference_ord 的距离排在最前的 limit 个事件，以及全部命中的规则。
+        规则命中的日期序数为 0、键为规则对象本身，由调用方计算发生日期。
+        只查询搜索索引，不加载任何年份：索引在第一次搜索时建立，事件的键为 (日期序数, 编号)，
+        年份移出内存后索引仍保留其中的事件，之后随修改增量更新。
+        """
+        with self.lock:
+            if self._search_index is None:
+                self._search_index = self._build_search_index()
+            return query_index(self._search_index, keyword, reference_ord, limit)
+
+    def resolve_hits(self, keys: Iterable) -> List[CalendarItem]:
+        """把搜索命中的键转换为事件或规则，只加载这些事件所在的年份；已被删除的不再返回"""
+        with self.lock:
+            resolved = []
+            for key in keys:
+                if not isinstance(key, tuple):
+                    if self.items.get(key.id) is key:
+                        resolved.append(key)
+                    continue
+                date_ord, item_id = key
+                self._load_year(date.fromordinal(date_ord).year)
+                event = self.items.get(item_id)
+                if event is not None and not event.is_periodic and event.date_ord == date_ord:
+                    resolved.append(event)
+            return resolved
+
+    def _build_search_index(self) -> SearchIndex:
+        """
+        为全部年份的事件和规则建立搜索索引。未加载的年份临时读取分片，用完即丢弃，不加入 events_data；
+        缺少编号的旧分片需要加载并写回，编号才不会在下次读取时改变。
+        """
+        events: List[Event] = []
+        for year in sorted(self._shard_years - self._loaded_years):
+            try:
+                contents = self._read_file(str(year))
+            except (OSError, ValueError, TypeError) as e:
+                print(f"读取 {year} 年事件分片时出错: {e}")
+                continue
+            if contents is None:
+                continue
+            if contents[2]:
+                self._load_year(year)
+            else:
+                events.extend(event for events_list in contents[0].values() for event in events_list)
+        events.extend(event for events_list in self.events_data.values() for event in events_list)
+        events.extend(itertools.chain.from_iterable(self._imported.values()))
+        return build_search_index(itertools.chain(events, self.periodic_rules), dated_key)
+
+    def get(self, item_id: str) -> Optional[CalendarItem]:
+        """按编号查找已加载的事件或规则"""
+        with self.lock:
+            return self.items.get(item_id)
+
+    def apply(self, op: Dict) -> None:
+        """应用一次修改并记入日志，累计到阈值时重写受影响的分片"""
+        with self.lock:
+            self._apply_locked(op)
+            self._pending_lines.append(json.dumps(encode_operation(op), ensure_ascii=False))
+        if self._writer is not None:
+            self._writer.mark_dirty()
+        else:
+            self._write_pending()
+
+    def _apply_locked(self, op: Dict) -> None:
+        """更新内存数据和搜索索引，并标记受影响的分片或规则文件（调用方需持有锁）"""
+        if op["op"] in ("add", "update", "delete"):
+            day = parse_date(op.get("date"))
+            if day is None:
+                raise ValueError(f"无效的事件日期: {op.get('date')}")
+            self._load_year(day.year)
+            apply_indexed(self._search_index, self.events_data, self.periodic_rules, self.items, op, dated_key)
+            self._track_date_key(day.year, op["date"])
+            self._dirty_years.add(day.year)
+        else:
+            apply_indexed(self._search_index, self.events_data, self.periodic_rules, self.items, op, dated_key)
+            self._rules_dirty = True
+
+    def _track_date_key(self, year: int, date_key: str) -> None:
+        """修改某天的事件后同步 _year_keys：当天还有事件时记入，已被删空时移除"""
+        if date_key in self.events_data:
+            self._year_keys.setdefault(year, set()).add(date_key)
+        else:
+            self._year_keys.get(year, set()).discard(date_key)
+
+    def _year_shard(self, year: int, copy: bool = False) -> Dict[str, List[Event]]:
+        """已加载年份的普通事件（按日期排列），copy 为 True 时复制每天的列表"""
+        events_data = self.events_data
+        return {date_key: list(events_data[date_key]) if copy else events_data[date_key]
+                for date_key in sorted(self._year_keys.get(year, ())) if date_key in events_data}
+
+    def bulk_add(self, batches: Iterable[List[CalendarItem]]) -> Tuple[int, int]:
+        """
+        批量导入：读完全部批次后一次加入内存数据，读取批次时出错不会留下导入了一半的数据。
+        已加载年份的事件直接加入内存；未加载年份的事件暂存在 _imported 中，不为此加载这些年份，
+        压缩时与分片中原有的事件合并后写入，每个受影响的文件只重写一次。写入与其他修改一样交给写入线程。
+        返回 (导入的普通事件数, 导入的周期性规则数)
+        """
+        event_count = rule_count = 0
+        imported = [item for batch in batches for item in batch]
+        with self.lock:
+            for item in imported:
+                if item.is_periodic:
+                    self.periodic_rules.append(item)
+                    self.items[item.id] = item
+                    self._rules_dirty = True
+                    rule_count += 1
+                else:
+                    year = item.date.year
+                    if year in self._loaded_years:
+                        date_key = item.date.isoformat()
+                        self.events_data.setdefault(date_key, []).append(item)
+                        self._year_keys.setdefault(year, set()).add(date_key)
+                        self.items[item.id] = item
+                        self._dirty_years.add(year)
+                    else:
+                        self._imported.setdefault(year, []).append(item)
+                    event_count += 1
+                if self._search_index is not None:
+                    index_item(self._search_index, item, dated_key)
+            if not imported:
+                return 0, 0
+            self._compact_pending = True
+        if self._writer is not None:
+            self._writer.mark_dirty()
+        else:
+            self._write_pending()
+        return event_count, rule_count
+
+    def _write_pending(self) -> None:
+        """把待写入的修改一次性追加到日志文件，累计到阈值时压缩"""
+        with self.lock:
+            if self._pending_lines:
+                lines, self._pending_lines = self._pending_lines, []
+                try:
+                    with open(self.journal_file, 'a', encoding='utf-8') as f:
+                        f.write("".join(line + "\n" for line in lines))
+                    self._journal_length += len(lines)
+                except OSError as e:
+                    print(f"写入事件日志时出错: {e}")
+            if self._compact_pending or self._journal_length >= self.compact_every:
+                self._write_dirty()
+
+    def _write_dirty(self) -> None:
+        """压缩：重写有修改的年份分片和规则文件，把批量导入的事件并入未加载年份的分片，全部写入成功后清空日志"""
+        with self.lock:
+            written = True
+            for year in sorted(self._dirty_years):
+                if self._write_file(str(year), self._year_shard(year), None):
+                    self._shard_years.add(year)
+                    self._dirty_years.discard(year)
+                else:
+                    written = False
+            for year in sorted(self._imported):
+                try:
+                    contents = self._read_file(str(year)) if year in self._shard_years else None
+                except (OSError, ValueError, TypeError) as e:
+                    print(f"读取 {year} 年事件分片时出错: {e}")
+                    written = False
+                    continue
+                shard = contents[0] if contents is not None else {}
+                for event in self._imported[year]:
+                    shard.setdefault(event.date.isoformat(), []).append(event)
+                if self._write_file(str(year), dict(sorted(shard.items())), None):
+                    self._shard_years.add(year)
+                    del self._imported[year]
+                else:
+                    written = False
+            if self._rules_dirty:
+                if self._write_file(self.RULES_STEM, None, self.periodic_rules):
+                    self._rules_dirty = False
+                else:
+                    written = False
+            if not written:
+                return
+            # 分片包含内存中的全部修改，待写入的日志行不再需要
+            self._pending_lines = []
+            self._compact_pending = False
+            try:
+                open(self.journal_file, 'w', encoding='utf-8').close()
+                self._journal_length = 0
+            except OSError as e:
+                print(f"清空事件日志时出错: {e}")
+
+    def flush(self) -> None:
+        """立即把所有待写入的修改追加到日志"""
+        if self._writer is not None:
+            self._writer.flush()
+        else:
+            self._write_pending()
+
+    def save(self) -> None:
+        """重写全部已加载的年份分片和规则文件"""
+        with self.lock:
+            self._dirty_years |= self._loaded_years
+            self._rules_dirty = True
+            self._write_dirty()
+            print(f"Events saved successfully to {self.shard_dir}.")
+
+
+def create_event_store(backend: str, snapshot_file: str, journal_file: str, database_file: str,
+                       shard_dir: str, compact_every: int = 200, write_delay: float = 0.0,
+                       file_format: str = "json"):
+    """
+    按配置创建事件存储，backend 取值：
+      "sharded" —— 按年份分片的文件，file_format 可选 "json" 或 "binary"
+      "json"    —— 单个快照文件 + 修改日志
+      "sqlite"  —— 本地数据库
+    """
+    if backend == "sharded":
+        return ShardedEventStore(shard_dir, snapshot_file, journal_file, write_delay, file_format, compact_every)
+    if backend == "sqlite":
+        return SqliteEventStore(database_file, snapshot_file, journal_file, write_delay)
+    if backend != "json":
+        print(f"未知的存储类型 '{backend}'，将使用 JSON 存储。")
+    return JsonEventStore(snapshot_file, journal_file, compact_every, write_delay)
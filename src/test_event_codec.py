@@ -0,0 +1,55 @@
+import os
+import sys
+import unittest
+
+# 模块之间按文件名导入（与 main.py 相同），从仓库根目录运行 pytest 时也能找到
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from event_codec import decode_events, encode_events, is_binary_events
+
+SINGLE_EVENTS = {
+    "2024-05-01": [
+        {"id": "a1", "title": "周会", "category": "工作", "description": "第一行\n第二行", "event_time": "全天",
+         "is_periodic": False, "period_info": {}, "created_at": "2024-04-30 10:00:00"},
+        # 不在枚举中的分类、未知字段和缺少的字段都要原样还原
+        {"id": "a2", "title": "体检", "category": "健康", "description": "", "event_time": "08:00-10:00",
+         "created_at": "", "location": "医院", "reminder": 30},
+    ],
+    "1999-12-31": [
+        {"title": "旧版没有编号", "category": "日常"},
+    ],
+}
+
+PERIODIC_RULES = [
+    {"id": "r1", "title": "纪念日", "category": "日常", "description": "", "event_time": "全天", "is_periodic": True,
+     "period_info": {"type": "每年", "start_date": "2000-05-20", "excluded_dates": ["2020-05-20"]},
+     "created_at": ""},
+]
+
+
+class BinaryCodecTest(unittest.TestCase):
+    """紧凑二进制格式与 JSON 格式互转"""
+
+    def test_round_trip(self):
+        buffer = encode_events(SINGLE_EVENTS, PERIODIC_RULES)
+        self.assertTrue(is_binary_events(buffer))
+        self.assertEqual(decode_events(buffer), (SINGLE_EVENTS, PERIODIC_RULES))
+
+    def test_empty(self):
+        self.assertEqual(decode_events(encode_events({}, [])), ({}, []))
+
+    def test_truncated_buffer(self):
+        buffer = encode_events(SINGLE_EVENTS, PERIODIC_RULES)
+        # 写到一半退出留下的文件不能被当作数据较少的文件读出来
+        for length in range(len(buffer)):
+            with self.assertRaises(ValueError, msg=f"截断到 {length} 字节"):
+                decode_events(buffer[:length])
+
+    def test_not_binary(self):
+        self.assertFalse(is_binary_events(b'{"single_events": {}}'))
+        with self.assertRaises(ValueError):
+            decode_events(b'{"single_events": {}, "periodic_rules": []}' + b" " * 64)
+
+
+if __name__ == "__main__":
+    unittest.main()
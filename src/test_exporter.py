@@ -0,0 +1,64 @@
+import os
+import sys
+import unittest
+from datetime import date
+
+# 模块之间按文件名导入（与 main.py 相同），从仓库根目录运行 pytest 时也能找到
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from data import Event, RecurrenceRule
+from exporter import iter_ics
+from importer import ImportResult, parse_ics
+from recurrence import next_occurrences
+
+
+def ordinal(year: int, month: int, day: int) -> int:
+    return date(year, month, day).toordinal()
+
+
+def round_trip(events, rules):
+    """导出为 ICS 文本后再导入"""
+    text = "".join(iter_ics(events, rules))
+    result = ImportResult()
+    items = list(parse_ics(text.splitlines(keepends=True), result))
+    return items, result
+
+
+class IcsRoundTripTest(unittest.TestCase):
+    """导出的 ICS 重新导入后得到相同的事件和规则"""
+
+    def test_single_event(self):
+        event = Event(ordinal(2025, 3, 1), "周会, 每周一", "工作", "第一行\n第二行", "08:00-10:00")
+        [item], result = round_trip([event], [])
+        self.assertFalse(item.is_periodic)
+        self.assertEqual((item.date_ord, item.title, item.category, item.description, item.event_time),
+                         (event.date_ord, event.title, event.category, event.description, event.event_time))
+        self.assertEqual(result.skipped, 0)
+
+    def test_weekly_rule_with_exclusion(self):
+        rule = RecurrenceRule(ordinal(2025, 3, 3), "健身", "健康", period_type="每周")
+        rule.exclude(ordinal(2025, 3, 10))
+        [item], _ = round_trip([], [rule])
+        self.assertEqual(item.period_type, "每周")
+        self.assertEqual(next_occurrences(item, date(2025, 3, 1), 3),
+                         [date(2025, 3, 3), date(2025, 3, 17), date(2025, 3, 24)])
+
+    def test_custom_dates(self):
+        rule = RecurrenceRule(ordinal(2025, 5, 1), "值班", "工作", period_type="自定义日期",
+                              custom_dates=[ordinal(2025, 5, 1), ordinal(2025, 6, 3)])
+        [item], _ = round_trip([], [rule])
+        self.assertEqual(item.period_type, "自定义日期")
+        self.assertEqual(item.custom_dates, rule.custom_dates)
+
+    def test_single_custom_date(self):
+        # 只有一个日期的自定义日期规则也要写出 RDATE，否则重新导入会变成普通事件
+        rule = RecurrenceRule(ordinal(2025, 5, 1), "值班", "工作", period_type="自定义日期",
+                              custom_dates=[ordinal(2025, 6, 3)])
+        [item], _ = round_trip([], [rule])
+        self.assertTrue(item.is_periodic)
+        self.assertEqual(item.period_type, "自定义日期")
+        self.assertEqual(item.custom_dates, [ordinal(2025, 6, 3)])
+
+
+if __name__ == "__main__":
+    unittest.main()
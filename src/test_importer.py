@@ -0,0 +1,120 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import date
+
+# 模块之间按文件名导入（与 main.py 相同），从仓库根目录运行 pytest 时也能找到
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from importer import ImportResult, parse_ics, read_import_file
+from recurrence import next_occurrences
+
+
+def ordinal(year: int, month: int, day: int) -> int:
+    return date(year, month, day).toordinal()
+
+
+def vevent(*lines: str) -> str:
+    return "BEGIN:VEVENT\r\n" + "".join(line + "\r\n" for line in lines) + "END:VEVENT\r\n"
+
+
+def calendar(*events: str) -> str:
+    return "BEGIN:VCALENDAR\r\nVERSION:2.0\r\n" + "".join(events) + "END:VCALENDAR\r\n"
+
+
+def parse(text: str):
+    result = ImportResult()
+    return list(parse_ics(text.splitlines(keepends=True), result)), result
+
+
+class IcsImportTest(unittest.TestCase):
+    """ICS 的 RRULE、RDATE、EXDATE 映射为周期性规则"""
+
+    def test_single_event(self):
+        [event], result = parse(calendar(vevent("UID:1", "DTSTART:20250301T093000", "SUMMARY:周会\\, 每周一",
+                                                "DESCRIPTION:第一行\\n第二行", "CATEGORIES:工作")))
+        self.assertFalse(event.is_periodic)
+        self.assertEqual((event.date_ord, event.title, event.category, event.description, event.event_time),
+                         (ordinal(2025, 3, 1), "周会, 每周一", "工作", "第一行\n第二行", "08:00-10:00"))
+        self.assertEqual(result.skipped, 0)
+
+    def test_weekly_byday_count_exdate(self):
+        rules, result = parse(calendar(vevent(
+            "UID:2", "DTSTART;VALUE=DATE:20250303", "SUMMARY:健身",
+            "RRULE:FREQ=WEEKLY;BYDAY=MO,TH;COUNT=4", "EXDATE;VALUE=DATE:20250306")))
+        # 每个星期拆成一条规则，COUNT 按整个系列计算，EXDATE 对每条规则都生效
+        self.assertEqual([(rule.period_type, rule.start_ord) for rule in rules],
+                         [("每周", ordinal(2025, 3, 3)), ("每周", ordinal(2025, 3, 6))])
+        hits = sorted(hit for rule in rules for hit in next_occurrences(rule, date(2025, 3, 1), 10))
+        self.assertEqual(hits, [date(2025, 3, 3), date(2025, 3, 10), date(2025, 3, 13)])
+        self.assertEqual(result.skipped, 0)
+
+    def test_interval_and_until(self):
+        [rule], _ = parse(calendar(vevent("UID:3", "DTSTART;VALUE=DATE:20250110", "SUMMARY:复盘",
+                                          "RRULE:FREQ=MONTHLY;INTERVAL=2;UNTIL=20250630")))
+        self.assertEqual((rule.period_type, rule.interval, rule.unit, rule.end_ord),
+                         ("自定义周期", 2, "月", ordinal(2025, 6, 30)))
+        self.assertEqual(next_occurrences(rule, date(2025, 1, 1), 10),
+                         [date(2025, 1, 10), date(2025, 3, 10), date(2025, 5, 10)])
+
+    def test_rdate_only(self):
+        [rule], _ = parse(calendar(vevent("UID:4", "DTSTART;VALUE=DATE:20250501", "SUMMARY:值班",
+                                          "RDATE;VALUE=DATE:20250603,20250704")))
+        self.assertEqual(rule.period_type, "自定义日期")
+        self.assertEqual(rule.custom_dates, [ordinal(2025, 5, 1), ordinal(2025, 6, 3), ordinal(2025, 7, 4)])
+
+    def test_unsupported_rules_are_skipped(self):
+        items, result = parse(calendar(
+            vevent("UID:5", "DTSTART;VALUE=DATE:20250311", "SUMMARY:第二个周二", "RRULE:FREQ=MONTHLY;BYDAY=2TU"),
+            vevent("UID:6", "SUMMARY:没有开始日期"),
+            vevent("UID:7", "DTSTART;VALUE=DATE:20250311", "SUMMARY:保留")))
+        self.assertEqual([item.title for item in items], ["保留"])
+        self.assertEqual(result.skipped, 2)
+        self.assertIn("BYDAY=2TU", result.errors[0])
+        self.assertIn("DTSTART", result.errors[1])
+
+    def test_recurrence_instance_of_imported_series(self):
+        items, _ = parse(calendar(
+            vevent("UID:8", "DTSTART;VALUE=DATE:20250303", "SUMMARY:周会", "RRULE:FREQ=WEEKLY"),
+            vevent("UID:8", "RECURRENCE-ID;VALUE=DATE:20250310", "DTSTART;VALUE=DATE:20250311", "SUMMARY:周会")))
+        self.assertEqual(len(items), 1)
+
+
+class ReadImportFileTest(unittest.TestCase):
+    """按扩展名读取文件，校验失败的条目跳过并记录原因"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name: str, text: str) -> str:
+        path = os.path.join(self.directory, name)
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+        return path
+
+    def test_csv(self):
+        path = self.write("events.csv", "日期,标题,分类,时间\n2025-03-01,周会,工作,09:30\n"
+                                        "2025/3/2,读书,未知分类,\n不是日期,跳过,,\n2025-03-03,,,\n"
+                                        "2025-03-04,时间不对,,25点\n")
+        progress = []
+        items, result = read_import_file(path, batch_size=2, progress=lambda count, fraction: progress.append(count))
+        self.assertEqual([(item.title, item.category, item.event_time) for item in items],
+                         [("周会", "工作", "08:00-10:00"), ("读书", "日常", "全天")])
+        self.assertEqual(result.skipped, 3)
+        # 进度按解析出的条数计算（日期、时间无效的行在解析时就已跳过）
+        self.assertEqual(progress[-1], 3)
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            read_import_file(self.write("events.txt", ""))
+        with self.assertRaises(ValueError):
+            read_import_file(self.write("events.csv", "name,value\n1,2\n"))
+        with self.assertRaises(OSError):
+            read_import_file(os.path.join(self.directory, "missing.ics"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import os
+import sys
+import unittest
+from datetime import date
+
+# 模块之间按文件名导入（与 main.py 相同），从仓库根目录运行 pytest 时也能找到
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from data import RecurrenceRule
+from recurrence import CompiledRule
+
+
+def ordinal(year: int, month: int, day: int) -> int:
+    return date(year, month, day).toordinal()
+
+
+class NearestOccurrenceTest(unittest.TestCase):
+    """搜索结果跳转使用的最近发生日期"""
+
+    def test_nearest_in_window(self):
+        rule = RecurrenceRule(ordinal(2020, 1, 6), "周会", "工作", period_type="每周")
+        rule.exclude(ordinal(2025, 3, 10))
+        compiled = CompiledRule(rule)
+        # 3 月 10 日被排除，离 3 月 11 日最近的是 3 月 17 日（3 月 3 日相差 8 天）
+        self.assertEqual(compiled.nearest_occurrence(ordinal(2025, 3, 11), ordinal(2024, 3, 1), ordinal(2026, 3, 31)),
+                         ordinal(2025, 3, 17))
+
+    def test_ended_rule_uses_last_occurrence(self):
+        rule = RecurrenceRule(ordinal(2010, 1, 4), "周会", "工作", period_type="每周")
+        rule.set_end(ordinal(2015, 6, 30))
+        compiled = CompiledRule(rule)
+        # 规则早已结束，窗口内没有发生：取结束前最后一次，而不是 2010 年的第一次
+        self.assertEqual(compiled.nearest_occurrence(ordinal(2025, 3, 11), ordinal(2024, 3, 1), ordinal(2026, 3, 31)),
+                         ordinal(2015, 6, 29))
+
+    def test_sparse_rule_outside_window(self):
+        rule = RecurrenceRule(ordinal(2000, 5, 20), "纪念日", "日常", period_type="自定义周期",
+                              interval=5, unit="年")
+        compiled = CompiledRule(rule)
+        # 每 5 年一次：2020 年和 2025 年都在窗口外，取离参考日期较近的 2025 年
+        self.assertEqual(compiled.nearest_occurrence(ordinal(2023, 6, 1), ordinal(2022, 6, 1), ordinal(2024, 6, 30)),
+                         ordinal(2025, 5, 20))
+        # 第一次发生在窗口之后
+        self.assertEqual(compiled.nearest_occurrence(ordinal(1990, 6, 1), ordinal(1989, 6, 1), ordinal(1991, 6, 30)),
+                         ordinal(2000, 5, 20))
+
+    def test_never_occurs(self):
+        rule = RecurrenceRule(ordinal(2020, 1, 1), "空", "日常", period_type="自定义日期")
+        self.assertIsNone(CompiledRule(rule).nearest_occurrence(ordinal(2020, 1, 1), ordinal(2019, 1, 1),
+                                                                ordinal(2021, 1, 1)))
+
+
+if __name__ == "__main__":
+    unittest.main()
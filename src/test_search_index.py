@@ -0,0 +1,170 @@
+import os
+import random
+import sys
+import unittest
+
+# 模块之间按文件名导入（与 main.py 相同），从仓库根目录运行 pytest 时也能找到
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from search_index import (FIELD_CATEGORY, FIELD_DESCRIPTION, FIELD_SEPARATOR, FIELD_TITLE, RankedHits,
+                          SearchIndex, rank_key, search_text)
+
+
+class SmallIndex(SearchIndex):
+    """阈值调小，少量文档就会触发重建"""
+    COMPACT_MIN = 2
+    UNSORTED_MIN = 2
+
+
+def sample_index(index: SearchIndex) -> SearchIndex:
+    index.add_all([
+        ("title", search_text("周会", "", "工作"), 100),
+        ("description", search_text("复盘", "周会纪要", "工作"), 100),
+        ("earlier", search_text("周会", "", "工作"), 90),
+        ("later", search_text("周会", "", "工作"), 110),
+        ("category", search_text("复盘", "", "周会"), 100),
+        ("rule", search_text("周会", "", "工作"), None),
+        ("other", search_text("读书", "", "日常"), 100),
+    ])
+    return index
+
+
+class SearchIndexRankingTest(unittest.TestCase):
+    """命中的字段、排序和前 k 个"""
+
+    def test_search_fields(self):
+        hits = sample_index(SearchIndex()).search("周会")
+        self.assertEqual(sorted((key, field) for field, _, key in hits),
+                         [("category", FIELD_CATEGORY), ("description", FIELD_DESCRIPTION), ("earlier", FIELD_TITLE),
+                          ("later", FIELD_TITLE), ("rule", FIELD_TITLE), ("title", FIELD_TITLE)])
+
+    def test_rank_key(self):
+        # 标题优先，其次离参考日期近，距离相同时较早的在前
+        hits = [(FIELD_DESCRIPTION, 100, "description"), (FIELD_TITLE, 110, "later"),
+                (FIELD_TITLE, 90, "earlier"), (FIELD_TITLE, 100, "title")]
+        self.assertEqual([hit[2] for hit in sorted(hits, key=lambda hit: rank_key(hit, 100))],
+                         ["title", "earlier", "later", "description"])
+
+    def test_top(self):
+        index = sample_index(SearchIndex())
+        # 前 k 个带日期的命中之后是全部不带日期的命中
+        self.assertEqual([hit[2] for hit in index.top("周会", 100, 2)], ["title", "earlier", "rule"])
+        self.assertEqual([hit[2] for hit in index.top("周会", 100, 10)],
+                         ["title", "earlier", "later", "description", "category", "rule"])
+        self.assertEqual([hit[2] for hit in index.top("周会", 200, 1)], ["later", "rule"])
+        self.assertEqual(index.top("周会", 100, 0), [])
+        self.assertEqual(index.top("没有", 100, 5), [])
+
+    def test_top_matches_full_sort(self):
+        rng = random.Random(0)
+        index = SmallIndex()
+        texts = {}
+        for step in range(600):
+            key = rng.randrange(80)
+            if rng.random() < 0.2:
+                index.remove(key)
+                texts.pop(key, None)
+                continue
+            text = search_text("".join(rng.choice("甲乙丙丁") for _ in range(rng.randint(1, 4))),
+                               "".join(rng.choice("甲乙丙") for _ in range(rng.randint(0, 3))), rng.choice("丁乙"))
+            date_ord = None if rng.random() < 0.1 else rng.randint(1, 60)
+            index.add(key, text, date_ord)
+            texts[key] = (text, date_ord or 0)
+            if step % 50:
+                continue
+            for keyword in ("甲", "乙丙", "甲乙丙", "丁"):
+                expected = [(text.count(FIELD_SEPARATOR, 0, text.find(keyword)), date_ord, key)
+                            for key, (text, date_ord) in texts.items() if keyword in text]
+                self.assertEqual(sorted(index.search(keyword)), sorted(expected))
+                reference_ord, k = rng.randint(1, 60), rng.randint(1, 8)
+                top = index.top(keyword, reference_ord, k)
+                dated = [hit for hit in top if hit[1]]
+                # 排序键相同的命中之间顺序不确定，只比较排序键
+                self.assertEqual([rank_key(hit, reference_ord) for hit in dated],
+                                 sorted(rank_key(hit, reference_ord) for hit in expected if hit[1])[:k])
+                self.assertEqual(sorted(hit for hit in top if not hit[1]), sorted(hit for hit in expected if not hit[1]))
+                self.assertTrue(set(dated) <= set(expected))
+
+
+class RankedHitsTest(unittest.TestCase):
+    """按页取出全部命中"""
+
+    def test_pages(self):
+        index = sample_index(SearchIndex())
+        hits = RankedHits([hit for hit in index.search("周会") if hit[1]], 100)
+        self.assertEqual((hits.total, hits.remaining), (5, 5))
+        self.assertEqual([hit[2] for hit in hits.next_page(2)], ["title", "earlier"])
+        self.assertEqual(hits.remaining, 3)
+        self.assertEqual([hit[2] for hit in hits.next_page(10)], ["later", "description", "category"])
+        self.assertEqual((hits.total, hits.remaining), (5, 0))
+        self.assertEqual(hits.next_page(1), [])
+
+    def test_unorderable_keys(self):
+        # 排序键相同时不能比较键本身
+        hits = RankedHits([(FIELD_TITLE, 100, {"a": 1}), (FIELD_TITLE, 100, {"b": 2})], 100)
+        self.assertEqual(len(hits.next_page(2)), 2)
+
+
+class SearchIndexInvalidationTest(unittest.TestCase):
+    """修改、删除后搜索结果和缓存的命中随之更新"""
+
+    def keys(self, index: SearchIndex, keyword: str) -> list:
+        return sorted(hit[2] for hit in index.search(keyword))
+
+    def test_update_and_remove(self):
+        index = SearchIndex()
+        index.add("a", search_text("周会纪要", "", "工作"), 100)
+        index.add("b", search_text("周报", "", "工作"), 101)
+        # 逐字输入：先缓存“周会”的命中，“周会纪”从缓存的命中中筛选
+        self.assertEqual(self.keys(index, "周"), ["a", "b"])
+        self.assertEqual(self.keys(index, "周会"), ["a"])
+        self.assertEqual(self.keys(index, "周会纪"), ["a"])
+
+        index.add("a", search_text("例会纪要", "", "工作"), 100)
+        self.assertEqual(self.keys(index, "周会纪"), [])
+        self.assertEqual(self.keys(index, "周会"), [])
+        self.assertEqual(self.keys(index, "例会纪"), ["a"])
+
+        index.add("c", search_text("周会纪要", "", "工作"), 102)
+        self.assertEqual(self.keys(index, "周会纪"), ["c"])
+        index.remove("c")
+        self.assertEqual(self.keys(index, "周会纪"), [])
+        self.assertEqual(self.keys(index, "周"), ["b"])
+        self.assertNotIn("c", index)
+        self.assertEqual(len(index), 2)
+
+    def test_unchanged_add_keeps_version(self):
+        index = SearchIndex()
+        index.add("a", search_text("周会", "", "工作"), 100)
+        version = index.version
+        index.add("a", search_text("周会", "", "工作"), 100)
+        self.assertEqual(index.version, version)
+        index.add("a", search_text("周会", "", "工作"), 101)
+        self.assertGreater(index.version, version)
+        self.assertEqual(index.search("周会"), [(FIELD_TITLE, 101, "a")])
+
+    def test_rebuild_after_removals(self):
+        index = SmallIndex()
+        for number in range(4):
+            index.add(number, search_text(f"周会{number}", "", "工作"), 100 + number)
+        version = index.version
+        index.remove(0)
+        index.remove(1)
+        # 删除一半后按日期重建：只剩未删除的文档，版本号仍然增加
+        self.assertEqual(index._removed, 0)
+        self.assertEqual(len(index._texts), 2)
+        self.assertGreater(index.version, version)
+        self.assertEqual(sorted(hit[2] for hit in index.search("周会")), [2, 3])
+
+    def test_rebuild_after_unsorted_adds(self):
+        index = SmallIndex()
+        for number, date_ord in enumerate([130, 120, 110]):
+            index.add(number, search_text("周会", "", "工作"), date_ord)
+        # 乱序加入的文档过多时重建，之后全部文档按日期排列
+        self.assertEqual(index._sorted_count, 3)
+        # 120 和 130 离参考日期一样近，较早的在前
+        self.assertEqual([hit[2] for hit in index.top("周会", 125, 2)], [1, 0])
+
+
+if __name__ == "__main__":
+    unittest.main()
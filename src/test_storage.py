@@ -0,0 +1,312 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import date
+from unittest import mock
+
+# 模块之间按文件名导入（与 main.py 相同），从仓库根目录运行 pytest 时也能找到
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from data import Event
+from storage import JsonEventStore, ShardedEventStore, SqliteEventStore
+
+
+def ordinal(year: int, month: int, day: int) -> int:
+    return date(year, month, day).toordinal()
+
+
+def add_op(year: int, month: int, day: int, title: str) -> dict:
+    return {"op": "add", "date": date(year, month, day).isoformat(),
+            "event": Event(ordinal(year, month, day), title, "工作")}
+
+
+def titles(events_data) -> list:
+    return sorted(event.title for events_list in events_data.values() for event in events_list)
+
+
+class JournalReplayTest(unittest.TestCase):
+    """JSON 快照 + 追加日志：重新加载时按日志回放"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.snapshot_file = os.path.join(self.directory, "events.json")
+        self.journal_file = os.path.join(self.directory, "events.journal")
+
+    def open_store(self, compact_every: int = 200) -> JsonEventStore:
+        store = JsonEventStore(self.snapshot_file, self.journal_file, compact_every)
+        store.load()
+        return store
+
+    def test_replay_after_torn_last_line(self):
+        store = self.open_store()
+        first = add_op(2025, 1, 1, "周会")
+        store.apply(first)
+        store.apply({"op": "update", "date": "2025-01-01", "id": first["event"].id, "fields": {"title": "例会"}})
+        # 异常退出时最后一行只写了一半
+        with open(self.journal_file, "a", encoding="utf-8") as f:
+            f.write('{"op": "add", "date": "2025-01-0')
+
+        store = self.open_store()
+        self.assertEqual(titles(store.events_data), ["例会"])
+        # 之后追加的修改不能接在半行后面一起丢失
+        store.apply(add_op(2025, 1, 2, "复盘"))
+        self.assertEqual(titles(self.open_store().events_data), ["例会", "复盘"])
+
+    def test_replay_after_compaction(self):
+        store = self.open_store(compact_every=3)
+        for day in range(1, 6):
+            store.apply(add_op(2025, 1, day, f"事件{day}"))
+        # 第 3 条时压缩为快照，之后的两条留在日志中
+        with open(self.journal_file, encoding="utf-8") as f:
+            self.assertEqual(len(f.read().splitlines()), 2)
+        self.assertEqual(titles(self.open_store(compact_every=3).events_data), [f"事件{day}" for day in range(1, 6)])
+
+    def test_bulk_add_snapshot_is_deferred(self):
+        self.open_store()
+        store = JsonEventStore(self.snapshot_file, self.journal_file, write_delay=60)
+        store.load()
+        store.bulk_add([[add_op(2025, 1, 1, "导入")["event"]]])
+        # 快照交给写入线程，导入时不在持有锁的情况下同步写入
+        self.assertEqual(titles(self.open_store().events_data), [])
+        store.flush()
+        self.assertEqual(titles(self.open_store().events_data), ["导入"])
+
+    def test_compaction_interrupted_before_journal_cleared(self):
+        store = self.open_store()
+        for day in range(1, 4):
+            store.apply(add_op(2025, 1, day, f"事件{day}"))
+        with open(self.journal_file, encoding="utf-8") as f:
+            journal = f.read()
+        store.save()
+        # 快照已替换、日志还没清空时退出：快照记录的序号之前的日志不能重复回放
+        with open(self.journal_file, "w", encoding="utf-8") as f:
+            f.write(journal)
+        self.assertEqual(titles(self.open_store().events_data), ["事件1", "事件2", "事件3"])
+
+
+class StableIdTest(unittest.TestCase):
+    """旧版本没有编号的数据：第一次加载时补上编号并写回，之后的修改按编号定位"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.snapshot_file = os.path.join(self.directory, "events.json")
+        self.journal_file = os.path.join(self.directory, "events.journal")
+        with open(self.snapshot_file, "w", encoding="utf-8") as f:
+            json.dump({"single_events": {"2025-01-01": [{"title": "周会", "category": "工作"}]},
+                       "periodic_rules": [{"title": "纪念日", "category": "日常", "is_periodic": True,
+                                           "period_info": {"type": "每年", "start_date": "2000-05-20"}}]},
+                      f, ensure_ascii=False)
+
+    def open_store(self) -> JsonEventStore:
+        store = JsonEventStore(self.snapshot_file, self.journal_file)
+        store.load()
+        return store
+
+    def test_ids_survive_reload(self):
+        store = self.open_store()
+        [event] = store.events_data["2025-01-01"]
+        [rule] = store.periodic_rules
+        self.assertIs(store.get(event.id), event)
+        self.assertIs(store.get(rule.id), rule)
+
+        store = self.open_store()
+        self.assertEqual(store.events_data["2025-01-01"][0].id, event.id)
+        self.assertEqual(store.periodic_rules[0].id, rule.id)
+        # 按编号记入日志的修改在重新加载后仍能找到目标
+        store.apply({"op": "update", "date": "2025-01-01", "id": event.id, "fields": {"title": "例会"}})
+        store.apply({"op": "delete_series", "id": rule.id})
+        store = self.open_store()
+        self.assertEqual(store.get(event.id).title, "例会")
+        self.assertIsNone(store.get(rule.id))
+        self.assertEqual(store.periodic_rules, [])
+
+
+class SqliteStoreTest(unittest.TestCase):
+    """SQLite 存储：按月加载，搜索只查内存索引，取出命中时才加载所在月份"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.database_file = os.path.join(self.directory, "events.db")
+
+    def open_store(self) -> SqliteEventStore:
+        store = SqliteEventStore(self.database_file)
+        self.addCleanup(store.close)
+        store.load()
+        return store
+
+    def test_reload_and_lazy_months(self):
+        store = self.open_store()
+        store.apply(add_op(2020, 3, 5, "体检"))
+        store.apply(add_op(2025, 7, 1, "周会"))
+        store.close()
+
+        store = self.open_store()
+        self.assertEqual(store.events_data, {})
+        store.ensure_range_loaded(date(2025, 7, 1), date(2025, 7, 31))
+        self.assertEqual(titles(store.events_data), ["周会"])
+        self.assertEqual([event.title for event in store.iter_events()], ["体检", "周会"])
+
+    def test_search_loads_only_resolved_months(self):
+        store = self.open_store()
+        store.apply(add_op(2020, 3, 5, "体检"))
+        store.apply(add_op(2025, 7, 1, "周会"))
+        store.close()
+
+        store = self.open_store()
+        hits = store.search_hits("体检", ordinal(2025, 1, 1), 5)
+        self.assertEqual([hit[1] for hit in hits], [ordinal(2020, 3, 5)])
+        self.assertEqual(store.events_data, {})
+        [event] = store.resolve_hits([hit[2] for hit in hits])
+        self.assertEqual(event.title, "体检")
+        self.assertEqual(list(store.events_data), ["2020-03-05"])
+
+    def test_search_after_edit_and_delete(self):
+        store = self.open_store()
+        op = add_op(2025, 7, 1, "周会")
+        store.apply(op)
+        self.assertEqual(len(store.search_hits("周会")), 1)
+        store.apply({"op": "update", "date": "2025-07-01", "id": op["event"].id, "fields": {"title": "例会"}})
+        self.assertEqual(store.search_hits("周会"), [])
+        hits = store.search_hits("例会")
+        store.apply({"op": "delete", "date": "2025-07-01", "id": op["event"].id})
+        self.assertEqual(store.search_hits("例会"), [])
+        self.assertEqual(store.resolve_hits([hit[2] for hit in hits]), [])
+
+
+
+class ShardedStoreTest(unittest.TestCase):
+    """分片存储：修改追加到日志，压缩时才重写分片；移出的年份按需重新加载"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.shard_dir = os.path.join(self.directory, "events")
+
+    def open_store(self, compact_every: int = 200) -> ShardedEventStore:
+        store = ShardedEventStore(self.shard_dir, compact_every=compact_every)
+        store.load()
+        return store
+
+    def test_changes_are_journaled_and_replayed(self):
+        store = self.open_store()
+        op = add_op(2020, 3, 5, "体检")
+        store.apply(op)
+        store.apply(add_op(2025, 7, 1, "周会"))
+        store.apply({"op": "update", "date": "2020-03-05", "id": op["event"].id, "fields": {"title": "复查"}})
+        # 未到压缩阈值，分片还没有写入
+        self.assertEqual(os.listdir(self.shard_dir), [ShardedEventStore.JOURNAL_NAME])
+
+        store = self.open_store()
+        self.assertEqual([event.title for event in store.iter_events()], ["复查", "周会"])
+        # 启动时回放后立即压缩
+        self.assertEqual(os.path.getsize(store.journal_file), 0)
+        self.assertEqual(sorted(os.listdir(self.shard_dir)), ["2020.json", "2025.json", "changes.journal"])
+
+    def test_replay_after_interrupted_compaction(self):
+        store = self.open_store()
+        op = add_op(2025, 7, 1, "周会")
+        store.apply(op)
+        store.apply(add_op(2025, 7, 2, "复盘"))
+        store.apply({"op": "delete", "date": "2025-07-01", "id": op["event"].id})
+        with open(store.journal_file, encoding="utf-8") as f:
+            journal = f.read()
+        store.save()
+        # 分片已重写、日志还没清空时退出：已写入分片的操作不能重复生效
+        with open(store.journal_file, "w", encoding="utf-8") as f:
+            f.write(journal)
+        self.assertEqual([event.title for event in self.open_store().iter_events()], ["复盘"])
+
+    def test_compact_every(self):
+        store = self.open_store(compact_every=2)
+        store.apply(add_op(2025, 7, 1, "周会"))
+        self.assertFalse(os.path.exists(os.path.join(self.shard_dir, "2025.json")))
+        store.apply(add_op(2025, 7, 2, "复盘"))
+        self.assertTrue(os.path.exists(os.path.join(self.shard_dir, "2025.json")))
+        self.assertEqual(os.path.getsize(store.journal_file), 0)
+
+    def test_evict_and_reload_year(self):
+        store = self.open_store()
+        store.apply(add_op(2020, 3, 5, "体检"))
+        store.apply(add_op(2025, 7, 1, "周会"))
+        hits = store.search_hits("体检")
+        # 有修改的年份移出前先写入分片
+        self.assertEqual(store.evict_years({2025}), 1)
+        self.assertEqual(list(store.events_data), ["2025-07-01"])
+        self.assertTrue(os.path.exists(os.path.join(self.shard_dir, "2020.json")))
+        self.assertEqual([event.title for event in store.iter_events()], ["体检", "周会"])
+        # 搜索不重新加载移出的年份，取出命中时才加载
+        self.assertEqual(store.search_hits("体检"), hits)
+        self.assertNotIn("2020-03-05", store.events_data)
+        [event] = store.resolve_hits([hit[2] for hit in hits])
+        self.assertEqual(event.title, "体检")
+        self.assertIn("2020-03-05", store.events_data)
+        store.apply({"op": "delete", "date": "2020-03-05", "id": event.id})
+        store.evict_years({2025})
+        self.assertEqual([event.title for event in self.open_store().iter_events()], ["周会"])
+
+    def test_bulk_add_does_not_load_untouched_years(self):
+        store = self.open_store()
+        store.apply(add_op(2010, 1, 1, "旧事件"))
+        store.save()
+        store = ShardedEventStore(self.shard_dir, write_delay=60)
+        self.addCleanup(store.flush)
+        store.load()
+        store.ensure_range_loaded(date(2025, 1, 1), date(2025, 12, 31))
+        imported = [add_op(2010, 6, 1, "导入一")["event"], add_op(2025, 6, 1, "导入二")["event"]]
+        self.assertEqual(store.bulk_add([imported]), (2, 0))
+        # 未加载的 2010 年不为导入而加载，写入前遍历和搜索也能看到导入的事件
+        self.assertNotIn(2010, store._loaded_years)
+        self.assertEqual(titles(store.events_data), ["导入二"])
+        self.assertEqual([event.title for event in store.iter_events()], ["旧事件", "导入一", "导入二"])
+        [event] = store.resolve_hits([hit[2] for hit in store.search_hits("导入一")])
+        self.assertIs(event, imported[0])
+        store.flush()
+        self.assertEqual([event.title for event in self.open_store().iter_events()], ["旧事件", "导入一", "导入二"])
+
+
+class ShardedMigrationTest(unittest.TestCase):
+    """分片存储首次启动时从 events.json 迁移"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.snapshot_file = os.path.join(self.directory, "events.json")
+        self.journal_file = os.path.join(self.directory, "events.journal")
+        self.shard_dir = os.path.join(self.directory, "events")
+        store = JsonEventStore(self.snapshot_file, self.journal_file)
+        store.load()
+        store.apply(add_op(2020, 3, 5, "体检"))
+        store.apply(add_op(2025, 7, 1, "周会"))
+
+    def open_store(self) -> ShardedEventStore:
+        store = ShardedEventStore(self.shard_dir, self.snapshot_file, self.journal_file)
+        store.load()
+        return store
+
+    def test_migrate(self):
+        store = self.open_store()
+        self.assertEqual([event.title for event in store.iter_events()], ["体检", "周会"])
+        self.assertEqual(sorted(os.listdir(self.shard_dir)), ["2020.json", "2025.json", "rules.json"])
+
+    def test_interrupted_migration_is_retried(self):
+        original = ShardedEventStore._write_file
+
+        def fail_on_rules(store, stem, *args):
+            return stem != ShardedEventStore.RULES_STEM and original(store, stem, *args)
+
+        with mock.patch.object(ShardedEventStore, "_write_file", fail_on_rules):
+            self.open_store()
+        # 迁移失败不能留下不完整的分片目录，否则之后不会再迁移
+        self.assertFalse(os.path.exists(self.shard_dir))
+        self.assertEqual([event.title for event in self.open_store().iter_events()], ["体检", "周会"])
+        self.assertFalse(os.path.exists(self.shard_dir + ".migrating"))
+
+
+if __name__ == "__main__":
+    unittest.main()